@@ -0,0 +1,193 @@
+"""Batch create, update and deactivate for user accounts.
+
+A batch is checked against the database with two queries: one loads every
+user it refers to and one finds which claimed usernames are taken. The valid
+operations are then written with ``bulk_create``/``bulk_update`` in a single
+transaction. New passwords are hashed on a thread pool beforehand; PBKDF2
+runs inside hashlib with the GIL released, so the hashes run in parallel.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Profile
+
+BATCH_MAX_OPERATIONS = 500
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+OPERATIONS = ("create", "update", "deactivate")
+_TEXT_FIELDS = ("username", "first_name", "last_name", "email")
+_FLAG_FIELDS = ("is_active", "is_staff")
+_TRUE_VALUES = {"true", "1", "yes", "on", "y", "t"}
+
+
+class BatchError(ValueError):
+    pass
+
+
+class _Operation:
+    __slots__ = ("index", "kind", "data", "user", "profile", "password", "error")
+
+    def __init__(self, index: int, kind: str, data: Dict[str, Any]) -> None:
+        self.index = index
+        self.kind = kind
+        self.data = data
+        self.user: Optional[User] = None
+        self.profile: Optional[Profile] = None
+        self.password: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def result(self) -> Dict[str, Any]:
+        if self.error:
+            return {"index": self.index, "op": self.kind, "ok": False, "error": self.error}
+        return {"index": self.index, "op": self.kind, "ok": True, "id": self.user.pk, "username": self.user.username}
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in _TRUE_VALUES
+
+
+def _parse(index: int, raw: Any) -> _Operation:
+    if not isinstance(raw, dict):
+        operation = _Operation(index, "", {})
+        operation.error = "Operation must be an object"
+        return operation
+    kind = raw.get("op")
+    operation = _Operation(index, kind if kind in OPERATIONS else "", raw)
+    if kind not in OPERATIONS:
+        operation.error = f"Unknown op; expected one of {', '.join(OPERATIONS)}"
+    elif kind == "create" and not (raw.get("username") and raw.get("password")):
+        operation.error = "Username and password are required"
+    elif kind != "create" and not str(raw.get("id") or "").isdigit():
+        operation.error = "Missing user id"
+    elif kind == "update" and "username" in raw and not raw.get("username"):
+        operation.error = "Username cannot be blank"
+    elif "point" in raw:
+        try:
+            int(raw["point"])
+        except (TypeError, ValueError):
+            operation.error = "Invalid integer value"
+    return operation
+
+
+def _apply_fields(operation: _Operation) -> None:
+    data, user, profile = operation.data, operation.user, operation.profile
+    for name in _TEXT_FIELDS:
+        if name in data:
+            setattr(user, name, str(data[name] or ""))
+    for name in _FLAG_FIELDS:
+        if data.get(name) not in (None, ""):
+            setattr(user, name, _flag(data[name]))
+    if data.get("usertype"):
+        profile.usertype = str(data["usertype"])
+    if data.get("point") not in (None, ""):
+        profile.point = int(data["point"])
+    if data.get("password"):
+        operation.password = str(data["password"])
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    if len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    with ThreadPoolExecutor(max_workers=min(HASH_WORKERS, len(passwords))) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def apply_user_batch(raw_operations: Any, acting_user: User) -> List[Dict[str, Any]]:
+    """Validate and apply a list of user operations; returns one result per item.
+
+    Each item is ``{"op": "create" | "update" | "deactivate", ...}`` with the
+    same fields as the single-user endpoints. Items that fail validation are
+    reported and skipped; the rest are written together. Raises
+    ``BatchError`` when the payload is not a list or is too large.
+    """
+    if not isinstance(raw_operations, list):
+        raise BatchError("Expected a list of operations")
+    if len(raw_operations) > BATCH_MAX_OPERATIONS:
+        raise BatchError(f"A batch holds at most {BATCH_MAX_OPERATIONS} operations")
+
+    operations = [_parse(index, raw) for index, raw in enumerate(raw_operations)]
+    valid = [operation for operation in operations if not operation.error]
+
+    user_ids = {int(operation.data["id"]) for operation in valid if operation.kind != "create"}
+    claimed = {
+        operation.data["username"]
+        for operation in valid
+        if operation.kind != "deactivate" and operation.data.get("username")
+    }
+    existing = User.objects.select_related("profile").in_bulk(user_ids) if user_ids else {}
+    taken = dict(User.objects.filter(username__in=claimed).values_list("username", "id")) if claimed else {}
+
+    seen_ids: Set[int] = set()
+    seen_names: Set[str] = set()
+    for operation in valid:
+        data = operation.data
+        if operation.kind == "create":
+            operation.user = User(username=data["username"])
+            operation.profile = Profile()
+        else:
+            user_id = int(data["id"])
+            operation.user = existing.get(user_id)
+            if operation.user is None:
+                operation.error = "User not found"
+                continue
+            if user_id in seen_ids:
+                operation.error = "User appears more than once in the batch"
+                continue
+            seen_ids.add(user_id)
+            operation.profile = getattr(operation.user, "profile", None) or Profile(user=operation.user)
+
+        if operation.kind == "deactivate":
+            if operation.user.is_superuser:
+                operation.error = "Cannot deactivate a superuser"
+            elif operation.user.pk == acting_user.pk:
+                operation.error = "Users cannot deactivate themselves"
+            else:
+                operation.user.is_active = False
+            continue
+
+        username = data.get("username")
+        if operation.kind == "create" or (username and username != operation.user.username):
+            if username in seen_names or taken.get(username, operation.user.pk) != operation.user.pk:
+                operation.error = "Username already exists"
+                continue
+            seen_names.add(username)
+        _apply_fields(operation)
+
+    valid = [operation for operation in valid if not operation.error]
+    hashing = [operation for operation in valid if operation.password]
+    for operation, hashed in zip(hashing, _hash_passwords([operation.password for operation in hashing])):
+        operation.user.password = hashed
+
+    creates = [operation for operation in valid if operation.kind == "create"]
+    updates = [operation for operation in valid if operation.kind != "create"]
+    with transaction.atomic():
+        if creates:
+            User.objects.bulk_create([operation.user for operation in creates])
+        if updates:
+            User.objects.bulk_update(
+                [operation.user for operation in updates], ["password", *_TEXT_FIELDS, *_FLAG_FIELDS]
+            )
+        profiles = []
+        for operation in valid:
+            if operation.kind != "deactivate":
+                # New users only have a primary key after their bulk insert.
+                operation.profile.user = operation.user
+                profiles.append(operation.profile)
+        new_profiles = [profile for profile in profiles if profile.pk is None]
+        changed_profiles = [profile for profile in profiles if profile.pk is not None]
+        if new_profiles:
+            Profile.objects.bulk_create(new_profiles)
+        if changed_profiles:
+            Profile.objects.bulk_update(changed_profiles, ["usertype", "point"])
+
+    return [operation.result() for operation in operations]
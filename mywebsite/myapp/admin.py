@@ -1,22 +1,25 @@
 from django.contrib import admin
 from django.utils.safestring import mark_safe
-from django.db.models import Count, Max, Q
 
 from .models import (
     Action,
     Addon,
     Booking,
     BookingAddon,
+    BookingDailyStats,
     BookingItem,
     Product,
     Program,
     ProgramImage,
     ProgramRate,
+    SlotCapacity,
+    SlotOccupancy,
     Staff,
     StaffFeedback,
     contactList,
     Profile,
 )
+from . import capacity, feedback, stats
 
 
 class ProgramRateInline(admin.TabularInline):
@@ -91,6 +94,40 @@ class BookingAdmin(admin.ModelAdmin):
     readonly_fields = ("total_amount", "created_at")
     inlines = [BookingItemInline, BookingAddonInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Admin bookings skip ``create_booking``; once every line is saved,
+        # recount the rollup and the booked riders of the old and new slots.
+        slots = [(form.instance.ride_date, form.instance.ride_time)]
+        previous = getattr(form.instance, "_previous_slot", None)
+        if previous:
+            slots.append(previous)
+        stats.refresh_slots(slots)
+        capacity.refresh_slots(slots)
+
+
+@admin.register(SlotCapacity)
+class SlotCapacityAdmin(admin.ModelAdmin):
+    list_display = ("ride_date", "ride_time", "capacity")
+    list_filter = ("ride_time",)
+    date_hierarchy = "ride_date"
+
+
+@admin.register(SlotOccupancy)
+class SlotOccupancyAdmin(admin.ModelAdmin):
+    list_display = ("ride_date", "ride_time", "riders", "capacity")
+    list_filter = ("ride_time",)
+    date_hierarchy = "ride_date"
+    readonly_fields = ("ride_date", "ride_time", "riders", "capacity")
+
+
+@admin.register(BookingDailyStats)
+class BookingDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("ride_date", "ride_time", "program", "bookings", "revenue")
+    list_filter = ("ride_time", "program")
+    date_hierarchy = "ride_date"
+    readonly_fields = ("ride_date", "ride_time", "program", "bookings", "revenue")
+
 
 admin.site.register(Product)
 admin.site.register(contactList)
@@ -137,14 +174,6 @@ class StaffAdmin(admin.ModelAdmin):
         ),
     )
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.annotate(
-            likes_count=Count("feedback", filter=Q(feedback__sentiment=StaffFeedback.Sentiment.LIKE)),
-            dislikes_count=Count("feedback", filter=Q(feedback__sentiment=StaffFeedback.Sentiment.DISLIKE)),
-            feedback_latest=Max("feedback__updated_at"),
-        )
-
     def likes_received(self, obj):
         return obj.likes_total()
     likes_received.short_description = "Likes"
@@ -158,7 +187,7 @@ class StaffAdmin(admin.ModelAdmin):
     def latest_feedback_recorded(self, obj):
         return obj.latest_feedback_time()
     latest_feedback_recorded.short_description = "Latest feedback"
-    latest_feedback_recorded.admin_order_field = "feedback_latest"
+    latest_feedback_recorded.admin_order_field = "latest_feedback"
 
 
 @admin.register(StaffFeedback)
@@ -185,6 +214,13 @@ class StaffFeedbackAdmin(admin.ModelAdmin):
         ),
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        staff_ids = {obj.staff_id}
+        if change and "staff" in form.changed_data:
+            staff_ids.add(form.initial["staff"])
+        feedback.reconcile(staff_ids)
+
     def comment_preview(self, obj):
         if not obj.comment:
             return "—"
@@ -0,0 +1,119 @@
+"""In-process prefix index for type-ahead over programs and products.
+
+Keys are normalised (case-folded, accents stripped) and kept in sorted lists,
+so a lookup is a ``bisect`` plus a short forward scan. Matches rank in tiers:
+program codes, then whole names and titles, then later words inside them.
+The index is rebuilt only when the ``catalog`` or ``products`` version stamp
+changes. Between rebuilds a lookup reads the stamps from the cache and never
+queries the database.
+"""
+
+from __future__ import annotations
+
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import versions
+from .catalog import get_catalog
+from .models import Product
+
+KINDS = ("program", "product")
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# (kind, id, label, detail) shared by every key that points at the item.
+Entry = Tuple[str, int, str, str]
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+class _Tier:
+    __slots__ = ("keys", "entries")
+
+    def __init__(self, pairs: Iterable[Tuple[str, Entry]]) -> None:
+        ordered = sorted(pairs, key=lambda pair: (pair[0], pair[1][2]))
+        self.keys = [key for key, _ in ordered]
+        self.entries = [entry for _, entry in ordered]
+
+    def scan(self, prefix: str):
+        index = bisect_left(self.keys, prefix)
+        keys, entries = self.keys, self.entries
+        while index < len(keys) and keys[index].startswith(prefix):
+            yield entries[index]
+            index += 1
+
+
+class AutocompleteIndex:
+    __slots__ = ("version", "tiers", "size")
+
+    def __init__(self, version: str, entries: Iterable[Tuple[Entry, Optional[str], str]]) -> None:
+        """``entries`` holds (entry, code or None, name) for every item."""
+        codes, names, words = [], [], []
+        size = 0
+        for entry, code, name in entries:
+            size += 1
+            if code:
+                codes.append((normalize(code), entry))
+            key = normalize(name)
+            if key:
+                names.append((key, entry))
+            # Every later word start, so "dune" finds "Sunset Dune Ride".
+            position = key.find(" ")
+            while position != -1:
+                words.append((key[position + 1:], entry))
+                position = key.find(" ", position + 1)
+        self.version = version
+        self.tiers = (_Tier(codes), _Tier(names), _Tier(words))
+        self.size = size
+
+    def lookup(self, query: str, kinds: Iterable[str] = KINDS, limit: int = DEFAULT_LIMIT) -> List[Entry]:
+        prefix = normalize(query)
+        if not prefix or limit <= 0:
+            return []
+        wanted = set(kinds)
+        results: List[Entry] = []
+        seen = set()
+        for tier in self.tiers:
+            for entry in tier.scan(prefix):
+                if entry[0] not in wanted or entry[:2] in seen:
+                    continue
+                seen.add(entry[:2])
+                results.append(entry)
+                if len(results) == limit:
+                    return results
+        return results
+
+
+_index: AutocompleteIndex | None = None
+
+
+def _load_index(version: str) -> AutocompleteIndex:
+    def items():
+        for catalog_entry in get_catalog().programs:
+            program = catalog_entry.program
+            yield ("program", program.id, program.name, program.code), program.code, program.name
+        for product_id, title in Product.objects.order_by().values_list("id", "title").iterator():
+            yield ("product", product_id, title, ""), None, title
+
+    return AutocompleteIndex(version, items())
+
+
+def get_index() -> AutocompleteIndex:
+    global _index
+    stamps = versions.get_versions(versions.CATALOG, versions.PRODUCTS)
+    version = f"{stamps[versions.CATALOG]}:{stamps[versions.PRODUCTS]}"
+    index = _index
+    if index is None or index.version != version:
+        index = _load_index(version)
+        _index = index
+    return index
+
+
+def serialize(entry: Entry) -> Dict[str, Any]:
+    kind, pk, label, detail = entry
+    return {"type": kind, "id": pk, "label": label, "code": detail}
@@ -0,0 +1,104 @@
+"""Booking write path shared by the public and walk-in booking views."""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import stats
+from .capacity import count_riders, reserve_riders
+from .models import Booking, BookingAddon, BookingItem
+from .pricing import get_pricing
+
+
+def price_booking_lines(
+    items: Iterable[Dict[str, Any]],
+    addons: Iterable[Dict[str, Any]],
+) -> Tuple[List[BookingItem], List[BookingAddon], Decimal]:
+    """Build unsaved line items with the same prices ``BookingItem.save`` would set."""
+    pricing = get_pricing()
+
+    item_rows: List[BookingItem] = []
+    addon_rows: List[BookingAddon] = []
+    total = Decimal("0")
+
+    for item in items:
+        program = item["program"]
+        participant = item["participant"]
+        age_group = item["age_group"]
+        unit_price = pricing.rate(program.id, participant, age_group)
+        if unit_price is None:
+            raise ValidationError(
+                f"No rate configured for program {program.code} ({participant}, {age_group})"
+            )
+        line_total = unit_price * Decimal(item["quantity"])
+        total += line_total
+        item_rows.append(
+            BookingItem(
+                program=program,
+                participant_type=participant,
+                age_group=age_group,
+                quantity=item["quantity"],
+                unit_price=unit_price,
+                line_total=line_total,
+            )
+        )
+
+    for entry in addons:
+        addon = entry["addon"]
+        unit_price = pricing.addon_price(addon.id)
+        if unit_price is None:
+            unit_price = addon.price
+        line_total = unit_price * Decimal(entry["quantity"])
+        total += line_total
+        addon_rows.append(
+            BookingAddon(
+                addon=addon,
+                quantity=entry["quantity"],
+                unit_price=unit_price,
+                line_total=line_total,
+            )
+        )
+
+    return item_rows, addon_rows, total
+
+
+def create_booking(
+    *,
+    items: Iterable[Dict[str, Any]],
+    addons: Iterable[Dict[str, Any]] = (),
+    **booking_fields: Any,
+) -> Booking:
+    """Create a booking with all of its lines in a fixed number of queries.
+
+    Lines are priced up front from the cached pricing table, so ``total_amount`` is
+    written with the booking row instead of being re-aggregated per line.
+    Raises ``ValidationError`` when a line has no configured rate and
+    ``SlotFullError`` when the ride slot has no room for the riders.
+    """
+    items = list(items)
+    item_rows, addon_rows, total = price_booking_lines(items, addons)
+
+    with transaction.atomic():
+        # Reserve first: on SQLite the conditional UPDATE takes the write
+        # lock before anything is read inside the transaction.
+        reserve_riders(
+            booking_fields["ride_date"],
+            booking_fields.get("ride_time", ""),
+            count_riders(items),
+        )
+        booking = Booking.objects.create(total_amount=total, **booking_fields)
+        for row in item_rows:
+            row.booking = booking
+        for row in addon_rows:
+            row.booking = booking
+        if item_rows:
+            BookingItem.objects.bulk_create(item_rows)
+        if addon_rows:
+            BookingAddon.objects.bulk_create(addon_rows)
+        stats.record_booking(booking, {item["program"].id for item in items})
+
+    return booking
@@ -0,0 +1,251 @@
+"""Rider capacity per ride date and slot.
+
+Every (date, slot) that has bookings gets a ``SlotOccupancy`` counter holding
+its capacity and the riders already booked. A reservation is a single
+conditional UPDATE that only matches while the slot still has room, so two
+concurrent bookings can never both take the last seats. Changes that skip
+``reserve_riders`` (admin edits, moved or deleted bookings) recount their
+slots from the booking lines with ``refresh_slots``, and
+``rebuild_slot_occupancy`` recounts every slot for backfill or drift repair.
+"""
+
+from __future__ import annotations
+
+import calendar
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum
+from django.utils import timezone
+
+from . import versions
+from .models import Bike, Booking, BookingItem, ProgramRate, SlotCapacity, SlotOccupancy
+
+
+Slot = Tuple[date, str]
+
+
+class SlotFullError(ValidationError):
+    pass
+
+
+def slot_capacity(ride_date: date, ride_time: str) -> int:
+    override = (
+        SlotCapacity.objects.filter(ride_date=ride_date, ride_time=ride_time)
+        .values_list("capacity", flat=True)
+        .first()
+    )
+    if override is not None:
+        return override
+    return Bike.objects.count()
+
+
+def count_riders(items: Iterable[dict]) -> int:
+    return sum(
+        item["quantity"]
+        for item in items
+        if item["participant"] == ProgramRate.Participant.RIDER
+    )
+
+
+def reserve_riders(ride_date: date, ride_time: str, riders: int) -> None:
+    """Take ``riders`` seats from the slot or raise ``SlotFullError``.
+
+    Call inside the transaction that creates the booking, before its lines
+    are saved, so a rollback gives the seats back and a new slot row does not
+    count them twice. The booking form requires a slot; bookings without one
+    (older rows, admin entries) are not capacity-limited.
+    """
+    if not ride_time or riders <= 0:
+        return
+
+    slot = SlotOccupancy.objects.filter(ride_date=ride_date, ride_time=ride_time)
+    if slot.filter(riders__lte=F("capacity") - riders).update(riders=F("riders") + riders):
+        return
+
+    # The slot has no row yet, or it is full. Whichever request creates the
+    # row, every one retries the conditional update against it.
+    _get_or_create_slot(ride_date, ride_time)
+    if slot.filter(riders__lte=F("capacity") - riders).update(riders=F("riders") + riders):
+        return
+
+    remaining = slot.get().remaining
+    label = Booking.RideSlot(ride_time).label.lower()
+    raise SlotFullError(
+        f"Only {remaining} rider seat(s) are left for the {label} slot on "
+        f"{ride_date.strftime('%d %b %Y')}."
+    )
+
+
+def _get_or_create_slot(ride_date: date, ride_time: str) -> SlotOccupancy:
+    with transaction.atomic():
+        occupancy, created = SlotOccupancy.objects.get_or_create(
+            ride_date=ride_date,
+            ride_time=ride_time,
+            defaults={"capacity": lambda: slot_capacity(ride_date, ride_time)},
+        )
+        if created:
+            # Bookings saved before the slot had a row still hold seats. The
+            # new row stays locked until commit, so nothing reserves on it
+            # before this count lands.
+            booked = _booked_riders(booking__ride_date=ride_date, booking__ride_time=ride_time)
+            occupancy.riders = booked.get((ride_date, ride_time), 0)
+            if occupancy.riders:
+                SlotOccupancy.objects.filter(pk=occupancy.pk).update(riders=occupancy.riders)
+    return occupancy
+
+
+def _booked_riders(**booking_filter: Any) -> Dict[Slot, int]:
+    rows = (
+        BookingItem.objects.filter(participant_type=ProgramRate.Participant.RIDER, **booking_filter)
+        .exclude(booking__ride_time="")
+        .values_list("booking__ride_date", "booking__ride_time")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+    return {(ride_date, ride_time): total for ride_date, ride_time, total in rows}
+
+
+def refresh_slots(slots: Iterable[Slot]) -> None:
+    """Recount the booked riders of the given (ride date, slot) pairs.
+
+    The slot row is locked before the count, so a concurrent reservation
+    either commits first and is counted, or waits and adds to the recount.
+    """
+    for ride_date, ride_time in {(ride_date, ride_time) for ride_date, ride_time in slots if ride_time}:
+        with transaction.atomic():
+            occupancy = _get_or_create_slot(ride_date, ride_time)
+            SlotOccupancy.objects.select_for_update().get(pk=occupancy.pk)
+            riders = _booked_riders(booking__ride_date=ride_date, booking__ride_time=ride_time)
+            SlotOccupancy.objects.filter(pk=occupancy.pk).update(riders=riders.get((ride_date, ride_time), 0))
+
+
+def rebuild_occupancy() -> int:
+    """Recount every slot from the booking lines; returns the number of slots."""
+    with transaction.atomic():
+        slots = {(row.ride_date, row.ride_time): row for row in SlotOccupancy.objects.select_for_update()}
+        booked = _booked_riders()
+        for key, row in slots.items():
+            row.riders = booked.get(key, 0)
+        SlotOccupancy.objects.bulk_update(slots.values(), ["riders"], batch_size=500)
+        SlotOccupancy.objects.bulk_create(
+            [
+                SlotOccupancy(
+                    ride_date=ride_date,
+                    ride_time=ride_time,
+                    capacity=slot_capacity(ride_date, ride_time),
+                    riders=riders,
+                )
+                for (ride_date, ride_time), riders in booked.items()
+                if (ride_date, ride_time) not in slots
+            ]
+        )
+    return len(slots.keys() | booked.keys())
+
+
+def sync_slot_capacity(ride_date: date, ride_time: str) -> None:
+    SlotOccupancy.objects.filter(ride_date=ride_date, ride_time=ride_time).update(
+        capacity=slot_capacity(ride_date, ride_time)
+    )
+
+
+def sync_fleet_capacity() -> None:
+    """Apply the current bike count to upcoming slots without an override."""
+    overridden = SlotCapacity.objects.filter(
+        ride_date=OuterRef("ride_date"), ride_time=OuterRef("ride_time")
+    )
+    SlotOccupancy.objects.filter(ride_date__gte=timezone.localdate()).exclude(
+        Exists(overridden)
+    ).update(capacity=Bike.objects.count())
+
+
+# ---------------------------------------------------------------------------
+# Availability calendar
+# ---------------------------------------------------------------------------
+
+_AVAILABILITY_KEY = "myapp:availability:{}:{}"
+
+
+def _availability_key(ride_date: date, fleet_version: str) -> str:
+    # The fleet stamp covers the default capacity, which every day shares.
+    return _AVAILABILITY_KEY.format(fleet_version, ride_date.isoformat())
+
+
+def invalidate_availability(ride_date: date) -> None:
+    """Drop the cached day now and again after commit, like ``bump_version``."""
+    key = _availability_key(ride_date, versions.get_version(versions.FLEET))
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _compute_availability(first: date, last: date, days: List[date]) -> Dict[date, Dict[str, Any]]:
+    booked: Dict[date, Dict[str, Dict[str, int]]] = {}
+    rows = (
+        BookingItem.objects.filter(booking__ride_date__range=(first, last))
+        .values_list("booking__ride_date", "booking__ride_time", "participant_type")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+    )
+    for ride_date, ride_time, participant, total in rows:
+        slot = booked.setdefault(ride_date, {}).setdefault(ride_time or "", {})
+        slot[participant] = slot.get(participant, 0) + total
+
+    overrides = {
+        (ride_date, ride_time): value
+        for ride_date, ride_time, value in SlotCapacity.objects.filter(
+            ride_date__range=(first, last)
+        ).values_list("ride_date", "ride_time", "capacity")
+    }
+    fleet_size = Bike.objects.count()
+
+    result: Dict[date, Dict[str, Any]] = {}
+    for day in days:
+        counts = booked.get(day, {})
+        slots: Dict[str, Dict[str, int]] = {}
+        for slot_value in Booking.RideSlot.values:
+            slot_counts = counts.get(slot_value, {})
+            riders = slot_counts.get(ProgramRate.Participant.RIDER, 0)
+            slot_capacity_value = overrides.get((day, slot_value), fleet_size)
+            slots[slot_value] = {
+                "riders": riders,
+                "passengers": slot_counts.get(ProgramRate.Participant.PASSENGER, 0),
+                "capacity": slot_capacity_value,
+                "remaining": max(slot_capacity_value - riders, 0),
+            }
+        unscheduled = counts.get("", {})
+        result[day] = {
+            "date": day.isoformat(),
+            "slots": slots,
+            "unscheduled": {
+                "riders": unscheduled.get(ProgramRate.Participant.RIDER, 0),
+                "passengers": unscheduled.get(ProgramRate.Participant.PASSENGER, 0),
+            },
+        }
+    return result
+
+
+def month_availability(year: int, month: int) -> List[Dict[str, Any]]:
+    """Booked counts and remaining rider seats for every day of a month.
+
+    Days are cached individually; any missing days are filled by a single
+    grouped query over the month's booking items.
+    """
+    first = date(year, month, 1)
+    days = [first + timedelta(days=offset) for offset in range(calendar.monthrange(year, month)[1])]
+    fleet_version = versions.get_version(versions.FLEET)
+    keys = {day: _availability_key(day, fleet_version) for day in days}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [day for day, key in keys.items() if key not in cached]
+    if missing:
+        computed = {
+            keys[day]: value
+            for day, value in _compute_availability(missing[0], missing[-1], missing).items()
+        }
+        cache.set_many(computed, None)
+        cached.update(computed)
+
+    return [cached[keys[day]] for day in days]
@@ -0,0 +1,86 @@
+"""In-process catalog of active programs and their ordered images.
+
+Like the pricing table, the catalog is loaded once per worker and reused
+until the shared ``catalog`` version stamp changes (see ``signals.py``).
+Program pages read cards from it instead of querying images per program.
+
+Each program's ``updated_at`` also moves when one of its rates or images
+changes (``touch_programs``), so the snapshot can validate pages browsers
+already hold without going back to the database.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional, Tuple
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import versions
+from .models import Program, ProgramImage
+
+
+class CatalogProgram:
+    __slots__ = ("program", "images", "primary_image")
+
+    def __init__(self, program: Program, images: Iterable[ProgramImage]) -> None:
+        self.program = program
+        self.images: Tuple[ProgramImage, ...] = tuple(images)
+        self.primary_image: Optional[ProgramImage] = self.images[0] if self.images else None
+
+    @property
+    def gallery(self) -> Tuple[ProgramImage, ...]:
+        return self.images[1:]
+
+
+class CatalogSnapshot:
+    """Active programs in display order, with lookups by id and code."""
+
+    __slots__ = ("version", "programs", "by_id", "by_code", "stamp")
+
+    def __init__(self, version: str, programs: Iterable[CatalogProgram]) -> None:
+        self.version = version
+        self.programs: Tuple[CatalogProgram, ...] = tuple(programs)
+        self.by_id: Mapping[int, CatalogProgram] = MappingProxyType(
+            {entry.program.id: entry for entry in self.programs}
+        )
+        self.by_code: Mapping[str, CatalogProgram] = MappingProxyType(
+            {entry.program.code: entry for entry in self.programs}
+        )
+        latest = max((entry.program.updated_at for entry in self.programs), default=None)
+        # Any saved change moves the newest stamp, and hiding or deleting a
+        # program lowers the count, so equal stamps mean equal catalogs.
+        self.stamp = f"{len(self.programs)}-{latest.timestamp():.6f}" if latest else "0"
+
+
+_snapshot: CatalogSnapshot | None = None
+
+
+def _load_snapshot(version: str) -> CatalogSnapshot:
+    images = Prefetch("images", queryset=ProgramImage.objects.order_by("display_order", "id"))
+    programs = Program.objects.filter(active=True).prefetch_related(images)
+    return CatalogSnapshot(version, (CatalogProgram(program, program.images.all()) for program in programs))
+
+
+def get_catalog() -> CatalogSnapshot:
+    global _snapshot
+    version = versions.get_version(versions.CATALOG)
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = _load_snapshot(version)
+        _snapshot = snapshot
+    return snapshot
+
+
+def touch_programs(*program_ids: int) -> None:
+    """Move ``updated_at`` forward for changes saved outside the program rows."""
+    Program.objects.filter(pk__in=program_ids).update(updated_at=timezone.now())
+    versions.bump_version(versions.CATALOG)
+
+
+def program_updated_at(code: str) -> Optional[datetime]:
+    """``updated_at`` of an active program, or None if there is none."""
+    entry = get_catalog().by_code.get(code)
+    return entry.program.updated_at if entry else None
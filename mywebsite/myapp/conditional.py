@@ -0,0 +1,82 @@
+"""Conditional GETs for the public program pages.
+
+Validators come from ``Program.updated_at``, which moves whenever a program,
+one of its rates or one of its images changes. They are read from the
+in-process catalog (see ``catalog.py``), and ``condition()`` checks them
+before the view runs. A browser or crawler revalidating an unchanged page
+gets a 304 without a query once the catalog is warm, or after the single
+catalog load when it is not. The home and booking pages also show staff and
+add-ons, which have no such column. Their ETag adds those models' version
+stamps, and they send no ``Last-Modified``, which could not cover those
+changes. The booking form also carries a CSRF token, so its ETag includes a
+digest of the visitor's CSRF secret; the secret rotates at login, and a page
+kept from before would then fail its POST.
+
+Validators are only sent to visitors who share pages (see
+``pagecache.shares_pages``); signed-in pages carry the user's name and forms.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Optional
+
+from django.http import HttpRequest
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import versions
+from .catalog import get_catalog, program_updated_at
+from .pagecache import shares_pages
+
+
+def conditional_page(etag_func: Optional[Callable] = None, last_modified_func: Optional[Callable] = None) -> Callable:
+    """``condition()`` plus ``Cache-Control: no-cache`` on validated pages.
+
+    Without ``no-cache`` browsers may reuse a page with a ``Last-Modified``
+    for a while without asking, instead of revalidating it.
+    """
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header("ETag") or response.has_header("Last-Modified"):
+                patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def _validates(request: HttpRequest) -> bool:
+    return request.method in ("GET", "HEAD") and shares_pages(request)
+
+
+def program_etag(request: HttpRequest, code: str) -> Optional[str]:
+    updated_at = program_updated_at(code) if _validates(request) else None
+    return f"program-{code}-{updated_at.timestamp():.6f}" if updated_at else None
+
+
+def program_last_modified(request: HttpRequest, code: str) -> Optional[datetime]:
+    return program_updated_at(code) if _validates(request) else None
+
+
+def home_etag(request: HttpRequest) -> Optional[str]:
+    if not _validates(request):
+        return None
+    return f"home-{get_catalog().stamp}-{versions.get_version(versions.STAFF)}"
+
+
+def booking_etag(request: HttpRequest) -> Optional[str]:
+    # Set by ``CsrfViewMiddleware`` from the visitor's cookie, if any.
+    secret = request.META.get("CSRF_COOKIE")
+    if not secret or not _validates(request):
+        return None
+    secret_digest = hashlib.sha256(secret.encode()).hexdigest()[:16]
+    return f"booking-{get_catalog().stamp}-{versions.get_version(versions.PRICING)}-{secret_digest}"
@@ -0,0 +1,147 @@
+"""Streaming booking exports for the manage-bookings screen.
+
+Bookings are read in fixed-size chunks, each with its own prefetch of items
+and add-ons. Rows are written to the response chunk by chunk, so memory use
+depends on the chunk size rather than on how many bookings match.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections import defaultdict
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import BookingAddon, BookingItem
+
+EXPORT_CHUNK_SIZE = 1000
+
+COLUMNS = (
+    "booking_id",
+    "created_at",
+    "full_name",
+    "email",
+    "phone",
+    "ride_date",
+    "ride_time",
+    "booking_total",
+    "line_type",
+    "code",
+    "participant",
+    "age_group",
+    "quantity",
+    "unit_price",
+    "line_total",
+)
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _batched(rows: Iterator[Tuple[Any, ...]], size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _lines_by_booking(booking_ids: List[int]) -> Dict[int, List[Tuple[Any, ...]]]:
+    lines: Dict[int, List[Tuple[Any, ...]]] = defaultdict(list)
+    items = (
+        BookingItem.objects.filter(booking_id__in=booking_ids)
+        .order_by("booking_id", "id")
+        .values_list(
+            "booking_id", "program__code", "participant_type", "age_group", "quantity", "unit_price", "line_total"
+        )
+    )
+    for booking_id, code, participant, age_group, quantity, unit_price, line_total in items:
+        lines[booking_id].append(
+            ("item", code, participant, age_group, quantity, str(unit_price), str(line_total))
+        )
+    addons = (
+        BookingAddon.objects.filter(booking_id__in=booking_ids)
+        .order_by("booking_id", "id")
+        .values_list("booking_id", "addon__code", "quantity", "unit_price", "line_total")
+    )
+    for booking_id, code, quantity, unit_price, line_total in addons:
+        lines[booking_id].append(("addon", code, "", "", quantity, str(unit_price), str(line_total)))
+    return lines
+
+
+def iter_booking_rows(bookings: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[Tuple[Any, ...]]]:
+    """Yield the flattened rows of each chunk of bookings.
+
+    Bookings are streamed from one cursor; each chunk then loads its items
+    and add-ons with one query apiece. Every line becomes a row carrying its
+    booking's columns, and a booking without lines still produces one row.
+    """
+    booking_rows = (
+        bookings.order_by("created_at", "id")
+        .values_list("id", "created_at", "full_name", "email", "phone", "ride_date", "ride_time", "total_amount")
+        .iterator(chunk_size=chunk_size)
+    )
+    empty = [("", "", "", "", "", "", "")]
+    tz = timezone.get_current_timezone()
+    for chunk in _batched(booking_rows, chunk_size):
+        lines = _lines_by_booking([row[0] for row in chunk])
+        rows: List[Tuple[Any, ...]] = []
+        for booking_id, created_at, full_name, email, phone, ride_date, ride_time, total in chunk:
+            head = (
+                booking_id,
+                created_at.astimezone(tz).isoformat(),
+                full_name,
+                email,
+                phone,
+                ride_date.isoformat(),
+                ride_time,
+                str(total),
+            )
+            rows.extend(head + line for line in lines.get(booking_id) or empty)
+        yield rows
+
+
+# Spreadsheets run cells starting with these as formulas.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _spreadsheet_safe(row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """Quote text cells that a spreadsheet would otherwise evaluate."""
+    return tuple(
+        f"'{value}" if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) else value
+        for value in row
+    )
+
+
+def csv_chunks(bookings: QuerySet) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in iter_booking_rows(bookings):
+        writer.writerows(_spreadsheet_safe(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(bookings: QuerySet) -> Iterator[str]:
+    for rows in iter_booking_rows(bookings):
+        yield "".join(json.dumps(dict(zip(COLUMNS, row))) + "\n" for row in rows)
+
+
+def stream_bookings(bookings: QuerySet, export_format: str = "csv") -> StreamingHttpResponse:
+    chunks = csv_chunks(bookings) if export_format == "csv" else ndjson_chunks(bookings)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[export_format])
+    filename = f"bookings-{timezone.localdate():%Y%m%d}.{export_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
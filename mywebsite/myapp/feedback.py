@@ -0,0 +1,166 @@
+"""Staff feedback writes and the per-staff counters they maintain.
+
+``Staff`` carries like, dislike and comment counts plus the time of the most
+recent feedback so list pages never aggregate ``StaffFeedback``. Each write
+applies the difference between the old and new feedback row with F()
+expressions in the same transaction; ``reconcile_staff_feedback`` recomputes
+every counter set-based.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Staff, StaffFeedback
+
+# (sentiment, has a comment) of a feedback row, or None when there is no row.
+FeedbackState = Optional[Tuple[str, bool]]
+
+_COUNTERS = ("likes_count", "dislikes_count", "comment_count")
+
+
+def _counter_values(state: FeedbackState) -> Dict[str, int]:
+    if state is None:
+        return dict.fromkeys(_COUNTERS, 0)
+    sentiment, has_comment = state
+    return {
+        "likes_count": int(sentiment == StaffFeedback.Sentiment.LIKE),
+        "dislikes_count": int(sentiment == StaffFeedback.Sentiment.DISLIKE),
+        "comment_count": int(has_comment),
+    }
+
+
+def _latest_feedback(staff_ref: Any) -> Subquery:
+    return Subquery(
+        StaffFeedback.objects.filter(staff=staff_ref)
+        .order_by()
+        .values("staff")
+        .annotate(latest=Max("updated_at"))
+        .values("latest")[:1]
+    )
+
+
+def apply_feedback_change(
+    staff_id: int,
+    before: FeedbackState,
+    after: FeedbackState,
+    updated_at: Optional[datetime] = None,
+) -> None:
+    """Move ``staff_id``'s counters from the ``before`` row to the ``after`` row.
+
+    Pass the row's ``updated_at`` for writes; for deletes (``after=None``)
+    the latest timestamp is looked up again.
+    """
+    old = _counter_values(before)
+    new = _counter_values(after)
+    updates: Dict[str, Any] = {
+        name: F(name) + (new[name] - old[name]) for name in _COUNTERS if new[name] != old[name]
+    }
+    updates["latest_feedback"] = updated_at if updated_at is not None else _latest_feedback(OuterRef("pk"))
+    Staff.objects.filter(pk=staff_id).update(**updates)
+
+
+_UPSERT_VENDORS = {"sqlite", "postgresql"}
+
+
+def _upsert_feedback(staff_id: int, user_id: int, updates: Dict[str, Any], now: datetime):
+    """Insert or update one feedback row in a single statement.
+
+    Returns ``(id, previous_sentiment, had_comment, sentiment, comment)``;
+    ``previous_sentiment`` is None when the row was inserted.
+    """
+    table = connection.ops.quote_name(StaffFeedback._meta.db_table)
+    assignments = [
+        f"previous_sentiment = {table}.sentiment",
+        f"had_comment = ({table}.comment <> '')",
+        *(f"{column} = excluded.{column}" for column in ("sentiment", "comment") if column in updates),
+        "updated_at = excluded.updated_at",
+    ]
+    sql = (
+        f"INSERT INTO {table} "
+        "(staff_id, user_id, sentiment, comment, created_at, updated_at, previous_sentiment, had_comment) "
+        "VALUES (%s, %s, %s, %s, %s, %s, NULL, NULL) "
+        f"ON CONFLICT (staff_id, user_id) DO UPDATE SET {', '.join(assignments)} "
+        "RETURNING id, previous_sentiment, had_comment, sentiment, comment"
+    )
+    timestamp = connection.ops.adapt_datetimefield_value(now)
+    params = [
+        staff_id,
+        user_id,
+        updates.get("sentiment", StaffFeedback.Sentiment.NONE),
+        updates.get("comment", ""),
+        timestamp,
+        timestamp,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def submit_feedback(staff: Staff, user: Any, updates: Dict[str, Any]) -> StaffFeedback:
+    """Create or update ``user``'s feedback for ``staff`` and adjust its counters.
+
+    On SQLite and PostgreSQL the row is written with one ``INSERT ... ON
+    CONFLICT DO UPDATE``, so simultaneous votes from the same user serialise
+    on the unique (staff, user) index instead of failing.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if connection.vendor not in _UPSERT_VENDORS:
+            previous = (
+                StaffFeedback.objects.select_for_update()
+                .filter(staff=staff, user=user)
+                .values_list("sentiment", "comment")
+                .first()
+            )
+            feedback, _ = StaffFeedback.objects.update_or_create(staff=staff, user=user, defaults=updates)
+            apply_feedback_change(
+                staff.pk,
+                None if previous is None else (previous[0], bool(previous[1])),
+                (feedback.sentiment, bool(feedback.comment)),
+                updated_at=feedback.updated_at,
+            )
+            return feedback
+
+        feedback_id, previous_sentiment, had_comment, sentiment, comment = _upsert_feedback(
+            staff.pk, user.pk, updates, now
+        )
+        before = None if previous_sentiment is None else (previous_sentiment, bool(had_comment))
+        apply_feedback_change(staff.pk, before, (sentiment, bool(comment)), updated_at=now)
+
+    return StaffFeedback(
+        id=feedback_id, staff=staff, user=user, sentiment=sentiment, comment=comment, updated_at=now
+    )
+
+
+def reconcile(staff_ids: Iterable[int] | None = None) -> int:
+    """Recompute counters from ``StaffFeedback`` in one UPDATE; returns rows updated."""
+
+    def count(condition: Q) -> Coalesce:
+        return Coalesce(
+            Subquery(
+                StaffFeedback.objects.filter(condition, staff=OuterRef("pk"))
+                .order_by()
+                .values("staff")
+                .annotate(total=Count("id"))
+                .values("total")[:1],
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+
+    staff = Staff.objects.all()
+    if staff_ids is not None:
+        staff = staff.filter(pk__in=list(staff_ids))
+    return staff.update(
+        likes_count=count(Q(sentiment=StaffFeedback.Sentiment.LIKE)),
+        dislikes_count=count(Q(sentiment=StaffFeedback.Sentiment.DISLIKE)),
+        comment_count=count(~Q(comment__isnull=True) & ~Q(comment__exact="")),
+        latest_feedback=_latest_feedback(OuterRef("pk")),
+    )
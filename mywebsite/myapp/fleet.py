@@ -0,0 +1,39 @@
+"""Bike assignment writes for the fleet dashboard."""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, Iterable
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import BikeAssignment
+
+
+def save_assignments(day: date, bike_ids: Iterable[int], user: User) -> Dict[str, int]:
+    """Make ``bike_ids`` the exact set of bikes assigned on ``day``.
+
+    Runs a fixed number of queries however many bikes change: one read of the
+    current set, one DELETE for deselected bikes and one upsert on the
+    (bike, date) constraint that creates new rows and re-stamps kept ones, so
+    two staff members saving the same day cannot collide.
+    """
+    selected = set(bike_ids)
+    with transaction.atomic():
+        existing = set(BikeAssignment.objects.filter(date=day).values_list("bike_id", flat=True))
+        removed = existing - selected
+        if removed:
+            BikeAssignment.objects.filter(date=day, bike_id__in=removed).delete()
+        if selected:
+            BikeAssignment.objects.bulk_create(
+                [BikeAssignment(bike_id=bike_id, date=day, assigned_by=user) for bike_id in sorted(selected)],
+                update_conflicts=True,
+                unique_fields=["bike", "date"],
+                update_fields=["assigned_by", "updated_at"],
+            )
+    return {
+        "added": len(selected - existing),
+        "removed": len(removed),
+        "kept": len(selected & existing),
+    }
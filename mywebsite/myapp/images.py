@@ -0,0 +1,356 @@
+"""Responsive derivatives for uploaded images.
+
+Every stored image gets fixed-width copies in its own format plus WebP,
+saved next to the original (``programs/ride.jpg`` gives
+``programs/ride.640w.jpg`` and ``programs/ride.640w.webp``). Resizing runs in
+a process pool once the upload's transaction commits, so views such as
+``addProgram`` never wait on Pillow. The widths that were produced are
+recorded in the model's ``<field>_variants`` column, and templates build
+``srcset`` from that record without touching the storage.
+
+Bundled static images get the same treatment from
+``build_image_derivatives --static``, which records them in
+``static/image/derivatives.json``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import io
+import json
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Model
+from django.templatetags.static import static
+from PIL import Image, ImageOps
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (320, 640, 1024)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+STATIC_MANIFEST = "image/derivatives.json"
+
+# (model label, image field, version stamp whose cached copies hold the row).
+IMAGE_FIELDS = (
+    ("myapp.ProgramImage", "image", versions.CATALOG),
+    ("myapp.Staff", "avatar", versions.STAFF),
+    ("myapp.Product", "picture", versions.PRODUCTS),
+)
+
+# Pillow format -> extension of the resized copies; anything else becomes JPEG.
+_KEPT_FORMATS = {"JPEG": "jpg", "PNG": "png"}
+
+# {"name", "width", "height", "ext", "widths"}: see ``render_derivatives``.
+Manifest = Dict[str, Any]
+
+
+def variants_field(field_name: str) -> str:
+    return f"{field_name}_variants"
+
+
+def derivative_name(name: str, width: int, extension: str) -> str:
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}.{width}w.{extension}"))
+
+
+def is_derivative(name: str) -> bool:
+    stem = PurePosixPath(name).stem
+    suffix = stem.rpartition(".")[2]
+    return suffix.endswith("w") and suffix[:-1].isdigit()
+
+
+def _encode(image: Image.Image, extension: str) -> bytes:
+    buffer = io.BytesIO()
+    if extension == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif extension == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_derivatives(data: bytes, widths: Iterable[int] = WIDTHS) -> Tuple[Manifest, Dict[Tuple[int, str], bytes]]:
+    """Resize one encoded image; returns its manifest and the encoded copies.
+
+    Copies are keyed by ``(width, extension)``. Widths at or above the
+    original's are skipped rather than upscaled, and a full-width WebP is
+    always included. Runs in worker processes, so it touches neither Django
+    nor the storage.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        extension = _KEPT_FORMATS.get(source.format, "jpg")
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if extension == "jpg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+
+    sizes = sorted({width for width in widths if 0 < width < image.width})
+    files: Dict[Tuple[int, str], bytes] = {}
+    for width in sizes:
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        files[width, extension] = _encode(resized, extension)
+        files[width, "webp"] = _encode(resized, "webp")
+    files[image.width, "webp"] = _encode(image, "webp")
+    manifest = {"width": image.width, "height": image.height, "ext": extension, "widths": sizes}
+    return manifest, files
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared worker pool, or None when ``IMAGE_WORKERS`` is 0 (inline)."""
+    global _pool
+    workers = settings.IMAGE_WORKERS
+    if workers <= 0:
+        return None
+    if _pool is None:
+        # Spawned rather than forked: the web process has threads and open
+        # database connections that a fork would copy.
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _stamp_for(model: Type[Model]) -> Optional[str]:
+    for label, _, stamp in IMAGE_FIELDS:
+        if model._meta.label == label:
+            return stamp
+    return None
+
+
+def _record_change(instance: Model) -> None:
+    """Retire cached pages showing a row whose manifest was just recorded."""
+    stamp = _stamp_for(type(instance))
+    if stamp:
+        versions.bump_version(stamp)
+    if type(instance)._meta.label == "myapp.ProgramImage":
+        from .catalog import touch_programs
+
+        # The new ``srcset`` changes the program's page too.
+        touch_programs(instance.program_id)
+
+
+def store_derivatives(instance: Model, field_name: str, name: str, result: Tuple[Manifest, Dict]) -> Manifest:
+    """Save rendered copies next to ``name`` and record them on the row."""
+    manifest, files = result
+    storage = getattr(instance, field_name).storage
+    for (width, extension), content in files.items():
+        target = derivative_name(name, width, extension)
+        # Derivative names are fixed, so replace rather than let the storage
+        # pick a fresh suffix.
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(content))
+
+    manifest = {"name": name, **manifest}
+    model = type(instance)
+    # Only record the manifest if the row still points at this file.
+    updated = model._default_manager.filter(pk=instance.pk, **{field_name: name}).update(
+        **{variants_field(field_name): manifest}
+    )
+    if updated:
+        setattr(instance, variants_field(field_name), manifest)
+        _record_change(instance)
+    return manifest
+
+
+def reuse_manifest(instance: Model, field_name: str, name: str) -> bool:
+    """Record the manifest of another row that stores the same file, if any.
+
+    Content-addressed storage hands identical uploads the same name, so
+    their derivatives already exist next to it.
+    """
+    model = type(instance)
+    variants = variants_field(field_name)
+    manifest = (
+        model._default_manager.filter(**{field_name: name, f"{variants}__name": name})
+        .exclude(pk=instance.pk)
+        .values_list(variants, flat=True)
+        .first()
+    )
+    if manifest is None:
+        return False
+    model._default_manager.filter(pk=instance.pk, **{field_name: name}).update(**{variants: manifest})
+    setattr(instance, variants, manifest)
+    _record_change(instance)
+    return True
+
+
+def _read(instance: Model, field_name: str) -> bytes:
+    field_file = getattr(instance, field_name)
+    with field_file.storage.open(field_file.name, "rb") as handle:
+        return handle.read()
+
+
+def process(instance: Model, field_name: str) -> Optional[Future]:
+    """Build the derivatives of ``instance.<field_name>``.
+
+    With a pool, returns the future of the resize; the files and manifest
+    are stored from its callback. Without one, does everything inline.
+    """
+    if not getattr(instance, field_name):
+        return None
+    name = getattr(instance, field_name).name
+    if reuse_manifest(instance, field_name, name):
+        return None
+    pool = _get_pool()
+    try:
+        data = _read(instance, field_name)
+        if pool is None:
+            store_derivatives(instance, field_name, name, render_derivatives(data))
+            return None
+    except Exception:
+        # The upload itself succeeded; pages fall back to the original.
+        logger.exception("Could not build image derivatives for %s", name)
+        return None
+
+    submitter = threading.get_ident()
+
+    def finish(future: Future) -> None:
+        try:
+            store_derivatives(instance, field_name, name, future.result())
+        except Exception:
+            logger.exception("Could not build image derivatives for %s", name)
+        finally:
+            # Callbacks normally run on the pool's manager thread, which
+            # would otherwise keep its own connection open for good.
+            if threading.get_ident() != submitter:
+                connection.close()
+
+    future = pool.submit(render_derivatives, data)
+    future.add_done_callback(finish)
+    return future
+
+
+def render_all(datas: Iterable[bytes]) -> Iterator[Tuple[Manifest, Dict]]:
+    """``render_derivatives`` over many images on the pool, results in order.
+
+    Keeps at most a few images per worker in flight, so a large backfill
+    does not hold every original in memory at once.
+    """
+    pool = _get_pool()
+    if pool is None:
+        yield from map(render_derivatives, datas)
+        return
+    pending: Deque[Future] = deque()
+    limit = 2 * settings.IMAGE_WORKERS
+    for data in datas:
+        pending.append(pool.submit(render_derivatives, data))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def manifest_for(field_file: Any) -> Optional[Manifest]:
+    """The recorded manifest of a stored image, if it matches the current file."""
+    if not field_file:
+        return None
+    manifest = getattr(field_file.instance, variants_field(field_file.field.name), None)
+    if manifest and manifest.get("name") == field_file.name:
+        return manifest
+    return None
+
+
+def schedule(instance: Model, field_name: str) -> None:
+    """Queue derivatives after commit when the stored file has none yet."""
+    if getattr(instance, field_name) and manifest_for(getattr(instance, field_name)) is None:
+        transaction.on_commit(lambda: process(instance, field_name))
+
+
+def image_fields() -> List[Tuple[Type[Model], str]]:
+    return [(apps.get_model(label), field_name) for label, field_name, _ in IMAGE_FIELDS]
+
+
+def _sources(url_for, name: str, manifest: Optional[Manifest]) -> Dict[str, Any]:
+    original = url_for(name)
+    if not manifest:
+        return {"src": original, "srcset": "", "webp_srcset": "", "width": None, "height": None}
+    fallback = [f"{url_for(derivative_name(name, width, manifest['ext']))} {width}w" for width in manifest["widths"]]
+    fallback.append(f"{original} {manifest['width']}w")
+    webp = [
+        f"{url_for(derivative_name(name, width, 'webp'))} {width}w"
+        for width in [*manifest["widths"], manifest["width"]]
+    ]
+    return {
+        "src": original,
+        "srcset": ", ".join(fallback),
+        "webp_srcset": ", ".join(webp),
+        "width": manifest["width"],
+        "height": manifest["height"],
+    }
+
+
+def sources(image: Any) -> Dict[str, Any]:
+    """``src``, ``srcset`` and WebP ``srcset`` for a stored or static image.
+
+    ``image`` is an image ``FieldFile`` or a static path such as
+    ``"image/atv.png"``. Images without derivatives yield only ``src``.
+    """
+    if isinstance(image, str):
+        return _sources(static, image, static_manifests().get(image))
+    return _sources(image.storage.url, image.name, manifest_for(image))
+
+
+_static_manifests: Optional[Dict[str, Manifest]] = None
+
+
+def static_manifests() -> Dict[str, Manifest]:
+    global _static_manifests
+    if _static_manifests is None:
+        found = finders.find(STATIC_MANIFEST)
+        manifests: Dict[str, Manifest] = {}
+        if found:
+            with open(found, encoding="utf-8") as handle:
+                manifests = json.load(handle)
+        _static_manifests = manifests
+    return _static_manifests
+
+
+def build_static(directory: Path, force: bool = False) -> int:
+    """Write derivatives for the images under a static directory.
+
+    Returns the number of images processed. The manifest is written to
+    ``STATIC_MANIFEST`` inside ``directory``.
+    """
+    global _static_manifests
+    manifest_path = directory / STATIC_MANIFEST
+    manifests: Dict[str, Manifest] = {}
+    if manifest_path.exists() and not force:
+        manifests = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    pending = []
+    for path in sorted(directory.rglob("*")):
+        relative = path.relative_to(directory).as_posix()
+        if path.suffix.lower() not in (".jpg", ".jpeg", ".png") or is_derivative(relative):
+            continue
+        if relative not in manifests:
+            pending.append((path, relative))
+
+    results = render_all(path.read_bytes() for path, _ in pending)
+    for (path, relative), (manifest, files) in zip(pending, results):
+        for (width, extension), content in files.items():
+            (directory / derivative_name(relative, width, extension)).write_bytes(content)
+        manifests[relative] = {"name": relative, **manifest}
+
+    manifest_path.write_text(json.dumps(manifests, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    _static_manifests = None
+    return len(pending)
@@ -0,0 +1,68 @@
+"""Contact inbox triage.
+
+Bulk actions take any number of selected contacts and run a fixed number of
+statements: one UPDATE to mark them complete, and for notes one read of which
+contacts already have an ``Action``, one UPDATE of those rows and one
+``bulk_create`` for the rest.
+
+The header counts are one filtered aggregate, cached under the ``inbox``
+version stamp that every change to the contacts bumps.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import versions
+from .models import Action, contactList
+
+CANNED_ACTIONS = (
+    "Replied by email.",
+    "Called the rider back.",
+    "Forwarded to the booking team.",
+    "No follow-up needed.",
+)
+
+
+_COUNTS_KEY = "myapp:inbox-counts:{}"
+
+
+def get_counts() -> Dict[str, int]:
+    """``total`` and ``open`` message counts for the inbox header."""
+    key = _COUNTS_KEY.format(versions.get_version(versions.INBOX))
+    counts = cache.get(key)
+    if counts is None:
+        counts = contactList.objects.aggregate(total=Count("id"), open=Count("id", filter=Q(complete=False)))
+        cache.set(key, counts, None)
+    return counts
+
+
+def mark_complete(contact_ids: Iterable[int]) -> int:
+    updated = contactList.objects.filter(pk__in=list(contact_ids), complete=False).update(complete=True)
+    if updated:
+        versions.bump_version(versions.INBOX)
+    return updated
+
+
+def attach_action(contact_ids: Iterable[int], detail: str) -> int:
+    """Set the action note of each contact, creating notes where missing."""
+    with transaction.atomic():
+        # Ids deleted since the page was rendered simply drop out here.
+        rows = (
+            contactList.objects.filter(pk__in=list(contact_ids))
+            .annotate(has_action=Exists(Action.objects.filter(contactList=OuterRef("pk"))))
+            .values_list("pk", "has_action")
+        )
+        existing: List[int] = []
+        missing: List[int] = []
+        for pk, has_action in rows:
+            (existing if has_action else missing).append(pk)
+        if existing:
+            Action.objects.filter(contactList_id__in=existing).update(actionsDetail=detail)
+        if missing:
+            Action.objects.bulk_create(Action(contactList_id=pk, actionsDetail=detail) for pk in missing)
+    return len(existing) + len(missing)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from myapp import storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move media saved before content-addressed storage into the blob tree, "
+        "merging identical files. Run build_image_derivatives afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without touching files.")
+
+    def handle(self, *args, **options):
+        stats = storage.adopt_existing_files(dry_run=options["dry_run"])
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {stats['files']} file(s) used by {stats['rows']} row(s) into {stats['blobs']} blob(s), "
+                f"saving {stats['bytes_saved']} bytes."
+            )
+        )
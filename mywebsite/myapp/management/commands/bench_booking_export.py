@@ -0,0 +1,95 @@
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp.exports import csv_chunks
+from myapp.models import Booking, BookingItem, Program, ProgramRate
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Export synthetic bookings as CSV and report peak memory and throughput. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=100_000)
+        parser.add_argument("--max-peak-mb", type=float, default=32.0)
+        parser.add_argument("--min-rows-per-second", type=float, default=10000.0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        program = Program.objects.create(code="BENCHEXP", name="Export benchmark", active=False)
+        first_day = date(2024, 1, 1)
+        batch = []
+        for index in range(options["bookings"]):
+            batch.append(
+                Booking(
+                    full_name=f"Guest {index}",
+                    email=f"guest{index}@example.com",
+                    phone="0800000000",
+                    ride_date=first_day + timedelta(days=index % 365),
+                    ride_time=Booking.RideSlot.values[index % 3],
+                    total_amount=Decimal("2400.00"),
+                )
+            )
+            if len(batch) == 5000:
+                self._insert(batch, program)
+                batch = []
+        if batch:
+            self._insert(batch, program)
+
+        # Throughput and memory are measured in separate passes because
+        # tracemalloc slows allocation-heavy code down several times over.
+        rows = 0
+        started = time.perf_counter()
+        for chunk in csv_chunks(Booking.objects.all()):
+            rows += chunk.count("\n")
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        for chunk in csv_chunks(Booking.objects.all()):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        peak_mb = peak / (1024 * 1024)
+        rate = rows / elapsed if elapsed else float("inf")
+        self.stdout.write(
+            f"{options['bookings']} bookings, {rows} CSV lines in {elapsed:.2f} s "
+            f"({rate:,.0f} rows/s), peak traced memory {peak_mb:.1f} MB"
+        )
+        if peak_mb > options["max_peak_mb"]:
+            raise CommandError(f"Peak memory {peak_mb:.1f} MB is above {options['max_peak_mb']} MB.")
+        if rate < options["min_rows_per_second"]:
+            raise CommandError(f"Throughput {rate:,.0f} rows/s is below {options['min_rows_per_second']:,.0f}.")
+        self.stdout.write(self.style.SUCCESS("Export stayed within the memory and throughput targets."))
+
+    def _insert(self, bookings, program):
+        Booking.objects.bulk_create(bookings)
+        BookingItem.objects.bulk_create(
+            [
+                BookingItem(
+                    booking=booking,
+                    program=program,
+                    participant_type=ProgramRate.Participant.RIDER,
+                    age_group=ProgramRate.AgeGroup.ADULT,
+                    quantity=2,
+                    unit_price=Decimal("1200.00"),
+                    line_total=Decimal("2400.00"),
+                )
+                for booking in bookings
+            ]
+        )
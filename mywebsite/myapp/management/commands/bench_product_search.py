@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from myapp import search
+from myapp.models import Product
+
+
+class _Rollback(Exception):
+    pass
+
+
+SYLLABLES = ("ka", "ri", "to", "ne", "su", "mo", "la", "vi", "do", "pe", "an", "or", "ul", "ex", "im")
+COMMON_WORDS = "helmet gloves goggles jacket boots trail dune canyon tyre chain brake throttle".split()
+
+
+def _vocabulary(rng, size):
+    words = set(COMMON_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words, key=lambda word: (word not in COMMON_WORDS, rng.random()))
+
+
+class Command(BaseCommand):
+    help = "Compare full-text product search with icontains on synthetic products. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError("The full-text index is not available on this database.")
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        rng = random.Random(options["seed"])
+        # Zipf-like word frequencies: a few words are everywhere, most are rare.
+        vocabulary = _vocabulary(rng, 20_000)
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        batch = []
+        for index in range(options["products"]):
+            batch.append(
+                Product(
+                    title=" ".join(rng.choices(vocabulary, weights, k=3)),
+                    description=" ".join(rng.choices(vocabulary, weights, k=30)),
+                )
+            )
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_create(batch)
+        indexed = search.rebuild()
+
+        terms = [
+            " ".join(rng.choices(vocabulary[:2000], k=rng.choice((1, 2)))) for _ in range(options["queries"])
+        ]
+        terms += [term[:4] for term in terms[:10]]  # partial words, as typed
+
+        # Both paths do what a product list page needs: a count and page one.
+        def icontains(term):
+            queryset = Product.objects.filter(Q(title__icontains=term) | Q(description__icontains=term))
+            return queryset.count(), list(queryset.order_by("title")[:9])
+
+        def full_text(term):
+            results = search.RankedProducts(search.search_ids(term))
+            return len(results), results[:9]
+
+        results = {}
+        for label, run in (("icontains", icontains), ("full-text", full_text)):
+            started = time.perf_counter()
+            for term in terms:
+                run(term)
+            elapsed = time.perf_counter() - started
+            results[label] = elapsed
+            self.stdout.write(
+                f"{label:>10}: {len(terms)} searches in {elapsed:.3f} s ({1000 * elapsed / len(terms):.2f} ms each)"
+            )
+
+        speedup = results["icontains"] / results["full-text"] if results["full-text"] else float("inf")
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {indexed} products; full-text search is {speedup:.1f}x the icontains speed.")
+        )
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+
+from myapp.pricing import get_pricing
+from myapp.views import booking_quote
+
+
+class Command(BaseCommand):
+    help = "Time the booking quote endpoint with a warm pricing table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=5000)
+        parser.add_argument("--target-ms", type=float, default=1.0, help="Fail when p95 exceeds this.")
+
+    def handle(self, *args, **options):
+        pricing = get_pricing()
+        if not pricing.program_rates:
+            raise CommandError("No program rates configured; add a program before benchmarking.")
+
+        params = {"active_program": [str(program_id) for program_id in pricing.program_rates]}
+        for program_id, rates in pricing.program_rates.items():
+            for participant, age_group in rates:
+                params[f"{participant}_{age_group}_{program_id}"] = "2"
+        for addon_id in pricing.addon_prices:
+            params[f"addon_{addon_id}"] = "1"
+
+        request = RequestFactory().get(reverse("booking-quote"), params)
+        response = booking_quote(request)
+        if response.status_code != 200:
+            raise CommandError(f"Quote failed: {response.content.decode()}")
+
+        samples = []
+        for _ in range(options["iterations"]):
+            started = time.perf_counter()
+            booking_quote(request)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        self.stdout.write(
+            f"{len(params) - 1} fields, {options['iterations']} calls: "
+            f"mean {statistics.mean(samples):.3f} ms, median {statistics.median(samples):.3f} ms, "
+            f"p95 {p95:.3f} ms"
+        )
+        if p95 > options["target_ms"]:
+            raise CommandError(f"p95 {p95:.3f} ms is above the {options['target_ms']} ms target.")
+        self.stdout.write(self.style.SUCCESS(f"Within the {options['target_ms']} ms target."))
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import images
+
+
+class Command(BaseCommand):
+    help = "Build responsive image derivatives for stored uploads, and optionally for bundled static images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild images that already have derivatives.")
+        parser.add_argument(
+            "--static",
+            action="store_true",
+            help="Also process the images in the first STATICFILES_DIRS entry.",
+        )
+
+    def handle(self, *args, **options):
+        force = options["force"]
+        pending = []
+        missing = []
+        for model, field_name in images.image_fields():
+            rows = model._default_manager.exclude(**{f"{field_name}__isnull": True}).exclude(**{field_name: ""})
+            for instance in rows.iterator():
+                field_file = getattr(instance, field_name)
+                if not force and images.manifest_for(field_file) is not None:
+                    continue
+                if not field_file.storage.exists(field_file.name):
+                    missing.append(field_file.name)
+                    continue
+                pending.append((instance, field_name, field_file.name))
+
+        # Rows sharing a content-addressed file are rendered once.
+        unique = {}
+        for instance, field_name, name in pending:
+            unique.setdefault((type(instance), field_name, name), (instance, field_name, name))
+
+        def originals():
+            for instance, field_name, name in unique.values():
+                with getattr(instance, field_name).storage.open(name, "rb") as handle:
+                    yield handle.read()
+
+        for (instance, field_name, name), result in zip(unique.values(), images.render_all(originals())):
+            images.store_derivatives(instance, field_name, name, result)
+            self.stdout.write(f"{type(instance).__name__} {instance.pk}: {name}")
+        for instance, field_name, name in pending:
+            if unique[type(instance), field_name, name][0] is not instance:
+                images.reuse_manifest(instance, field_name, name)
+
+        if options["static"]:
+            if not settings.STATICFILES_DIRS:
+                raise CommandError("STATICFILES_DIRS is empty; there are no bundled images to process.")
+            count = images.build_static(Path(settings.STATICFILES_DIRS[0]), force=force)
+            self.stdout.write(f"Processed {count} static image(s).")
+
+        for name in missing:
+            self.stderr.write(f"Missing file: {name}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Built derivatives for {len(unique)} stored image(s) used by {len(pending)} row(s).")
+        )
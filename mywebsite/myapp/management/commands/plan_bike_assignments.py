@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp.fleet import save_assignments
+from myapp.models import BikeAssignment
+from myapp.planner import plan_range
+
+
+class Command(BaseCommand):
+    help = "Propose bike assignments from booked riders for a range of dates (next week by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First date (YYYY-MM-DD); defaults to next Monday.")
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--apply", action="store_true", help="Save the proposals as assignments.")
+        parser.add_argument(
+            "--overwrite", action="store_true", help="With --apply, also replace days that already have assignments."
+        )
+        parser.add_argument("--user", help="Username recorded as assigned_by; defaults to the first superuser.")
+
+    def handle(self, *args, **options):
+        if options["start"]:
+            try:
+                start = datetime.strptime(options["start"], "%Y-%m-%d").date()
+            except ValueError as exc:
+                raise CommandError("--start must be a YYYY-MM-DD date.") from exc
+        else:
+            today = timezone.localdate()
+            start = today + timedelta(days=7 - today.weekday())
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+        end = start + timedelta(days=options["days"] - 1)
+
+        user = None
+        if options["apply"]:
+            if options["user"]:
+                user = User.objects.filter(username=options["user"]).first()
+            else:
+                user = User.objects.filter(is_superuser=True).order_by("id").first()
+            if user is None:
+                raise CommandError("No user to record the assignments against; pass --user.")
+
+        plans = plan_range(start, end)
+        saved_days = set(
+            BikeAssignment.objects.filter(date__range=(start, end)).values_list("date", flat=True).distinct()
+        )
+        applied = 0
+        for plan in plans:
+            numbers = ", ".join(str(bike.number) for bike in plan.bikes) or "-"
+            line = f"{plan.date.isoformat()}: {plan.required} bike(s) needed; proposed {numbers}"
+            if plan.shortfall:
+                line += f" (short by {plan.shortfall})"
+            if plan.date in saved_days and not options["overwrite"]:
+                line += " [already assigned]"
+            elif user is not None:
+                save_assignments(plan.date, plan.bike_ids, user)
+                applied += 1
+            self.stdout.write(line)
+
+        verb = "Saved" if options["apply"] else "Planned"
+        count = applied if options["apply"] else len(plans)
+        self.stdout.write(self.style.SUCCESS(f"{verb} {count} day(s) from {start.isoformat()} to {end.isoformat()}."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily booking rollup from the bookings table."
+
+    def handle(self, *args, **options):
+        rows = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} booking stats row(s)."))
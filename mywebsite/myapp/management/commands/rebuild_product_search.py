@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import search
+
+
+class Command(BaseCommand):
+    help = "Refill the SQLite full-text product index from the products table."
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError("There is no SQLite full-text index to rebuild on this database.")
+        rows = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {rows} product(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp import capacity
+
+
+class Command(BaseCommand):
+    help = "Recount the booked riders of every ride slot from the booking lines."
+
+    def handle(self, *args, **options):
+        slots = capacity.rebuild_occupancy()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rider counts for {slots} slot(s)."))
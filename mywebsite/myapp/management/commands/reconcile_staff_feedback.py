@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp import feedback
+
+
+class Command(BaseCommand):
+    help = "Recompute staff like, dislike and comment counters from the feedback table."
+
+    def handle(self, *args, **options):
+        updated = feedback.reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled feedback counters for {updated} staff member(s)."))
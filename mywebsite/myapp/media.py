@@ -0,0 +1,177 @@
+"""Serving uploaded media.
+
+Files under ``MEDIA_ROOT`` are served with ``ETag``/``Last-Modified``
+validators, single byte-range support (so the spec PDF viewer can seek), and
+cache headers. Blobs from ``ContentAddressedStorage`` and their derivatives
+never change under their name, so they are marked immutable for a year.
+When ``MEDIA_ACCEL`` is set, the view only checks the request and answers
+with an ``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd)
+header; the front proxy then sends the bytes and handles ranges itself,
+which frees the worker straight away.
+"""
+
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import BLOB_ROOT
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+ACCEL_NGINX = "nginx"
+ACCEL_SENDFILE = "sendfile"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive ``(first, last)`` byte positions of a ``Range`` header.
+
+    Returns None when the whole file should be sent: no header, a header
+    this view does not handle (other units, several ranges), or a
+    malformed one. Raises ``RangeNotSatisfiable`` when the range lies
+    entirely past the end of the file.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the final N bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        if first >= size:
+            raise RangeNotSatisfiable
+        return None
+    return first, last
+
+
+def is_immutable(name: str) -> bool:
+    return name.startswith(f"{BLOB_ROOT}/")
+
+
+def _etag(name: str, stat: os.stat_result) -> str:
+    if is_immutable(name):
+        # The name already carries the content hash.
+        return f'"{os.path.basename(name)}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _if_range_matches(request: HttpRequest, etag: str, last_modified: int) -> bool:
+    condition = request.headers.get("If-Range")
+    if not condition:
+        return True
+    if condition.startswith(('"', "W/")):
+        return condition == etag
+    return parse_http_date_safe(condition) == last_modified
+
+
+class _ByteRange:
+    """Read-only view of ``length`` bytes of an open file, for streaming."""
+
+    def __init__(self, handle, first: int, length: int) -> None:
+        handle.seek(first)
+        self.handle = handle
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+def serve(request: HttpRequest, path: str) -> HttpResponse:
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path")
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Media file not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found")
+
+    name = path.replace("\\", "/")
+    etag = _etag(name, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, name, full_path, stat.st_size, etag, last_modified)
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+    if is_immutable(name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def _file_response(
+    request: HttpRequest, name: str, full_path: str, size: int, etag: str, last_modified: int
+) -> HttpResponse:
+    content_type, encoding = mimetypes.guess_type(full_path)
+    if encoding or not content_type:
+        # Encoded files (``.gz``) are sent as-is, not decompressed by browsers.
+        content_type = "application/octet-stream"
+    accel = settings.MEDIA_ACCEL
+
+    if accel == ACCEL_NGINX:
+        response = HttpResponse(content_type=content_type)
+        response.headers["X-Accel-Redirect"] = quote(settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + name)
+        return response
+    if accel == ACCEL_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response.headers["X-Sendfile"] = full_path
+        return response
+
+    try:
+        byte_range = parse_range(request.headers.get("Range", ""), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        response.headers["Accept-Ranges"] = "bytes"
+        return response
+    if byte_range is not None and not _if_range_matches(request, etag, last_modified):
+        byte_range = None
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response.headers["Content-Length"] = size
+    elif byte_range is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    else:
+        first, last = byte_range
+        length = last - first + 1
+        handle = _ByteRange(open(full_path, "rb"), first, length)
+        response = FileResponse(handle, content_type=content_type, status=206)
+        response.headers["Content-Length"] = length
+        response.headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:45
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_occupancy(apps, schema_editor):
+    Bike = apps.get_model('myapp', 'Bike')
+    BookingItem = apps.get_model('myapp', 'BookingItem')
+    SlotOccupancy = apps.get_model('myapp', 'SlotOccupancy')
+
+    capacity = Bike.objects.count()
+    rows = (
+        BookingItem.objects.filter(participant_type='rider')
+        .exclude(booking__ride_time='')
+        .values_list('booking__ride_date', 'booking__ride_time')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    SlotOccupancy.objects.bulk_create(
+        [
+            SlotOccupancy(ride_date=ride_date, ride_time=ride_time, capacity=capacity, riders=total)
+            for ride_date, ride_time, total in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_populate_bikes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ride_date', models.DateField()),
+                ('ride_time', models.CharField(choices=[('morning', 'Morning'), ('noon', 'Noon'), ('afternoon', 'Afternoon')], max_length=10)),
+                ('capacity', models.PositiveIntegerField()),
+                ('riders', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['ride_date', 'ride_time'],
+                'unique_together': {('ride_date', 'ride_time')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SlotCapacity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ride_date', models.DateField()),
+                ('ride_time', models.CharField(choices=[('morning', 'Morning'), ('noon', 'Noon'), ('afternoon', 'Afternoon')], max_length=10)),
+                ('capacity', models.PositiveIntegerField()),
+            ],
+            options={
+                'ordering': ['ride_date', 'ride_time'],
+                'unique_together': {('ride_date', 'ride_time')},
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:51
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_stats(apps, schema_editor):
+    Booking = apps.get_model('myapp', 'Booking')
+    BookingItem = apps.get_model('myapp', 'BookingItem')
+    BookingDailyStats = apps.get_model('myapp', 'BookingDailyStats')
+
+    programs_by_booking = {}
+    for booking_id, program_id in BookingItem.objects.values_list("booking_id", "program_id").distinct():
+        programs_by_booking.setdefault(booking_id, set()).add(program_id)
+
+    totals = {}
+    for booking_id, ride_date, ride_time, amount in Booking.objects.values_list(
+        "id", "ride_date", "ride_time", "total_amount"
+    ).iterator():
+        for program_id in [None, *programs_by_booking.get(booking_id, ())]:
+            key = (ride_date, ride_time, program_id)
+            count, revenue = totals.get(key, (0, Decimal("0")))
+            totals[key] = (count + 1, revenue + amount)
+
+    BookingDailyStats.objects.bulk_create(
+        [
+            BookingDailyStats(
+                ride_date=ride_date, ride_time=ride_time, program_id=program_id, bookings=count, revenue=revenue
+            )
+            for (ride_date, ride_time, program_id), (count, revenue) in totals.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_slot_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ride_date', models.DateField()),
+                ('ride_time', models.CharField(blank=True, choices=[('morning', 'Morning'), ('noon', 'Noon'), ('afternoon', 'Afternoon')], max_length=10)),
+                ('bookings', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='myapp.program')),
+            ],
+            options={
+                'ordering': ['ride_date', 'ride_time', 'program_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookingdailystats',
+            constraint=models.UniqueConstraint(condition=models.Q(('program__isnull', False)), fields=('ride_date', 'ride_time', 'program'), name='booking_stats_program_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingdailystats',
+            constraint=models.UniqueConstraint(condition=models.Q(('program__isnull', True)), fields=('ride_date', 'ride_time'), name='booking_stats_all_programs_slot'),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
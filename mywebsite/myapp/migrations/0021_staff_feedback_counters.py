@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:01
+
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    Staff = apps.get_model('myapp', 'Staff')
+    StaffFeedback = apps.get_model('myapp', 'StaffFeedback')
+    for staff in Staff.objects.all():
+        feedback = StaffFeedback.objects.filter(staff=staff)
+        staff.likes_count = feedback.filter(sentiment='like').count()
+        staff.dislikes_count = feedback.filter(sentiment='dislike').count()
+        staff.comment_count = feedback.exclude(comment__isnull=True).exclude(comment__exact='').count()
+        staff.latest_feedback = feedback.aggregate(latest=models.Max('updated_at'))['latest']
+        staff.save(update_fields=['likes_count', 'dislikes_count', 'comment_count', 'latest_feedback'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_booking_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staff',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='latest_feedback',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_staff_feedback_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stafffeedback',
+            name='had_comment',
+            field=models.BooleanField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='stafffeedback',
+            name='previous_sentiment',
+            field=models.CharField(choices=[('like', 'Like'), ('dislike', 'Dislike'), ('none', 'No vote')], editable=False, max_length=10, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0022_stafffeedback_previous_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactlist',
+            index=models.Index(fields=['complete', 'id'], name='contact_complete_id_idx'),
+        ),
+    ]
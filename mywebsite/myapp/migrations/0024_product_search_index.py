@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'myapp_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, description)')
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains.
+            return
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, COALESCE(description, '') FROM myapp_product"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE myapp_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED"
+        )
+        schema_editor.execute(
+            'CREATE INDEX myapp_product_search_idx ON myapp_product USING GIN (search_vector)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE myapp_product DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0023_contactlist_complete_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
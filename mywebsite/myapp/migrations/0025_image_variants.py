@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0024_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='picture_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='programimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0026_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
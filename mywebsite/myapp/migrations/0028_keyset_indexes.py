@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0027_program_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bikeassignment',
+            index=models.Index(fields=['-date', 'bike', 'id'], name='assignment_date_bike_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-created_at', '-id'], name='booking_created_id_idx'),
+        ),
+    ]
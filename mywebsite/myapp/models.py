@@ -17,6 +17,8 @@ class Product(models.Model):
 
     #file
     picture = models.ImageField(upload_to='product/', blank=True, null=True)  
+    # Resized copies of ``picture``, recorded by ``myapp.images``.
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     specfile = models.FileField(upload_to='specfile/', blank=True, null=True) 
     def __str__(self):
         return self.title
@@ -28,6 +30,9 @@ class contactList(models.Model):
     detail = models.TextField(null=True, blank=True)
     complete = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=["complete", "id"], name="contact_complete_id_idx")]
+
     def __str__(self):
         return self.topic
 
@@ -58,6 +63,9 @@ class Program(models.Model):
     tour_includes = models.TextField(blank=True)
     tour_excludes = models.TextField(blank=True)
     tour_notes = models.TextField(blank=True)
+    # Also moved by rate and image changes (``catalog.touch_programs``);
+    # public program pages use it to answer conditional GETs.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["code"]
@@ -66,15 +74,20 @@ class Program(models.Model):
         return f"{self.name} ({self.code})"
 
     def get_rate(self, participant: "ProgramRate.Participant", age_group: "ProgramRate.AgeGroup") -> Decimal:
-        try:
-            rate = self.rates.get(participant_type=participant, age_group=age_group)
-        except ProgramRate.DoesNotExist as exc:
+        from .pricing import get_pricing
+
+        price = get_pricing().rate(self.pk, participant, age_group)
+        if price is None:
             raise ValidationError(
                 f"No rate configured for program {self.code} ({participant}, {age_group})"
-            ) from exc
-        return rate.price
+            )
+        return price
 
     def primary_image(self):
+        prefetched = getattr(self, "_prefetched_objects_cache", {}).get("images")
+        if prefetched is not None:
+            # ProgramImage's default ordering is (display_order, id).
+            return next(iter(prefetched), None)
         return self.images.order_by("display_order", "id").first()
 
 
@@ -107,6 +120,8 @@ class ProgramImage(models.Model):
         related_name="images",
     )
     image = models.ImageField(upload_to="programs/")
+    # Resized copies of ``image``, recorded by ``myapp.images``.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     alt_text = models.CharField(max_length=150, blank=True)
     display_order = models.PositiveIntegerField(default=0)
 
@@ -127,8 +142,15 @@ class Staff(models.Model):
     dislikes = models.TextField(blank=True)
     comment = models.TextField(blank=True)
     avatar = models.ImageField(upload_to="staff/", blank=True)
+    # Resized copies of ``avatar``, recorded by ``myapp.images``.
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     active = models.BooleanField(default=True)
     display_order = models.PositiveIntegerField(default=0)
+    # Feedback counters, kept current by ``myapp.feedback``.
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    latest_feedback = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ["display_order", "name"]
@@ -137,20 +159,13 @@ class Staff(models.Model):
         return self.name
 
     def likes_total(self) -> int:
-        if hasattr(self, "likes_count") and self.likes_count is not None:
-            return int(self.likes_count)
-        return self.feedback.filter(sentiment=StaffFeedback.Sentiment.LIKE).count()
+        return self.likes_count
 
     def dislikes_total(self) -> int:
-        if hasattr(self, "dislikes_count") and self.dislikes_count is not None:
-            return int(self.dislikes_count)
-        return self.feedback.filter(sentiment=StaffFeedback.Sentiment.DISLIKE).count()
+        return self.dislikes_count
 
     def latest_feedback_time(self):
-        if hasattr(self, "feedback_latest") and self.feedback_latest is not None:
-            return self.feedback_latest
-        latest = self.feedback.order_by("-updated_at").values_list("updated_at", flat=True).first()
-        return latest
+        return self.latest_feedback
 
 
 class StaffFeedback(models.Model):
@@ -165,6 +180,10 @@ class StaffFeedback(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # State before the latest upsert (NULL when it inserted the row), written
+    # by the same statement so the caller can adjust the staff counters.
+    previous_sentiment = models.CharField(max_length=10, choices=Sentiment.choices, null=True, editable=False)
+    had_comment = models.BooleanField(null=True, editable=False)
 
     class Meta:
         unique_together = ("staff", "user")
@@ -205,6 +224,8 @@ class Booking(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        # Serves the keyset pages of the manage-bookings list.
+        indexes = [models.Index(fields=["-created_at", "-id"], name="booking_created_id_idx")]
 
     def update_total(self) -> None:
         items_total = self.items.aggregate(total=Sum("line_total"))["total"] or Decimal("0")
@@ -294,6 +315,85 @@ class BikeAssignment(models.Model):
     class Meta:
         unique_together = ("bike", "date")
         ordering = ["-date", "bike__number"]
+        # Serves the keyset pages of the assignment history.
+        indexes = [models.Index(fields=["-date", "bike", "id"], name="assignment_date_bike_id_idx")]
 
     def __str__(self) -> str:
         return f"{self.bike} → {self.date.isoformat()}"
+
+
+class SlotCapacity(models.Model):
+    ride_date = models.DateField()
+    ride_time = models.CharField(max_length=10, choices=Booking.RideSlot.choices)
+    capacity = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("ride_date", "ride_time")
+        ordering = ["ride_date", "ride_time"]
+
+    def __str__(self) -> str:
+        return f"{self.ride_date.isoformat()} {self.get_ride_time_display()}: {self.capacity} riders"
+
+
+class SlotOccupancy(models.Model):
+    ride_date = models.DateField()
+    ride_time = models.CharField(max_length=10, choices=Booking.RideSlot.choices)
+    capacity = models.PositiveIntegerField()
+    riders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("ride_date", "ride_time")
+        ordering = ["ride_date", "ride_time"]
+
+    def __str__(self) -> str:
+        return f"{self.ride_date.isoformat()} {self.get_ride_time_display()}: {self.riders}/{self.capacity}"
+
+    @property
+    def remaining(self) -> int:
+        return max(self.capacity - self.riders, 0)
+
+
+class BookingDailyStats(models.Model):
+    # One row per (date, slot, program) plus a program-less row per slot that
+    # covers every booking, so multi-program bookings are never double counted.
+    ride_date = models.DateField()
+    ride_time = models.CharField(max_length=10, choices=Booking.RideSlot.choices, blank=True)
+    program = models.ForeignKey(
+        Program, on_delete=models.CASCADE, related_name="daily_stats", null=True, blank=True
+    )
+    bookings = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        ordering = ["ride_date", "ride_time", "program_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ride_date", "ride_time", "program"],
+                condition=models.Q(program__isnull=False),
+                name="booking_stats_program_slot",
+            ),
+            models.UniqueConstraint(
+                fields=["ride_date", "ride_time"],
+                condition=models.Q(program__isnull=True),
+                name="booking_stats_all_programs_slot",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        scope = self.program.code if self.program_id else "all programs"
+        return f"{self.ride_date.isoformat()} {self.ride_time or '-'} {scope}: {self.bookings}"
+
+
+class MediaBlob(models.Model):
+    # One row per stored upload in ``myapp.storage.ContentAddressedStorage``;
+    # ``refcount`` is the number of saves that still point at the file.
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.refcount} refs)"
@@ -0,0 +1,123 @@
+"""Whole-page cache for anonymous visitors.
+
+``@ensure_csrf_cookie`` pages send ``Vary: Cookie``, so neither Django's
+per-view cache nor a proxy can share them between visitors. This middleware
+caches the body of views marked with ``@anonymous_page_cache`` once per URL
+and per version of the data they show. Any CSRF token rendered into the page
+is stored as a placeholder. On a hit, the placeholder is replaced with a
+fresh token for the current visitor, and ``get_token`` makes
+``CsrfViewMiddleware`` set the cookie as usual. The page's validators and
+``Cache-Control`` are stored with it, so hits still answer conditional GETs
+with 304. Signed-in users, visitors with pending messages and non-GET
+requests always reach the view.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import CSRF_TOKEN_LENGTH, _unmask_cipher_token, get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import versions
+
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+CSRF_PLACEHOLDER = b"@@csrf-token@@"
+_KEY_PREFIX = "myapp:page:"
+_STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control")
+_TOKEN = re.compile(rb"(?<![A-Za-z0-9])[A-Za-z0-9]{%d}(?![A-Za-z0-9])" % CSRF_TOKEN_LENGTH)
+
+
+def shares_pages(request: HttpRequest) -> bool:
+    """Whether ``request`` may be answered with a page rendered for another visitor."""
+    return not request.user.is_authenticated and not messages.get_messages(request)
+
+
+def anonymous_page_cache(*version_names: str) -> Callable:
+    """Mark a view as cacheable for anonymous visitors.
+
+    ``version_names`` are the ``versions`` stamps of the data the page
+    shows; bumping any of them retires every cached copy.
+    """
+
+    def decorator(view):
+        view.page_cache_versions = version_names
+        return view
+
+    return decorator
+
+
+def _cache_key(request: HttpRequest, version_names) -> str:
+    stamps = versions.get_versions(*version_names)
+    parts = [request.get_host(), request.get_full_path(), *(stamps[name] for name in version_names)]
+    return _KEY_PREFIX + hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def mask_csrf_tokens(content: bytes, secret: str) -> bytes:
+    """Swap every rendering of the request's CSRF token for the placeholder."""
+
+    def replace(match: re.Match) -> bytes:
+        token = match.group().decode()
+        return CSRF_PLACEHOLDER if _unmask_cipher_token(token) == secret else match.group()
+
+    return _TOKEN.sub(replace, content)
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        response = self.get_response(request)
+        key = getattr(request, "_page_cache_key", None)
+        if key and self._storable(request, response):
+            content = response.content
+            secret = request.META.get("CSRF_COOKIE")
+            if secret:
+                content = mask_csrf_tokens(content, secret)
+            headers = {name: response[name] for name in _STORED_HEADERS if response.has_header(name)}
+            cache.set(key, (content, headers), PAGE_CACHE_TIMEOUT)
+        return response
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs) -> Optional[HttpResponse]:
+        version_names = getattr(view_func, "page_cache_versions", None)
+        if version_names is None or request.method not in ("GET", "HEAD"):
+            return None
+        if not shares_pages(request):
+            return None
+
+        key = _cache_key(request, version_names)
+        cached = cache.get(key)
+        if cached is None:
+            request._page_cache_key = key
+            return None
+        content, headers = cached
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+        else:
+            # The view would have set the cookie (``ensure_csrf_cookie``).
+            get_token(request)
+        response = HttpResponse(content, headers=headers)
+        response.headers["X-Page-Cache"] = "hit"
+        last_modified = parse_http_date_safe(headers.get("Last-Modified", ""))
+        return get_conditional_response(
+            request, etag=headers.get("ETag"), last_modified=last_modified, response=response
+        )
+
+    @staticmethod
+    def _storable(request: HttpRequest, response: HttpResponse) -> bool:
+        if response.status_code != 200 or response.streaming:
+            return False
+        # A page that sets other cookies or touched the session is per-visitor;
+        # the CSRF cookie is re-issued on every hit.
+        session = getattr(request, "session", None)
+        if session is not None and session.modified:
+            return False
+        return all(name == settings.CSRF_COOKIE_NAME for name in response.cookies)
@@ -0,0 +1,134 @@
+"""Keyset (cursor) pagination for long staff lists.
+
+Pages are fetched with a ``WHERE (ordering columns) past the last row`` filter
+instead of OFFSET, so page 500 costs the same as page 1. Cursors are opaque
+URL-safe tokens holding the boundary row's ordering values; the ordering
+columns must be non-null and end with a unique column such as ``id``.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from django.db.models import Q, QuerySet
+
+_FORWARD = "n"
+_BACKWARD = "p"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction: str, values: Sequence[Any]) -> str:
+    payload = json.dumps([direction, [_encode_value(value) for value in values]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as exc:
+        raise InvalidCursor("Malformed cursor.") from exc
+    if direction not in (_FORWARD, _BACKWARD) or not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Malformed cursor.")
+    return direction, values
+
+
+def _field_value(obj: Any, path: str) -> Any:
+    for part in path.split("__"):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _after(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """Rows strictly after ``values`` in ``ordering`` (mixed directions allowed)."""
+    condition = Q()
+    equal_prefix = Q()
+    for term, value in zip(ordering, values):
+        field = term.lstrip("-")
+        lookup = "lt" if term.startswith("-") else "gt"
+        condition |= equal_prefix & Q(**{f"{field}__{lookup}": value})
+        equal_prefix &= Q(**{field: value})
+    return condition
+
+
+def _reverse(ordering: Sequence[str]) -> List[str]:
+    return [term[1:] if term.startswith("-") else f"-{term}" for term in ordering]
+
+
+class KeysetPage:
+    def __init__(
+        self,
+        object_list: List[Any],
+        ordering: Sequence[str],
+        has_next: bool,
+        has_previous: bool,
+    ) -> None:
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        fields = [term.lstrip("-") for term in ordering]
+        self.next_cursor = (
+            encode_cursor(_FORWARD, [_field_value(object_list[-1], field) for field in fields])
+            if has_next and object_list
+            else None
+        )
+        self.previous_cursor = (
+            encode_cursor(_BACKWARD, [_field_value(object_list[0], field) for field in fields])
+            if has_previous and object_list
+            else None
+        )
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+def paginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    cursor: Optional[str],
+    per_page: int,
+) -> KeysetPage:
+    """Return the page after (or before) ``cursor``; a bad cursor yields page one."""
+    direction, values = _FORWARD, None
+    if cursor:
+        try:
+            direction, values = decode_cursor(cursor, len(ordering))
+        except InvalidCursor:
+            direction, values = _FORWARD, None
+
+    if direction == _FORWARD:
+        page_qs = queryset.order_by(*ordering)
+        if values is not None:
+            page_qs = page_qs.filter(_after(ordering, values))
+        rows = list(page_qs[: per_page + 1])
+        return KeysetPage(rows[:per_page], ordering, len(rows) > per_page, values is not None)
+
+    backwards = _reverse(ordering)
+    rows = list(queryset.order_by(*backwards).filter(_after(backwards, values))[: per_page + 1])
+    has_previous = len(rows) > per_page
+    rows = rows[:per_page]
+    rows.reverse()
+    return KeysetPage(rows, ordering, True, has_previous)
@@ -0,0 +1,98 @@
+"""Bike demand planning from booked riders.
+
+Every rider takes one ATV for their slot, and a bike can go out again in a
+later slot on the same day. So a day needs as many bikes as its busiest slot,
+plus one per rider booked without a slot. Proposals hand out the least-used
+bikes first: the counts come from the ``BikeAssignment`` history and are
+carried forward from day to day, so usage across a batch of dates stays even.
+"""
+
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Count, Sum
+
+from .models import Bike, BikeAssignment, Booking, BookingItem, ProgramRate
+
+
+class DayPlan:
+    __slots__ = ("date", "slots", "unslotted", "required", "bikes", "shortfall")
+
+    def __init__(self, day: date, slots: Dict[str, int], unslotted: int) -> None:
+        self.date = day
+        self.slots = slots
+        self.unslotted = unslotted
+        self.required = max(slots.values(), default=0) + unslotted
+        self.bikes: List[Bike] = []
+        self.shortfall = 0
+
+    @property
+    def bike_ids(self) -> List[int]:
+        return [bike.id for bike in self.bikes]
+
+    @property
+    def slot_rows(self) -> List[Tuple[str, int]]:
+        return [(label, self.slots.get(value, 0)) for value, label in Booking.RideSlot.choices]
+
+
+def riders_by_slot(start: date, end: date) -> Dict[date, Dict[str, int]]:
+    """Booked riders per ride date and slot, in one grouped query."""
+    riders: Dict[date, Dict[str, int]] = defaultdict(dict)
+    rows = (
+        BookingItem.objects.filter(
+            booking__ride_date__range=(start, end),
+            participant_type=ProgramRate.Participant.RIDER,
+        )
+        .order_by()
+        .values_list("booking__ride_date", "booking__ride_time")
+        .annotate(riders=Sum("quantity"))
+    )
+    for ride_date, ride_time, count in rows:
+        riders[ride_date][ride_time] = count
+    return riders
+
+
+def assignment_counts(before: date) -> Dict[int, int]:
+    return dict(
+        BikeAssignment.objects.filter(date__lt=before)
+        .order_by()
+        .values_list("bike_id")
+        .annotate(total=Count("id"))
+    )
+
+
+def plan_range(start: date, end: date, bikes: Optional[List[Bike]] = None) -> List[DayPlan]:
+    """Demand and a proposed set of bikes for every date from ``start`` to ``end``.
+
+    Runs three queries however long the range is: the fleet, grouped riders
+    and the assignment history before ``start``.
+    """
+    if bikes is None:
+        bikes = list(Bike.objects.order_by("number"))
+    riders = riders_by_slot(start, end)
+    usage = assignment_counts(start)
+    # (times used, bike number, bike): least-used first, lowest number on ties.
+    queue = [(usage.get(bike.id, 0), bike.number, bike) for bike in bikes]
+    heapq.heapify(queue)
+
+    plans = []
+    day = start
+    while day <= end:
+        slots = dict(riders.get(day, {}))
+        plan = DayPlan(day, slots, slots.pop("", 0))
+        taken = [heapq.heappop(queue) for _ in range(min(plan.required, len(queue)))]
+        plan.bikes = sorted((bike for _, _, bike in taken), key=lambda bike: bike.number)
+        plan.shortfall = plan.required - len(taken)
+        for used, number, bike in taken:
+            heapq.heappush(queue, (used + 1, number, bike))
+        plans.append(plan)
+        day += timedelta(days=1)
+    return plans
+
+
+def plan_day(day: date, bikes: Optional[List[Bike]] = None) -> DayPlan:
+    return plan_range(day, day, bikes)[0]
@@ -0,0 +1,189 @@
+"""In-process pricing table for programs and add-ons.
+
+The table is loaded once per worker and reused until the shared ``pricing``
+version stamp changes (see ``signals.py``), so pricing a booking is a handful
+of dictionary lookups instead of one ``ProgramRate`` query per line.
+"""
+
+from __future__ import annotations
+
+import re
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+from django.db.models import CharField, F, Value
+
+from . import versions
+from .models import Addon, ProgramRate
+
+_RATE = "rate"
+_ADDON = "addon"
+
+RateKey = Tuple[str, str]
+
+
+class PricingSnapshot:
+    """Immutable (program, participant, age group) and add-on price table."""
+
+    __slots__ = ("version", "program_rates", "addon_prices")
+
+    def __init__(
+        self,
+        version: str,
+        program_rates: Dict[int, Dict[RateKey, Decimal]],
+        addon_prices: Dict[int, Decimal],
+    ) -> None:
+        self.version = version
+        self.program_rates: Mapping[int, Mapping[RateKey, Decimal]] = MappingProxyType(
+            {program_id: MappingProxyType(rates) for program_id, rates in program_rates.items()}
+        )
+        self.addon_prices: Mapping[int, Decimal] = MappingProxyType(addon_prices)
+
+    def rate(self, program_id: int, participant: str, age_group: str) -> Decimal | None:
+        rates = self.program_rates.get(program_id)
+        if rates is None:
+            return None
+        return rates.get((participant, age_group))
+
+    def rates_for(self, program_id: int) -> Mapping[RateKey, Decimal]:
+        return self.program_rates.get(program_id, _EMPTY)
+
+    def addon_price(self, addon_id: int) -> Decimal | None:
+        return self.addon_prices.get(addon_id)
+
+
+_EMPTY: Mapping[RateKey, Decimal] = MappingProxyType({})
+_snapshot: PricingSnapshot | None = None
+
+
+def _load_snapshot(version: str) -> PricingSnapshot:
+    # Rates and add-ons share one UNION query so a cold worker pays a single
+    # round trip. Annotations are declared in the same order on both sides.
+    rates = (
+        ProgramRate.objects.order_by()
+        .annotate(
+            kind=Value(_RATE, output_field=CharField()),
+            owner=F("program_id"),
+            participant=F("participant_type"),
+            age=F("age_group"),
+            amount=F("price"),
+        )
+        .values_list("kind", "owner", "participant", "age", "amount")
+    )
+    addons = (
+        Addon.objects.order_by()
+        .annotate(
+            kind=Value(_ADDON, output_field=CharField()),
+            owner=F("id"),
+            participant=Value("", output_field=CharField()),
+            age=Value("", output_field=CharField()),
+            amount=F("price"),
+        )
+        .values_list("kind", "owner", "participant", "age", "amount")
+    )
+
+    program_rates: Dict[int, Dict[RateKey, Decimal]] = {}
+    addon_prices: Dict[int, Decimal] = {}
+    for kind, owner, participant, age, amount in rates.union(addons, all=True):
+        if kind == _RATE:
+            program_rates.setdefault(owner, {})[(participant, age)] = amount
+        else:
+            addon_prices[owner] = amount
+    return PricingSnapshot(version, program_rates, addon_prices)
+
+
+def get_pricing() -> PricingSnapshot:
+    global _snapshot
+    version = versions.get_version(versions.PRICING)
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = _load_snapshot(version)
+        _snapshot = snapshot
+    return snapshot
+
+
+_QUANTITY_FIELD = re.compile(r"^(?P<participant>[a-z]+)_(?P<age_group>[a-z]+)_(?P<program_id>\d+)$")
+_ADDON_FIELD = re.compile(r"^addon_(?P<addon_id>\d+)$")
+
+
+class QuoteError(ValueError):
+    pass
+
+
+def _parse_quantity(field: str, value: str) -> int:
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError) as exc:
+        raise QuoteError(f"Quantity for {field} must be a number.") from exc
+    if quantity < 0:
+        raise QuoteError(f"Quantity for {field} cannot be negative.")
+    return quantity
+
+
+def build_quote(data: Mapping[str, str], active_program_ids: Iterable[int] | None = None) -> Dict[str, Any]:
+    """Price booking form quantities without touching the database.
+
+    ``data`` uses the booking form's field names (``rider_adult_<program id>``
+    and ``addon_<addon id>``). Raises ``QuoteError`` for bad quantities or
+    lines that have no configured price.
+    """
+    pricing = get_pricing()
+    allowed = set(active_program_ids) if active_program_ids is not None else None
+    participants = set(ProgramRate.Participant.values)
+    age_groups = set(ProgramRate.AgeGroup.values)
+
+    lines: List[Dict[str, Any]] = []
+    addon_lines: List[Dict[str, Any]] = []
+    total = Decimal("0")
+
+    for field, value in data.items():
+        if value in (None, ""):
+            continue
+        match = _QUANTITY_FIELD.match(field)
+        if match and match["participant"] in participants and match["age_group"] in age_groups:
+            program_id = int(match["program_id"])
+            if allowed is not None and program_id not in allowed:
+                continue
+            quantity = _parse_quantity(field, value)
+            if not quantity:
+                continue
+            unit_price = pricing.rate(program_id, match["participant"], match["age_group"])
+            if unit_price is None:
+                raise QuoteError(f"No price is configured for {field}.")
+            line_total = unit_price * quantity
+            total += line_total
+            lines.append(
+                {
+                    "field": field,
+                    "program_id": program_id,
+                    "participant": match["participant"],
+                    "age_group": match["age_group"],
+                    "quantity": quantity,
+                    "unit_price": str(unit_price),
+                    "line_total": str(line_total),
+                }
+            )
+            continue
+
+        match = _ADDON_FIELD.match(field)
+        if match:
+            quantity = _parse_quantity(field, value)
+            if not quantity:
+                continue
+            unit_price = pricing.addon_price(int(match["addon_id"]))
+            if unit_price is None:
+                raise QuoteError(f"No price is configured for {field}.")
+            line_total = unit_price * quantity
+            total += line_total
+            addon_lines.append(
+                {
+                    "field": field,
+                    "addon_id": int(match["addon_id"]),
+                    "quantity": quantity,
+                    "unit_price": str(unit_price),
+                    "line_total": str(line_total),
+                }
+            )
+
+    return {"lines": lines, "addons": addon_lines, "total": str(total)}
@@ -0,0 +1,135 @@
+"""Full-text product search.
+
+On SQLite, products are indexed in an FTS5 table keyed by product id. The
+signals in ``signals.py`` keep it in step with ``Product`` saves and deletes,
+and ``rebuild_product_search`` refills it after bulk loads. On PostgreSQL, a
+generated ``search_vector`` tsvector column with a GIN index maintains
+itself. Either way a search returns product ids ranked by relevance, title
+matches first. Other backends fall back to ``icontains``.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Sequence
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+from .models import Product
+
+FTS_TABLE = "myapp_product_fts"
+PG_SEARCH_CONFIG = "english"
+SEARCH_LIMIT = 1000
+# bm25 column weights: a title hit outranks a description hit.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(term: str) -> List[str]:
+    return _TOKEN.findall(term or "")
+
+
+# database name -> whether its FTS table exists (SQLite builds without FTS5
+# skip it in the migration).
+_fts_tables: Dict[str, bool] = {}
+
+
+def fts_available() -> bool:
+    if connection.vendor != "sqlite":
+        return False
+    name = str(connection.settings_dict["NAME"])
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def index_product(product: Product) -> None:
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+            [product.pk, product.title, product.description or ""],
+        )
+
+
+def remove_product(product_id: int) -> None:
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild() -> int:
+    """Refill the SQLite index from the products table; returns rows indexed."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, COALESCE(description, '') FROM {Product._meta.db_table}"
+        )
+        return cursor.rowcount
+
+
+def search_ids(term: str, limit: int = SEARCH_LIMIT) -> List[int]:
+    """Ids of products matching every word of ``term``, best match first.
+
+    Each word also matches as a prefix, so partial input as the user types
+    still finds results.
+    """
+    tokens = _tokens(term)
+    if not tokens:
+        return []
+
+    if connection.vendor == "postgresql":
+        sql = (
+            f"SELECT id FROM {Product._meta.db_table}, to_tsquery('{PG_SEARCH_CONFIG}', %s) query "
+            "WHERE search_vector @@ query ORDER BY ts_rank(search_vector, query) DESC, id LIMIT %s"
+        )
+        params = [" & ".join(f"{token}:*" for token in tokens), limit]
+    elif fts_available():
+        sql = (
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}), rowid LIMIT %s"
+        )
+        params = [" AND ".join(f'"{token}"*' for token in tokens), limit]
+    else:
+        condition = Q()
+        for token in tokens:
+            condition &= Q(title__icontains=token) | Q(description__icontains=token)
+        return list(Product.objects.filter(condition).order_by("title", "id").values_list("id", flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class RankedProducts(Sequence):
+    """Search results that load only the products of the requested slice.
+
+    Lets ``Paginator`` count the ranked ids and fetch one page of products
+    in their ranked order with a single query.
+    """
+
+    def __init__(self, ids: List[int]) -> None:
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def count(self) -> int:  # type: ignore[override]
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ids = self.ids[index]
+            if not ids:
+                return []
+            order = Case(*(When(pk=pk, then=position) for position, pk in enumerate(ids)), output_field=IntegerField())
+            return list(Product.objects.filter(pk__in=ids).order_by(order))
+        return Product.objects.get(pk=self.ids[index])
@@ -0,0 +1,197 @@
+"""Signal receivers that keep derived data in step with the models."""
+
+from __future__ import annotations
+
+from django.db.models import FileField
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import capacity, catalog, feedback, images, search, stats, versions
+from .storage import release_after_commit
+from .models import (
+    Addon,
+    Bike,
+    Booking,
+    BookingAddon,
+    BookingItem,
+    Program,
+    ProgramImage,
+    Product,
+    ProgramRate,
+    SlotCapacity,
+    Staff,
+    StaffFeedback,
+    contactList,
+)
+
+
+@receiver([post_save, post_delete], sender=Program)
+@receiver([post_save, post_delete], sender=ProgramRate)
+@receiver([post_save, post_delete], sender=Addon)
+def invalidate_pricing(sender, **kwargs) -> None:
+    versions.bump_version(versions.PRICING)
+
+
+@receiver([post_save, post_delete], sender=Program)
+@receiver([post_save, post_delete], sender=ProgramImage)
+def invalidate_catalog(sender, **kwargs) -> None:
+    versions.bump_version(versions.CATALOG)
+
+
+@receiver([post_save, post_delete], sender=ProgramRate)
+@receiver([post_save, post_delete], sender=ProgramImage)
+def touch_program(sender, instance, raw: bool = False, **kwargs) -> None:
+    if not raw:
+        catalog.touch_programs(instance.program_id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_products(sender, **kwargs) -> None:
+    versions.bump_version(versions.PRODUCTS)
+
+
+@receiver([post_save, post_delete], sender=Staff)
+def invalidate_staff(sender, **kwargs) -> None:
+    versions.bump_version(versions.STAFF)
+
+
+@receiver(post_delete, sender=Booking)
+def release_booking_riders(sender, instance: Booking, **kwargs) -> None:
+    # Recounted rather than decremented: admin-made bookings never reserved.
+    capacity.refresh_slots([(instance.ride_date, instance.ride_time)])
+
+
+@receiver([post_save, post_delete], sender=contactList)
+def invalidate_inbox(sender, **kwargs) -> None:
+    versions.bump_version(versions.INBOX)
+
+
+@receiver(pre_delete, sender=Booking)
+def remove_booking_stats(sender, instance: Booking, **kwargs) -> None:
+    stats.record_booking(instance, stats.booking_program_ids(instance), sign=-1)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_slot(sender, instance: Booking, raw: bool = False, **kwargs) -> None:
+    if instance.pk and not raw:
+        instance._previous_slot = (
+            Booking.objects.filter(pk=instance.pk).values_list("ride_date", "ride_time").first()
+        )
+
+
+@receiver(post_save, sender=Booking)
+def refresh_booking_stats(sender, instance: Booking, created: bool, raw: bool = False, **kwargs) -> None:
+    # New bookings are recorded by ``create_booking`` (or the admin once its
+    # lines are saved); this covers edits, including moves to another slot.
+    if created or raw:
+        return
+    slots = [(instance.ride_date, instance.ride_time)]
+    previous = getattr(instance, "_previous_slot", None)
+    if previous:
+        slots.append(previous)
+    stats.refresh_slots(slots)
+
+
+@receiver(post_save, sender=Booking)
+def refresh_booking_riders(sender, instance: Booking, created: bool, raw: bool = False, **kwargs) -> None:
+    # ``create_booking`` reserves its riders; the admin recounts once its
+    # lines are saved. This covers edits, including moves to another slot.
+    if created or raw:
+        return
+    slots = [(instance.ride_date, instance.ride_time)]
+    previous = getattr(instance, "_previous_slot", None)
+    if previous:
+        slots.append(previous)
+    capacity.refresh_slots(slots)
+
+
+@receiver([post_save, post_delete], sender=SlotCapacity)
+def sync_slot_capacity(sender, instance: SlotCapacity, **kwargs) -> None:
+    capacity.sync_slot_capacity(instance.ride_date, instance.ride_time)
+    capacity.invalidate_availability(instance.ride_date)
+
+
+@receiver(post_delete, sender=Bike)
+@receiver(post_save, sender=Bike)
+def sync_fleet_capacity(sender, **kwargs) -> None:
+    if kwargs.get("created", True):
+        capacity.sync_fleet_capacity()
+        versions.bump_version(versions.FLEET)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_booking_day(sender, instance: Booking, **kwargs) -> None:
+    capacity.invalidate_availability(instance.ride_date)
+
+
+@receiver([post_save, post_delete], sender=BookingItem)
+@receiver([post_save, post_delete], sender=BookingAddon)
+def invalidate_line_day(sender, instance, **kwargs) -> None:
+    # Lines removed by a cascading booking delete are covered by the booking
+    # receiver; only edits that carry their booking (admin inlines) land here.
+    if sender.booking.is_cached(instance):
+        capacity.invalidate_availability(instance.booking.ride_date)
+
+
+@receiver(post_delete, sender=StaffFeedback)
+def remove_feedback_counts(sender, instance: StaffFeedback, **kwargs) -> None:
+    feedback.apply_feedback_change(instance.staff_id, (instance.sentiment, bool(instance.comment)), None)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance: Product, **kwargs) -> None:
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance: Product, **kwargs) -> None:
+    search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=ProgramImage)
+@receiver(post_save, sender=Staff)
+@receiver(post_save, sender=Product)
+def build_image_derivatives(sender, instance, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    for model, field_name in images.image_fields():
+        if model is sender:
+            images.schedule(instance, field_name)
+
+
+def _file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, FileField)]
+
+
+@receiver(pre_save, sender=ProgramImage)
+@receiver(pre_save, sender=Staff)
+@receiver(pre_save, sender=Product)
+def remember_stored_files(sender, instance, raw: bool = False, **kwargs) -> None:
+    if instance.pk and not raw:
+        fields = _file_fields(sender)
+        previous = sender._default_manager.filter(pk=instance.pk).values_list(*(field.attname for field in fields)).first()
+        # Files not yet committed are about to be stored, adding a reference
+        # even when their content matches the blob the row already has.
+        uploading = [not getattr(instance, field.attname)._committed for field in fields]
+        instance._stored_files = list(zip(fields, previous, uploading)) if previous else None
+
+
+@receiver(post_save, sender=ProgramImage)
+@receiver(post_save, sender=Staff)
+@receiver(post_save, sender=Product)
+def release_replaced_files(sender, instance, **kwargs) -> None:
+    stored = getattr(instance, "_stored_files", None)
+    if not stored:
+        return
+    instance._stored_files = None
+    for field, name, uploaded in stored:
+        if name and (uploaded or name != getattr(instance, field.attname).name):
+            release_after_commit(field.storage, name)
+
+
+@receiver(post_delete, sender=ProgramImage)
+@receiver(post_delete, sender=Staff)
+@receiver(post_delete, sender=Product)
+def release_deleted_files(sender, instance, **kwargs) -> None:
+    for field in _file_fields(sender):
+        release_after_commit(field.storage, getattr(instance, field.attname).name)
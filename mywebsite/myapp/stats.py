@@ -0,0 +1,146 @@
+"""Daily booking rollup behind the manage-bookings dashboard.
+
+``BookingDailyStats`` keeps booking counts and revenue per ride date, slot and
+program. New and deleted bookings adjust the affected rows with F() deltas;
+rarer edits (admin changes, re-priced lines) recompute the touched slots, and
+``rebuild_booking_stats`` recomputes everything for backfill or drift repair.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import Booking, BookingDailyStats, BookingItem
+
+Slot = Tuple[date, str]
+
+
+def _slot_filter(slots: Iterable[Slot]) -> Q:
+    condition = Q()
+    for ride_date, ride_time in slots:
+        condition |= Q(ride_date=ride_date, ride_time=ride_time)
+    return condition
+
+
+def _compute_rows(booking_filter: Optional[Q] = None) -> List[BookingDailyStats]:
+    bookings = Booking.objects.order_by()
+    if booking_filter is not None:
+        bookings = bookings.filter(booking_filter)
+    rows = [
+        BookingDailyStats(
+            ride_date=ride_date, ride_time=ride_time, program=None, bookings=count, revenue=revenue
+        )
+        for ride_date, ride_time, count, revenue in bookings.values_list("ride_date", "ride_time")
+        .annotate(count=Count("id"), revenue=Sum("total_amount"))
+        .values_list("ride_date", "ride_time", "count", "revenue")
+    ]
+
+    # Keep only the first line of each (booking, program) pair so a booking
+    # with several lines for one program is counted once.
+    earlier_line = BookingItem.objects.filter(
+        booking=OuterRef("booking"), program=OuterRef("program"), id__lt=OuterRef("id")
+    )
+    lines = BookingItem.objects.order_by().filter(~Exists(earlier_line))
+    if booking_filter is not None:
+        lines = lines.filter(booking__in=bookings.values("id"))
+    rows.extend(
+        BookingDailyStats(
+            ride_date=ride_date,
+            ride_time=ride_time,
+            program_id=program_id,
+            bookings=count,
+            revenue=revenue,
+        )
+        for ride_date, ride_time, program_id, count, revenue in lines.values_list(
+            "booking__ride_date", "booking__ride_time", "program_id"
+        )
+        .annotate(count=Count("id"), revenue=Sum("booking__total_amount"))
+        .values_list("booking__ride_date", "booking__ride_time", "program_id", "count", "revenue")
+    )
+    return rows
+
+
+def refresh_slots(slots: Iterable[Slot]) -> None:
+    """Recompute the rollup rows of the given (ride date, slot) pairs."""
+    slots = {(ride_date, ride_time or "") for ride_date, ride_time in slots}
+    if not slots:
+        return
+    with transaction.atomic():
+        BookingDailyStats.objects.filter(_slot_filter(slots)).delete()
+        BookingDailyStats.objects.bulk_create(_compute_rows(_slot_filter(slots)))
+
+
+def rebuild() -> int:
+    rows = _compute_rows()
+    with transaction.atomic():
+        BookingDailyStats.objects.all().delete()
+        BookingDailyStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def record_booking(booking: Booking, program_ids: Iterable[int], sign: int = 1) -> None:
+    """Add (``sign=1``) or remove (``sign=-1``) one booking from its slot's rows."""
+    program_ids = set(program_ids)
+    ride_time = booking.ride_time or ""
+    rows = BookingDailyStats.objects.filter(
+        Q(program__isnull=True) | Q(program_id__in=program_ids),
+        ride_date=booking.ride_date,
+        ride_time=ride_time,
+    )
+    if sign > 0:
+        # Insert-or-ignore first so concurrent first bookings of a slot both
+        # land on the same rows instead of racing on the unique constraints.
+        BookingDailyStats.objects.bulk_create(
+            [
+                BookingDailyStats(ride_date=booking.ride_date, ride_time=ride_time, program_id=program_id)
+                for program_id in [None, *program_ids]
+            ],
+            ignore_conflicts=True,
+        )
+    rows.update(
+        bookings=F("bookings") + sign,
+        revenue=F("revenue") + sign * booking.total_amount,
+    )
+    if sign < 0:
+        rows.filter(bookings__lte=0).delete()
+
+
+def booking_program_ids(booking: Booking) -> List[int]:
+    return list(
+        BookingItem.objects.filter(booking=booking).order_by().values_list("program_id", flat=True).distinct()
+    )
+
+
+def summarize(
+    program_id: Optional[int] = None,
+    ride_date: Optional[date] = None,
+    today: Optional[date] = None,
+) -> Dict[str, object]:
+    """Dashboard totals for the manage-bookings filters, read from the rollup."""
+    rows = BookingDailyStats.objects.order_by()
+    if program_id is not None:
+        rows = rows.filter(program_id=program_id)
+    else:
+        rows = rows.filter(program__isnull=True)
+    if ride_date is not None:
+        rows = rows.filter(ride_date=ride_date)
+
+    totals = rows.aggregate(
+        booking_count=Sum("bookings"),
+        total_revenue=Sum("revenue"),
+        upcoming_count=Sum("bookings", filter=Q(ride_date__gte=today or timezone.localdate())),
+    )
+    booking_count = totals["booking_count"] or 0
+    total_revenue = totals["total_revenue"] or Decimal("0")
+    return {
+        "booking_count": booking_count,
+        "total_revenue": total_revenue,
+        "average_revenue": total_revenue / booking_count if booking_count else Decimal("0"),
+        "upcoming_count": totals["upcoming_count"] or 0,
+    }
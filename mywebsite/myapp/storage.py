@@ -0,0 +1,217 @@
+"""Content-addressed media storage.
+
+Uploads are stored once per distinct content, under
+``blobs/<aa>/<bb>/<sha256><ext>``, whatever the model's ``upload_to`` says.
+The upload handlers below hash each file while the request body streams in.
+When the same bytes arrive a second time, the storage finds the blob
+already on disk and returns its name without writing anything.
+
+``MediaBlob`` counts how many saves point at each blob, and
+``delete`` only removes the file (and its responsive derivatives) when the
+last reference goes. Both hold the blob's row lock from the count change to
+the file write or removal, so a save of the same bytes can never count on
+a file that a delete is about to remove. Receivers in ``signals.py``
+release references when rows are deleted or given a new file. Names outside
+the blob tree (media saved before this storage, derivatives) behave as in
+``FileSystemStorage``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F, FileField
+
+from .images import is_derivative, variants_field
+
+BLOB_ROOT = "blobs"
+# Extensions longer than this are dropped so hash names fit ``max_length``.
+MAX_EXTENSION = 10
+
+
+class _HashingMixin:
+    """Hash each uploaded file's chunks as they are received."""
+
+    def new_file(self, *args, **kwargs):
+        self._hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self._hasher.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(_HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(_HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_hash(content) -> str:
+    """SHA-256 of a file, reusing the digest taken during upload if there is one."""
+    digest = getattr(content, "sha256", None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name(digest: str, original_name: str) -> str:
+    extension = PurePosixPath(original_name).suffix.lower()
+    if len(extension) > MAX_EXTENSION:
+        extension = ""
+    return f"{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def is_blob(self, name: Optional[str]) -> bool:
+        return bool(name) and name.startswith(f"{BLOB_ROOT}/") and not is_derivative(name)
+
+    def _save(self, name, content):
+        if name.startswith(f"{BLOB_ROOT}/") or is_derivative(name):
+            # Derivatives are written under their given name, next to their
+            # original, whether or not that original is a blob yet.
+            return super()._save(name, content)
+
+        digest = content_hash(content)
+        target = blob_name(digest, name)
+        with transaction.atomic():
+            self._add_reference(target, content.size)
+            if not self.exists(target):
+                saved = super()._save(target, content)
+                if saved != target:
+                    # Another request wrote the same bytes first.
+                    super().delete(saved)
+        return target
+
+    def _add_reference(self, name: str, size: int) -> None:
+        """Count one more reference; the row stays locked until commit."""
+        from .models import MediaBlob
+
+        # A delete holding the row makes this wait; once it has removed the
+        # row the UPDATE matches nothing and the blob is created afresh.
+        if MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1):
+            return
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, size=size or 0)
+        except IntegrityError:
+            MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1)
+
+    def delete(self, name):
+        """Drop one reference to a blob; the last one removes it from disk.
+
+        Call it outside other transactions (``release_after_commit`` does):
+        the files go before the row's deletion commits.
+        """
+        if not self.is_blob(name):
+            return super().delete(name)
+
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            # Writing first takes the row lock (and SQLite's write lock)
+            # before anything is read, so two deletes queue up instead of
+            # both reading and then failing to upgrade.
+            blobs = MediaBlob.objects.filter(name=name)
+            blobs.update(refcount=F("refcount") - 1)
+            if blobs.filter(refcount__gt=0).exists():
+                return
+            blobs.delete()
+            # Still under the row lock, so no save can count on these files.
+            self.remove_with_derivatives(name)
+
+    def remove_with_derivatives(self, name: str) -> None:
+        directory, _, filename = name.rpartition("/")
+        stem = PurePosixPath(filename).stem
+        for sibling in self.listdir(directory)[1] if self.exists(directory) else ():
+            if sibling == filename or (sibling.startswith(f"{stem}.") and is_derivative(sibling)):
+                super().delete(f"{directory}/{sibling}" if directory else sibling)
+
+
+def release_after_commit(storage, name: Optional[str]) -> None:
+    """Drop a row's reference to a blob once the current transaction commits."""
+    if isinstance(storage, ContentAddressedStorage) and storage.is_blob(name):
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def _file_columns() -> List[Tuple[type, FileField]]:
+    return [
+        (model, field)
+        for model in apps.get_app_config("myapp").get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField)
+    ]
+
+
+def adopt_existing_files(dry_run: bool = False) -> Dict[str, int]:
+    """Move files saved before content addressing into the blob tree.
+
+    Each referencing row is pointed at its blob (one reference per row) and
+    has its derivatives manifest cleared, since derivatives live next to
+    the file. Originals that no row uses any more are then deleted. With
+    ``dry_run`` nothing changes; the counts show what would happen.
+    """
+    stats = {"rows": 0, "files": 0, "blobs": 0, "bytes_saved": 0}
+    digests: Dict[str, str] = {}
+    blobs: Set[str] = set()
+    moved: Set[Tuple[ContentAddressedStorage, str]] = set()
+    for model, field in _file_columns():
+        storage = field.storage
+        if not isinstance(storage, ContentAddressedStorage):
+            continue
+        manifest_column = variants_field(field.name)
+        has_manifest = manifest_column in {column.name for column in model._meta.concrete_fields}
+        rows = model._default_manager.exclude(**{f"{field.attname}__isnull": True}).exclude(**{field.attname: ""})
+        for pk, name in rows.values_list("pk", field.attname).iterator():
+            if storage.is_blob(name) or not storage.exists(name):
+                continue
+            if name not in digests:
+                with storage.open(name, "rb") as handle:
+                    digests[name] = content_hash(handle)
+                stats["files"] += 1
+                target = blob_name(digests[name], name)
+                if target in blobs or storage.exists(target):
+                    stats["bytes_saved"] += storage.size(name)
+                else:
+                    stats["blobs"] += 1
+                blobs.add(target)
+            target = blob_name(digests[name], name)
+            stats["rows"] += 1
+            if dry_run:
+                continue
+            with transaction.atomic():
+                with storage.open(name, "rb") as handle:
+                    saved = storage.save(name, handle)
+                updates = {field.attname: saved}
+                if has_manifest:
+                    updates[manifest_column] = {}
+                model._default_manager.filter(pk=pk, **{field.attname: name}).update(**updates)
+            moved.add((storage, name))
+
+    for storage, name in moved:
+        if not any(
+            model._default_manager.filter(**{field.attname: name}).exists() for model, field in _file_columns()
+        ):
+            storage.remove_with_derivatives(name)
+    return stats
@@ -0,0 +1,39 @@
+"""Template tags for images with derivatives from ``myapp.images``."""
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, sizes="100vw", alt="", loading="lazy", **attrs):
+    """Render ``<picture>`` with WebP and fallback ``srcset`` for an image.
+
+    ``image`` is an image field file or a static path. Extra keyword
+    arguments become attributes of the ``<img>``, with ``_`` written as
+    ``-`` (``class="h-16"``, ``data_program_full=url``). Images without
+    derivatives render as a plain ``<img src>``.
+    """
+    found = images.sources(image)
+    img_attrs = {"src": found["src"], "alt": alt, "loading": loading}
+    if found["srcset"]:
+        img_attrs.update(srcset=found["srcset"], sizes=sizes, width=found["width"], height=found["height"])
+    img_attrs.update((name.replace("_", "-"), value) for name, value in attrs.items())
+    img = format_html(
+        "<img {}>",
+        format_html_join(" ", '{}="{}"', ((name, value) for name, value in img_attrs.items() if value is not None)),
+    )
+    if not found["webp_srcset"]:
+        return img
+    return format_html(
+        # ``display: contents`` keeps sizing classes on the <img> working
+        # against the surrounding container.
+        '<picture style="display: contents"><source type="image/webp" srcset="{}" sizes="{}">{}</picture>',
+        found["webp_srcset"],
+        sizes,
+        img,
+    )
+
@@ -1,12 +1,95 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from io import StringIO
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
-from .models import Profile, Staff, StaffFeedback
+from . import stats
+from .autocomplete import get_index as get_autocomplete_index
+from .bookings import create_booking
+from .capacity import SlotFullError
+from .exports import iter_booking_rows
+from .feedback import submit_feedback
+from .images import derivative_name, render_all, render_derivatives, sources
+from .inbox import attach_action
+from .pagecache import CSRF_PLACEHOLDER, mask_csrf_tokens
+from .pagination import paginate_keyset
+from .planner import plan_day, plan_range
+from .search import search_ids
+from .pricing import get_pricing
+from .utilization import fleet_utilization, longest_run
+from .views import USER_SORTS
+from .models import (
+    Action,
+    Addon,
+    Bike,
+    BikeAssignment,
+    Booking,
+    BookingAddon,
+    BookingDailyStats,
+    BookingItem,
+    MediaBlob,
+    Product,
+    Profile,
+    Program,
+    ProgramImage,
+    ProgramRate,
+    SlotCapacity,
+    SlotOccupancy,
+    Staff,
+    StaffFeedback,
+    contactList,
+)
+
+
+# Tests that read cached data use a private in-memory cache so they never see
+# (or clobber) entries left in the project's file cache.
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedTestCase(TestCase):
+    """Runs against a private in-memory cache, emptied before each test.
+
+    Version stamps, price tables and cached pages would otherwise land in the
+    project's file cache, shared with the dev server and earlier test runs.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedTransactionTestCase(TransactionTestCase):
+    """``CachedTestCase`` for tests that need real commits."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
 
 
-class StaffFeedbackTests(TestCase):
+class StaffFeedbackTests(CachedTestCase):
     def setUp(self):
+        super().setUp()
         self.user = User.objects.create_user(username="tester", password="pass1234")
         Profile.objects.create(user=self.user)
         self.staff = Staff.objects.create(name="Guide A")
@@ -36,9 +119,38 @@ class StaffFeedbackTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(StaffFeedback.objects.count(), 0)
 
+    def test_counters_follow_sentiment_flips_and_deletes(self):
+        client = Client()
+        client.login(username="tester", password="pass1234")
+        url = reverse("staff-feedback", args=[self.staff.id])
+        client.post(url, {"sentiment": StaffFeedback.Sentiment.LIKE})
+        client.post(url, {"sentiment": StaffFeedback.Sentiment.DISLIKE})
+        client.post(url, {"comment": "Took the long way round"})
+        client.post(url, {"comment": "Edited comment"})
+
+        self.staff.refresh_from_db()
+        self.assertEqual(
+            (self.staff.likes_count, self.staff.dislikes_count, self.staff.comment_count), (0, 1, 1)
+        )
+        feedback = StaffFeedback.objects.get()
+        self.assertEqual(self.staff.latest_feedback, feedback.updated_at)
+
+        other = User.objects.create_user(username="other", password="pass1234")
+        StaffFeedback.objects.create(staff=self.staff, user=other, sentiment=StaffFeedback.Sentiment.LIKE)
+        call_command("reconcile_staff_feedback", stdout=StringIO())
+        self.staff.refresh_from_db()
+        self.assertEqual((self.staff.likes_count, self.staff.dislikes_count), (1, 1))
+
+        feedback.delete()
+        self.staff.refresh_from_db()
+        self.assertEqual(
+            (self.staff.likes_count, self.staff.dislikes_count, self.staff.comment_count), (1, 0, 0)
+        )
+
 
-class StaffInsightsTests(TestCase):
+class StaffInsightsTests(CachedTestCase):
     def setUp(self):
+        super().setUp()
         self.staff_member = Staff.objects.create(name="Guide B")
         self.admin_user = User.objects.create_user(
             username="manager", password="pass1234", is_staff=True
@@ -72,3 +184,1610 @@ class StaffInsightsTests(TestCase):
         response = client.get(reverse("staff-insights"))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Guide feedback insights")
+
+
+class BookingServiceTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.programs = []
+        for index in range(5):
+            program = Program.objects.create(code=f"P{index}", name=f"Program {index}")
+            for participant in ProgramRate.Participant.values:
+                for age_group in ProgramRate.AgeGroup.values:
+                    ProgramRate.objects.create(
+                        program=program,
+                        participant_type=participant,
+                        age_group=age_group,
+                        price=Decimal("1000.00") + index * 100,
+                    )
+            self.programs.append(program)
+        self.addon = Addon.objects.create(code="TRANSFER", name="Transfer", price=Decimal("500.00"))
+
+    def _twenty_lines(self):
+        return [
+            {
+                "program": program,
+                "participant": participant,
+                "age_group": age_group,
+                "quantity": 2,
+            }
+            for program in self.programs
+            for participant in ProgramRate.Participant.values
+            for age_group in ProgramRate.AgeGroup.values
+        ]
+
+    def test_totals_match_model_save_path(self):
+        items = self._twenty_lines()
+        booking = create_booking(
+            items=items,
+            addons=[{"addon": self.addon, "quantity": 3}],
+            full_name="Group",
+            email="group@example.com",
+            phone="123",
+            ride_date=date(2025, 12, 1),
+        )
+
+        reference = Booking.objects.create(
+            full_name="Reference", email="ref@example.com", phone="123", ride_date=date(2025, 12, 1)
+        )
+        for item in items:
+            BookingItem.objects.create(
+                booking=reference,
+                program=item["program"],
+                participant_type=item["participant"],
+                age_group=item["age_group"],
+                quantity=item["quantity"],
+                unit_price=Decimal("0"),
+                line_total=Decimal("0"),
+            )
+        BookingAddon.objects.create(
+            booking=reference, addon=self.addon, quantity=3, unit_price=Decimal("0"), line_total=Decimal("0")
+        )
+        reference.refresh_from_db()
+        booking.refresh_from_db()
+
+        self.assertEqual(booking.total_amount, reference.total_amount)
+        self.assertEqual(booking.items.count(), 20)
+        self.assertEqual(
+            list(booking.items.values_list("unit_price", "line_total")),
+            list(reference.items.values_list("unit_price", "line_total")),
+        )
+
+    def test_twenty_line_booking_query_count(self):
+        get_pricing()
+        # With a warm pricing table: the savepoint pair, one INSERT each for
+        # the booking, its items and its add-ons, and the rollup upsert pair.
+        with self.assertNumQueries(7):
+            create_booking(
+                items=self._twenty_lines(),
+                addons=[{"addon": self.addon, "quantity": 1}],
+                full_name="Group",
+                email="group@example.com",
+                phone="123",
+                ride_date=date(2025, 12, 1),
+            )
+
+    def test_missing_rate_raises_without_writing(self):
+        program = Program.objects.create(code="NORATE", name="No rate")
+        with self.assertRaises(ValidationError):
+            create_booking(
+                items=[{"program": program, "participant": "rider", "age_group": "adult", "quantity": 1}],
+                full_name="Guest",
+                email="guest@example.com",
+                phone="123",
+                ride_date=date(2025, 12, 1),
+            )
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_booking_view_creates_priced_booking(self):
+        program = self.programs[0]
+        response = Client().post(
+            reverse("booking-page"),
+            {
+                "full_name": "Guest",
+                "email": "guest@example.com",
+                "phone": "123",
+                "ride_date": "2025-12-01",
+                "ride_time": "morning",
+                "active_program": [program.id],
+                f"rider_adult_{program.id}": "2",
+                f"addon_{self.addon.id}": "1",
+            },
+        )
+        booking = Booking.objects.get()
+        self.assertRedirects(response, reverse("booking-success", args=[booking.pk]), fetch_redirect_response=False)
+        self.assertEqual(booking.total_amount, Decimal("2500.00"))
+        self.assertEqual(SlotOccupancy.objects.get().riders, 2)
+
+    def test_booking_view_requires_a_ride_slot(self):
+        program = self.programs[0]
+        response = Client().post(
+            reverse("booking-page"),
+            {
+                "full_name": "Guest",
+                "email": "guest@example.com",
+                "phone": "123",
+                "ride_date": "2025-12-01",
+                "active_program": [program.id],
+                f"rider_adult_{program.id}": "2",
+            },
+        )
+        self.assertContains(response, "Please select a valid ride time slot.")
+        self.assertFalse(Booking.objects.exists())
+
+
+class PricingSnapshotTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = Program.objects.create(code="SNAP", name="Snapshot")
+        self.rate = ProgramRate.objects.create(
+            program=self.program,
+            participant_type=ProgramRate.Participant.RIDER,
+            age_group=ProgramRate.AgeGroup.ADULT,
+            price=Decimal("1200.00"),
+        )
+        self.addon = Addon.objects.create(code="ESCORT", name="Escort", price=Decimal("500.00"))
+
+    def test_cold_load_is_one_query_and_warm_lookups_are_free(self):
+        with self.assertNumQueries(1):
+            pricing = get_pricing()
+        self.assertEqual(pricing.rate(self.program.id, "rider", "adult"), Decimal("1200.00"))
+        self.assertEqual(pricing.addon_price(self.addon.id), Decimal("500.00"))
+        with self.assertNumQueries(0):
+            self.assertIs(get_pricing(), pricing)
+            self.assertEqual(self.program.get_rate("rider", "adult"), Decimal("1200.00"))
+
+    def test_rate_changes_invalidate_the_snapshot(self):
+        before = get_pricing()
+        self.rate.price = Decimal("1500.00")
+        self.rate.save()
+        after = get_pricing()
+        self.assertNotEqual(before.version, after.version)
+        self.assertEqual(after.rate(self.program.id, "rider", "adult"), Decimal("1500.00"))
+
+        self.rate.delete()
+        with self.assertRaises(ValidationError):
+            self.program.get_rate("rider", "adult")
+
+
+def _rider_booking(program, riders, ride_time="morning", ride_date=date(2025, 12, 1)):
+    return create_booking(
+        items=[
+            {
+                "program": program,
+                "participant": ProgramRate.Participant.RIDER,
+                "age_group": ProgramRate.AgeGroup.ADULT,
+                "quantity": riders,
+            },
+            {
+                "program": program,
+                "participant": ProgramRate.Participant.PASSENGER,
+                "age_group": ProgramRate.AgeGroup.CHILD,
+                "quantity": 1,
+            },
+        ],
+        full_name="Guest",
+        email="guest@example.com",
+        phone="123",
+        ride_date=ride_date,
+        ride_time=ride_time,
+    )
+
+
+def _priced_program(code="CAP"):
+    program = Program.objects.create(code=code, name="Capacity")
+    for participant in ProgramRate.Participant.values:
+        ProgramRate.objects.create(
+            program=program,
+            participant_type=participant,
+            age_group=ProgramRate.AgeGroup.ADULT if participant == "rider" else ProgramRate.AgeGroup.CHILD,
+            price=Decimal("1000.00"),
+        )
+    return program
+
+
+class SlotCapacityTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = _priced_program()
+
+    def test_capacity_defaults_to_fleet_size(self):
+        _rider_booking(self.program, 2)
+        occupancy = SlotOccupancy.objects.get()
+        self.assertEqual(occupancy.capacity, 50)
+        self.assertEqual(occupancy.riders, 2)
+
+    def test_rejects_bookings_over_capacity(self):
+        SlotCapacity.objects.create(ride_date=date(2025, 12, 1), ride_time="morning", capacity=3)
+        _rider_booking(self.program, 2)
+        with self.assertRaises(SlotFullError):
+            _rider_booking(self.program, 2)
+        _rider_booking(self.program, 1)
+        _rider_booking(self.program, 3, ride_time="noon")
+
+        self.assertEqual(Booking.objects.count(), 3)
+        self.assertEqual(
+            SlotOccupancy.objects.get(ride_time="morning").riders, 3
+        )
+
+    def test_reservation_on_known_slot_is_one_update(self):
+        from .capacity import reserve_riders
+
+        _rider_booking(self.program, 1)
+        with self.assertNumQueries(1):
+            reserve_riders(date(2025, 12, 1), "morning", 4)
+
+    def test_override_and_delete_release_seats(self):
+        booking = _rider_booking(self.program, 4)
+        SlotCapacity.objects.create(ride_date=date(2025, 12, 1), ride_time="morning", capacity=4)
+        with self.assertRaises(SlotFullError):
+            _rider_booking(self.program, 1)
+
+        booking.delete()
+        self.assertEqual(SlotOccupancy.objects.get().riders, 0)
+        _rider_booking(self.program, 4)
+
+    def test_bookings_saved_before_the_slot_row_take_their_seats(self):
+        booking = Booking.objects.create(
+            full_name="Earlier", email="e@example.com", phone="1", ride_date=date(2025, 12, 1), ride_time="morning"
+        )
+        BookingItem.objects.create(
+            booking=booking,
+            program=self.program,
+            participant_type=ProgramRate.Participant.RIDER,
+            age_group=ProgramRate.AgeGroup.ADULT,
+            quantity=50,
+        )
+        self.assertFalse(SlotOccupancy.objects.exists())
+
+        with self.assertRaises(SlotFullError):
+            _rider_booking(self.program, 1)
+        self.assertEqual(Booking.objects.count(), 1)
+        _rider_booking(self.program, 1, ride_time="noon")
+        self.assertEqual(SlotOccupancy.objects.get(ride_time="noon").riders, 1)
+
+    def test_losing_the_race_to_create_the_slot_still_reserves(self):
+        from . import capacity
+
+        def created_by_another_request(ride_date, ride_time):
+            SlotOccupancy.objects.create(ride_date=ride_date, ride_time=ride_time, capacity=5)
+
+        with mock.patch.object(capacity, "_get_or_create_slot", created_by_another_request):
+            capacity.reserve_riders(date(2025, 12, 1), "morning", 2)
+        self.assertEqual(SlotOccupancy.objects.get().riders, 2)
+
+    def test_admin_bookings_and_moves_are_recounted(self):
+        _rider_booking(self.program, 2)
+        admin_user = User.objects.create_superuser("desk", password="pw")
+        self.client.force_login(admin_user)
+        data = {
+            "full_name": "Walk in",
+            "email": "walk@example.com",
+            "phone": "1",
+            "ride_date": "2025-12-01",
+            "ride_time": "morning",
+            "items-TOTAL_FORMS": "1",
+            "items-INITIAL_FORMS": "0",
+            "items-0-program": self.program.pk,
+            "items-0-participant_type": "rider",
+            "items-0-age_group": "adult",
+            "items-0-quantity": "3",
+            "items-0-unit_price": "0",
+            "items-0-line_total": "0",
+            "addons-TOTAL_FORMS": "0",
+            "addons-INITIAL_FORMS": "0",
+        }
+        response = self.client.post(reverse("admin:myapp_booking_add"), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(SlotOccupancy.objects.get(ride_time="morning").riders, 5)
+
+        booking = Booking.objects.get(full_name="Walk in")
+        booking.ride_time = "noon"
+        booking.save()
+        self.assertEqual(SlotOccupancy.objects.get(ride_time="morning").riders, 2)
+        self.assertEqual(SlotOccupancy.objects.get(ride_time="noon").riders, 3)
+
+        booking.delete()
+        self.assertEqual(SlotOccupancy.objects.get(ride_time="noon").riders, 0)
+        self.assertEqual(SlotOccupancy.objects.get(ride_time="morning").riders, 2)
+
+    def test_rebuild_command_recounts_every_slot(self):
+        _rider_booking(self.program, 2)
+        _rider_booking(self.program, 1, ride_time="noon")
+        SlotOccupancy.objects.update(riders=40)
+        SlotOccupancy.objects.filter(ride_time="noon").delete()
+
+        out = StringIO()
+        call_command("rebuild_slot_occupancy", stdout=out)
+        self.assertIn("2 slot(s)", out.getvalue())
+        counts = dict(SlotOccupancy.objects.values_list("ride_time", "riders"))
+        self.assertEqual(counts, {"morning": 2, "noon": 1})
+
+
+class SlotCapacityConcurrencyTests(CachedTransactionTestCase):
+    def test_parallel_bookings_never_overbook(self):
+        program = _priced_program()
+        SlotCapacity.objects.create(ride_date=date(2025, 12, 1), ride_time="morning", capacity=5)
+        results = []
+        start = threading.Barrier(10)
+
+        def book():
+            try:
+                start.wait()
+                _rider_booking(program, 1)
+                results.append("ok")
+            except SlotFullError:
+                results.append("full")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count("ok"), 5)
+        self.assertEqual(results.count("full"), 5)
+        self.assertEqual(Booking.objects.count(), 5)
+        self.assertEqual(SlotOccupancy.objects.get().riders, 5)
+
+
+class StaffFeedbackConcurrencyTests(CachedTransactionTestCase):
+    def test_simultaneous_votes_keep_one_row_and_exact_counts(self):
+        staff = Staff.objects.create(name="Guide C")
+        users = [User.objects.create_user(username=f"voter{index}") for index in range(4)]
+        sentiments = [StaffFeedback.Sentiment.LIKE, StaffFeedback.Sentiment.DISLIKE]
+        votes = [(user, sentiments[(index + attempt) % 2]) for index, user in enumerate(users) for attempt in range(5)]
+        errors = []
+        start = threading.Barrier(len(votes))
+
+        def vote(user, sentiment):
+            try:
+                start.wait()
+                submit_feedback(staff, user, {"sentiment": sentiment, "comment": f"{user.username} {sentiment}"})
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vote, args=vote_args) for vote_args in votes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(StaffFeedback.objects.count(), len(users))
+        staff.refresh_from_db()
+        likes = StaffFeedback.objects.filter(sentiment=StaffFeedback.Sentiment.LIKE).count()
+        self.assertEqual(staff.likes_count, likes)
+        self.assertEqual(staff.dislikes_count, len(users) - likes)
+        self.assertEqual(staff.comment_count, len(users))
+
+
+class AvailabilityTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = _priced_program()
+        self.url = reverse("booking-availability")
+
+    def _day(self, response, iso_date):
+        return next(day for day in response.json()["days"] if day["date"] == iso_date)
+
+    def test_reports_booked_and_remaining_per_slot(self):
+        SlotCapacity.objects.create(ride_date=date(2025, 12, 1), ride_time="noon", capacity=10)
+        _rider_booking(self.program, 3)
+        _rider_booking(self.program, 2, ride_time="noon")
+
+        response = self.client.get(self.url, {"month": "2025-12"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["days"]), 31)
+        day = self._day(response, "2025-12-01")
+        self.assertEqual(day["slots"]["morning"], {"riders": 3, "passengers": 1, "capacity": 50, "remaining": 47})
+        self.assertEqual(day["slots"]["noon"]["remaining"], 8)
+
+    def test_month_is_cached_and_revalidated_with_etag(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {"month": "2025-12"})
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url, {"month": "2025-12"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_new_booking_refreshes_only_its_day(self):
+        first = self.client.get(self.url, {"month": "2025-12"})
+        _rider_booking(self.program, 4, ride_date=date(2025, 12, 5))
+
+        # Only the booked day is recomputed.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {"month": "2025-12"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._day(response, "2025-12-05")["slots"]["morning"]["riders"], 4)
+
+    def test_invalid_month(self):
+        response = self.client.get(self.url, {"month": "12-2025"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingQuoteTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = _priced_program("QUOTE")
+        self.addon = Addon.objects.create(code="PICKUP", name="Pickup", price=Decimal("250.00"))
+        self.url = reverse("booking-quote")
+
+    def test_quote_prices_lines_without_writes(self):
+        params = {
+            "active_program": [self.program.id],
+            f"rider_adult_{self.program.id}": "2",
+            f"passenger_child_{self.program.id}": "1",
+            f"addon_{self.addon.id}": "2",
+        }
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], "3500.00")
+        self.assertEqual(len(response.json()["lines"]), 2)
+        with self.assertNumQueries(0):
+            self.client.get(self.url, params)
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_inactive_selection_and_bad_input(self):
+        params = {"active_program": ["999"], f"rider_adult_{self.program.id}": "2"}
+        self.assertEqual(self.client.get(self.url, params).json()["total"], "0")
+        response = self.client.get(self.url, {f"rider_adult_{self.program.id}": "-1"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {f"rider_child_{self.program.id}": "1"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingStatsTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = _priced_program("STA")
+        self.other = _priced_program("STB")
+
+    def _rows(self):
+        return set(
+            BookingDailyStats.objects.values_list("ride_date", "ride_time", "program_id", "bookings", "revenue")
+        )
+
+    def test_rollup_tracks_creates_edits_and_deletes(self):
+        first = _rider_booking(self.program, 2, ride_date=date(2030, 1, 5))
+        _rider_booking(self.program, 1, ride_date=date(2030, 1, 5))
+        _rider_booking(self.other, 1, ride_time="noon", ride_date=date(2020, 1, 5))
+
+        summary = stats.summarize(today=date(2025, 1, 1))
+        self.assertEqual(summary["booking_count"], 3)
+        self.assertEqual(summary["total_revenue"], Decimal("7000.00"))
+        self.assertEqual(summary["upcoming_count"], 2)
+        self.assertEqual(stats.summarize(self.program.id)["total_revenue"], Decimal("5000.00"))
+
+        first.ride_date = date(2030, 1, 6)
+        first.save()
+        self.assertEqual(stats.summarize(self.program.id, date(2030, 1, 6))["booking_count"], 1)
+        self.assertEqual(stats.summarize(self.program.id, date(2030, 1, 5))["booking_count"], 1)
+
+        BookingItem.objects.create(
+            booking=first,
+            program=self.other,
+            participant_type=ProgramRate.Participant.RIDER,
+            age_group=ProgramRate.AgeGroup.ADULT,
+            quantity=1,
+            unit_price=Decimal("0"),
+            line_total=Decimal("0"),
+        )
+        # Lines saved one by one are recounted once, as the admin does.
+        stats.refresh_slots([(first.ride_date, first.ride_time)])
+        self.assertEqual(stats.summarize(self.other.id)["booking_count"], 2)
+        self.assertEqual(stats.summarize()["total_revenue"], Decimal("8000.00"))
+
+        first.delete()
+        self.assertEqual(stats.summarize()["booking_count"], 2)
+        self.assertEqual(stats.summarize(self.other.id)["booking_count"], 1)
+
+        incremental = self._rows()
+        stats.rebuild()
+        self.assertEqual(self._rows(), incremental)
+
+    def test_admin_inline_edits_refresh_the_rollup_once(self):
+        booking = _rider_booking(self.program, 2)
+        self.client.force_login(User.objects.create_superuser("desk", password="pw"))
+        data = {
+            "full_name": booking.full_name,
+            "email": booking.email,
+            "phone": booking.phone,
+            "ride_date": booking.ride_date.isoformat(),
+            "ride_time": booking.ride_time,
+            "items-TOTAL_FORMS": "2",
+            "items-INITIAL_FORMS": "2",
+            "addons-TOTAL_FORMS": "0",
+            "addons-INITIAL_FORMS": "0",
+        }
+        for index, item in enumerate(booking.items.all()):
+            data.update(
+                {
+                    f"items-{index}-id": item.pk,
+                    f"items-{index}-booking": booking.pk,
+                    f"items-{index}-program": item.program_id,
+                    f"items-{index}-participant_type": item.participant_type,
+                    f"items-{index}-age_group": item.age_group,
+                    f"items-{index}-quantity": item.quantity + 1,
+                    f"items-{index}-unit_price": item.unit_price,
+                    f"items-{index}-line_total": item.line_total,
+                }
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("admin:myapp_booking_change", args=[booking.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(stats.summarize()["total_revenue"], Decimal("5000.00"))
+        rollup_deletes = [q for q in queries if q["sql"].startswith('DELETE FROM "myapp_bookingdailystats"')]
+        self.assertEqual(len(rollup_deletes), 2)  # the booking's post_save, then once after the lines
+
+    def test_dashboard_reads_rollup(self):
+        for _ in range(3):
+            _rider_booking(self.program, 1)
+        staff = User.objects.create_user("manager", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        with self.assertNumQueries(1):
+            stats.summarize()
+        response = self.client.get(reverse("booking-list-page"), {"program": self.program.id})
+        self.assertEqual(response.context["total_results"], 3)
+        self.assertEqual(response.context["total_revenue"], Decimal("6000.00"))
+        self.assertEqual(len(response.context["bookings"]), 3)
+
+
+class KeysetPaginationTests(CachedTestCase):
+    def _walk(self, queryset, ordering, per_page):
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(queryset, ordering, cursor, per_page)
+            pages.append([row.id for row in page])
+            if not page.next_cursor:
+                return pages, page
+            cursor = page.next_cursor
+
+    def test_mixed_ordering_walks_forward_and_back(self):
+        manager = User.objects.create_user("fleet", password="pw", is_staff=True)
+        for day in range(1, 6):
+            for bike in Bike.objects.filter(number__in=[3, 1, 2]):
+                BikeAssignment.objects.create(bike=bike, date=date(2025, 1, day), assigned_by=manager)
+        ordering = ("-date", "bike__number", "id")
+        queryset = BikeAssignment.objects.select_related("bike")
+        expected = list(queryset.order_by(*ordering).values_list("id", flat=True))
+
+        pages, last = self._walk(queryset, ordering, 4)
+        self.assertEqual([row for page in pages for row in page], expected)
+
+        backwards, cursor = [], last.previous_cursor
+        while cursor:
+            page = paginate_keyset(queryset, ordering, cursor, 4)
+            backwards.insert(0, [row.id for row in page])
+            cursor = page.previous_cursor
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_deep_page_is_a_single_query(self):
+        for index in range(30):
+            Booking.objects.create(full_name=f"Guest {index}", email="g@example.com", phone="1", ride_date=date(2025, 1, 1))
+        pages, _ = self._walk(Booking.objects.all(), ("-created_at", "-id"), 10)
+        self.assertEqual(len(pages), 3)
+        cursor = paginate_keyset(Booking.objects.all(), ("-created_at", "-id"), None, 20).next_cursor
+        with self.assertNumQueries(1):
+            page = paginate_keyset(Booking.objects.all(), ("-created_at", "-id"), cursor, 10)
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_next)
+
+        first = paginate_keyset(Booking.objects.all(), ("-created_at", "-id"), "not-a-cursor", 10)
+        self.assertFalse(first.has_previous)
+
+    def test_list_orderings_are_served_by_indexes(self):
+        plans = [
+            Booking.objects.order_by("-created_at", "-id")[:10].explain(),
+            BikeAssignment.objects.select_related("bike").order_by("-date", "bike_id", "id")[:10].explain(),
+        ]
+        for plan in plans:
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_history_links_keep_filters(self):
+        manager = User.objects.create_user("fleet", password="pw", is_staff=True)
+        bike = Bike.objects.get(number=1)
+        for day in range(1, 61):
+            BikeAssignment.objects.create(bike=bike, date=date(2025, 1, 1) + timedelta(days=day), assigned_by=manager)
+        self.client.force_login(manager)
+        response = self.client.get(reverse("bike-usage-history"), {"filter_bike": bike.id})
+        page = response.context["page"]
+        self.assertEqual(len(page), 50)
+        self.assertContains(response, f"filter_bike={bike.id}&cursor={page.next_cursor}")
+        response = self.client.get(reverse("bike-usage-history"), {"filter_bike": bike.id, "cursor": page.next_cursor})
+        self.assertEqual(len(response.context["assignment_log"]), 10)
+
+
+class BookingExportTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = _priced_program("EXP")
+        self.other = _priced_program("EXQ")
+        self.staff = User.objects.create_user("accounts", password="pw", is_staff=True)
+
+    def _bulk_bookings(self, count):
+        bookings = Booking.objects.bulk_create(
+            Booking(full_name=f"Guest {index}", email="g@example.com", phone="1", ride_date=date(2025, 3, 1))
+            for index in range(count)
+        )
+        BookingItem.objects.bulk_create(
+            BookingItem(
+                booking=booking,
+                program=self.program,
+                participant_type=ProgramRate.Participant.RIDER,
+                age_group=ProgramRate.AgeGroup.ADULT,
+                quantity=1,
+                unit_price=Decimal("1000.00"),
+                line_total=Decimal("1000.00"),
+            )
+            for booking in bookings
+        )
+
+    def test_csv_export_honours_filters(self):
+        addon = Addon.objects.create(code="PHOTO", name="Photos", price=Decimal("300.00"))
+        create_booking(
+            items=[{"program": self.program, "participant": "rider", "age_group": "adult", "quantity": 2}],
+            addons=[{"addon": addon, "quantity": 1}],
+            full_name="Exported, Guest",
+            email="x@example.com",
+            phone="1",
+            ride_date=date(2025, 3, 1),
+        )
+        _rider_booking(self.other, 1, ride_date=date(2025, 3, 1))
+        _rider_booking(self.program, 1, ride_date=date(2025, 3, 2))
+
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse("booking-export"), {"program": self.program.id, "ride_date": "2025-03-01"}
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith("booking_id,created_at,full_name"))
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"Exported, Guest"', lines[1])
+        self.assertIn(",addon,PHOTO,,,1,300.00,300.00", lines[2])
+
+        response = self.client.get(reverse("booking-export"), {"format": "ndjson", "ride_date": "2025-03-02"})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([record["line_type"] for record in records], ["item", "item"])
+        self.assertEqual(self.client.get(reverse("booking-export"), {"format": "xlsx"}).status_code, 400)
+
+    def test_csv_export_quotes_cells_a_spreadsheet_would_evaluate(self):
+        Booking.objects.create(
+            full_name='=HYPERLINK("http://evil.example","x")',
+            email="@sum(1)",
+            phone="+123",
+            ride_date=date(2025, 3, 1),
+        )
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("booking-export"))
+        row = next(csv.reader(b"".join(response.streaming_content).decode().splitlines()[1:]))
+        self.assertEqual(row[2:5], ['\'=HYPERLINK("http://evil.example","x")', "'@sum(1)", "'+123"])
+
+        response = self.client.get(reverse("booking-export"), {"format": "ndjson"})
+        record = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(record["phone"], "+123")
+
+    def test_export_requires_staff(self):
+        member = User.objects.create_user("member", password="pw")
+        self.client.force_login(member)
+        self.assertEqual(self.client.get(reverse("booking-export")).status_code, 403)
+
+    def test_export_redirects_anonymous_visitors_to_login(self):
+        self.client.logout()
+        resp = self.client.get(reverse("booking-export"))
+        self.assertRedirects(resp, f"/login?next={reverse('booking-export')}", fetch_redirect_response=False)
+
+    def test_booking_list_redirects_anonymous_visitors_to_login(self):
+        resp = self.client.get(reverse("booking-list-page"))
+        self.assertEqual(resp.status_code, 302)
+
+    def test_memory_stays_flat_as_bookings_grow(self):
+        # Full-size runs: manage.py bench_booking_export (100k bookings).
+        self._bulk_bookings(3000)
+        with self.assertNumQueries(1 + 2 * 6):
+            rows = sum(len(chunk) for chunk in iter_booking_rows(Booking.objects.all(), chunk_size=500))
+        self.assertEqual(rows, 3000)
+
+        def peak(bookings):
+            tracemalloc.start()
+            for _ in iter_booking_rows(bookings, chunk_size=500):
+                pass
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak_bytes
+
+        cutoff = Booking.objects.order_by("id").values_list("id", flat=True)[499]
+        small = peak(Booking.objects.filter(id__lte=cutoff))
+        large = peak(Booking.objects.all())
+        self.assertLess(large, small * 2)
+
+
+class CatalogTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+
+    def _add_programs(self, start, count):
+        for index in range(start, start + count):
+            program = _priced_program(f"CAT{index}")
+            ProgramImage.objects.create(program=program, image=f"programs/{index}-b.jpg", display_order=2)
+            ProgramImage.objects.create(program=program, image=f"programs/{index}-a.jpg", display_order=1)
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_program_pages_query_count_does_not_grow(self):
+        self._add_programs(0, 2)
+        pages = [reverse("home"), reverse("booking-page")]
+        cold = [self._count_queries(url) for url in pages]
+        warm = [self._count_queries(url) for url in pages]
+
+        self._add_programs(2, 8)
+        # Fragments that do not depend on programs stay cached, so a page can
+        # only get cheaper than its first render.
+        for url, count in zip(pages, cold):
+            self.assertLessEqual(self._count_queries(url), count)
+        self.assertEqual([self._count_queries(url) for url in pages], warm)
+
+    def test_program_detail_uses_ordered_images(self):
+        self._add_programs(0, 1)
+        url = reverse("program-detail", args=["CAT0"])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context["primary_image"].image.name, "programs/0-a.jpg")
+        self.assertEqual([image.image.name for image in response.context["gallery"]], ["programs/0-b.jpg"])
+
+        Program.objects.filter(code="CAT0").update(active=False)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        Program.objects.get(code="CAT0").save()
+        self.assertTemplateUsed(self.client.get(url), "myapp/404errorPage.html")
+
+
+class BikeAssignmentSaveTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user("fleet", password="pw", is_staff=True)
+        self.client.force_login(self.manager)
+        self.url = reverse("bike-usage-page")
+        self.bike_ids = list(Bike.objects.order_by("number").values_list("id", flat=True))
+
+    def _save(self, bike_ids):
+        return self.client.post(
+            self.url, {"form": "assign", "assign_date": "2025-02-01", "bikes": [str(pk) for pk in bike_ids]}
+        )
+
+    def _query_count(self, bike_ids):
+        with CaptureQueriesContext(connection) as captured:
+            self._save(bike_ids)
+        return len(captured)
+
+    def test_save_cost_does_not_depend_on_bike_count(self):
+        few = self._query_count(self.bike_ids[:5])
+        BikeAssignment.objects.all().delete()
+        self.assertEqual(self._query_count(self.bike_ids), few)
+        # With deselections there is one extra DELETE, however many go.
+        drop_one = self._query_count(self.bike_ids[1:])
+        self._save(self.bike_ids)
+        self.assertEqual(self._query_count(self.bike_ids[:5]), drop_one)
+        self.assertEqual(drop_one, few + 1)
+
+    def test_save_applies_the_diff(self):
+        self._save(self.bike_ids[:3])
+        first = BikeAssignment.objects.get(bike_id=self.bike_ids[0])
+        other = User.objects.create_user("fleet2", password="pw", is_staff=True)
+        self.client.force_login(other)
+        self._save(self.bike_ids[1:4] + [999999])
+
+        rows = BikeAssignment.objects.filter(date=date(2025, 2, 1))
+        self.assertEqual(sorted(rows.values_list("bike_id", flat=True)), self.bike_ids[1:4])
+        self.assertEqual(set(rows.values_list("assigned_by", flat=True)), {other.id})
+        self.assertFalse(BikeAssignment.objects.filter(pk=first.pk).exists())
+
+
+class FleetUtilizationTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user("fleet", password="pw", is_staff=True)
+        self.bikes = list(Bike.objects.order_by("number")[:3])
+        self.start = date(2025, 1, 30)
+        self.end = date(2025, 2, 8)
+
+    def _assign(self, bike, *days):
+        BikeAssignment.objects.bulk_create(
+            BikeAssignment(bike=bike, date=self.start + timedelta(days=day), assigned_by=self.manager)
+            for day in days
+        )
+
+    def test_longest_run(self):
+        for bits in (0, 1, 0b1011, 0b111011110, (1 << 300) - 1, 0b1 | ((1 << 37) - 1) << 5):
+            expected = max((len(run) for run in bin(bits)[2:].split("0")), default=0)
+            self.assertEqual(longest_run(bits), expected)
+
+    def test_per_bike_and_daily_figures(self):
+        first, second, idle = self.bikes
+        self._assign(first, 0, 1, 2, 6)
+        self._assign(second, 2, 9)
+        self._assign(first, 10)  # outside the range
+
+        with self.assertNumQueries(1):
+            report = fleet_utilization(self.start, self.end, self.bikes)
+
+        rows = {row["bike"].id: row for row in report["bike_rows"]}
+        self.assertEqual(rows[first.id]["used_days"], 4)
+        self.assertEqual(rows[first.id]["utilization"], 40.0)
+        self.assertEqual(rows[first.id]["longest_idle"], 3)
+        self.assertEqual(rows[first.id]["current_idle"], 3)
+        self.assertEqual(rows[second.id]["longest_idle"], 6)
+        self.assertEqual(rows[second.id]["current_idle"], 0)
+        self.assertEqual(rows[idle.id]["longest_idle"], 10)
+        self.assertEqual([cell["days"] for cell in rows[first.id]["months"]], [2, 2])
+        self.assertEqual([day["bikes"] for day in report["daily"]], [1, 1, 2, 0, 0, 0, 1, 0, 0, 1])
+        self.assertEqual(report["busiest_day"]["date"], date(2025, 2, 1))
+        self.assertEqual(report["fleet_utilization"], 20.0)
+        # 30 Jan 2025 is a Thursday: three blank cells lead the first week.
+        self.assertEqual(report["weeks"][0][:4], [None, None, None, report["daily"][0]])
+        self.assertTrue(all(len(week) == 7 for week in report["weeks"]))
+
+    def test_view_is_staff_only(self):
+        url = reverse("fleet-utilization")
+        self.client.force_login(User.objects.create_user("rider", password="pw"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.manager)
+        self._assign(self.bikes[0], 0)
+        with self.assertNumQueries(5):  # session, user, profile, bikes, assignments
+            resp = self.client.get(url, {"start": "2025-02-08", "end": "2025-01-30"})
+        self.assertEqual(resp.context["start"], self.start)
+        self.assertEqual(resp.context["end"], self.end)
+        self.assertContains(resp, "Fleet utilization")
+
+
+
+class BikePlannerTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user("fleet", password="pw", is_staff=True)
+        self.program = Program.objects.create(code="PLAN", name="Planner")
+        ProgramRate.objects.create(program=self.program, participant_type="rider", age_group="adult", price=Decimal("10"))
+        ProgramRate.objects.create(program=self.program, participant_type="passenger", age_group="adult", price=Decimal("5"))
+        self.day = date(2025, 3, 3)
+
+    def _book(self, ride_time, riders, passengers=0, ride_date=None):
+        items = [{"program": self.program, "participant": "rider", "age_group": "adult", "quantity": riders}]
+        if passengers:
+            items.append({"program": self.program, "participant": "passenger", "age_group": "adult", "quantity": passengers})
+        create_booking(
+            items=items,
+            full_name="Group",
+            email="group@example.com",
+            phone="123",
+            ride_date=ride_date or self.day,
+            ride_time=ride_time,
+        )
+
+    def test_required_bikes_follow_the_busiest_slot(self):
+        self._book("morning", 3, passengers=2)
+        self._book("morning", 2)
+        self._book("noon", 4)
+        self._book("", 1)
+
+        plan = plan_day(self.day)
+        self.assertEqual(plan.slots, {"morning": 5, "noon": 4})
+        self.assertEqual(plan.required, 6)
+        self.assertEqual(len(plan.bikes), 6)
+        self.assertEqual(plan.shortfall, 0)
+
+    def test_proposals_prefer_least_used_bikes_across_a_batch(self):
+        bikes = list(Bike.objects.order_by("number")[:4])
+        BikeAssignment.objects.create(bike=bikes[0], date=date(2025, 1, 1), assigned_by=self.manager)
+        self._book("morning", 2)
+        self._book("morning", 2, ride_date=self.day + timedelta(days=1))
+        self._book("morning", 5, ride_date=self.day + timedelta(days=2))
+
+        with self.assertNumQueries(2):
+            plans = plan_range(self.day, self.day + timedelta(days=3), bikes)
+
+        numbers = [[bike.number for bike in plan.bikes] for plan in plans]
+        self.assertEqual(numbers[0], [bikes[1].number, bikes[2].number])
+        self.assertEqual(numbers[1], [bikes[0].number, bikes[3].number])
+        self.assertEqual(len(numbers[2]), 4)
+        self.assertEqual(plans[2].shortfall, 1)
+        self.assertEqual(numbers[3], [])
+
+    def test_dashboard_prefills_the_proposal_until_saved(self):
+        self._book("afternoon", 3)
+        self.client.force_login(self.manager)
+        url = reverse("bike-usage-page")
+        resp = self.client.get(url, {"manage_date": self.day.isoformat()})
+        self.assertTrue(resp.context["proposed"])
+        self.assertEqual(len(resp.context["selected_ids"]), 3)
+
+        bike = Bike.objects.order_by("number").first()
+        BikeAssignment.objects.create(bike=bike, date=self.day, assigned_by=self.manager)
+        resp = self.client.get(url, {"manage_date": self.day.isoformat()})
+        self.assertFalse(resp.context["proposed"])
+        self.assertEqual(resp.context["selected_ids"], {bike.id})
+
+    def test_command_applies_unsaved_days(self):
+        self._book("morning", 2)
+        out = StringIO()
+        call_command(
+            "plan_bike_assignments", start=self.day.isoformat(), days=2, apply=True, user="fleet", stdout=out
+        )
+        self.assertEqual(BikeAssignment.objects.filter(date=self.day).count(), 2)
+        self.assertIn("Saved 2 day(s)", out.getvalue())
+
+
+class UserListApiTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user("admin", password="pw", is_staff=True)
+        for index in range(30):
+            user = User.objects.create_user(
+                f"member{index:02d}", email=f"m{index:02d}@example.com", is_staff=index % 10 == 0
+            )
+            Profile.objects.create(user=user, usertype="VIP" if index % 3 == 0 else "member", point=index)
+        self.client.force_login(self.admin)
+        self.url = reverse("ajax_user_list")
+
+    def test_pages_follow_the_cursor(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {"per_page": 12, "q": "member"}
+            if cursor:
+                params["cursor"] = cursor
+            with self.assertNumQueries(3):  # session, user, page
+                data = self.client.get(self.url, params).json()
+            seen += [user["username"] for user in data["users"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(f"member{index:02d}" for index in range(30)))
+
+    def test_every_sort_builds_its_cursor_without_extra_queries(self):
+        for sort in USER_SORTS:
+            with self.subTest(sort=sort), self.assertNumQueries(3):  # session, user, page
+                data = self.client.get(self.url, {"per_page": 12, "sort": sort}).json()
+            self.assertTrue(data["next_cursor"])
+
+    def test_search_filters_and_sort(self):
+        data = self.client.get(self.url, {"q": "m07@"}).json()
+        self.assertEqual([user["username"] for user in data["users"]], ["member07"])
+        self.assertEqual(data["users"][0]["point"], 7)
+
+        data = self.client.get(self.url, {"is_staff": "true", "usertype": "vip", "sort": "-username"}).json()
+        self.assertEqual([user["username"] for user in data["users"]], ["member00"])
+
+        data = self.client.get(self.url, {"is_staff": "false", "usertype": "VIP", "sort": "-username"}).json()
+        self.assertEqual(data["users"][0]["username"], "member27")
+        self.assertEqual(self.client.get(self.url, {"sort": "password"}).status_code, 400)
+
+    def test_staff_only_and_page_no_longer_embeds_users(self):
+        page = self.client.get(reverse("user-management-page"))
+        self.assertNotContains(page, "member07")
+        self.client.force_login(User.objects.get(username="member01"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class BatchUserApiTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user("admin", password="pw", is_staff=True)
+        self.guide = User.objects.create_user("guide", email="old@example.com")
+        Profile.objects.create(user=self.guide, usertype="member", point=3)
+        self.retired = User.objects.create_user("retired")
+        self.client.force_login(self.admin)
+        self.url = reverse("ajax_user_batch")
+
+    def _post(self, operations):
+        return self.client.post(self.url, json.dumps({"operations": operations}), content_type="application/json")
+
+    def test_applies_valid_items_and_reports_the_rest(self):
+        operations = [
+            {"op": "create", "username": f"season{index}", "password": "ride-the-dunes", "usertype": "guide"}
+            for index in range(5)
+        ]
+        operations += [
+            {"op": "create", "username": "guide", "password": "x"},
+            {"op": "create", "username": "season0", "password": "x"},
+            {"op": "update", "id": self.guide.id, "email": "new@example.com", "point": 9, "is_staff": True},
+            {"op": "update", "id": 999999, "email": "nobody@example.com"},
+            {"op": "deactivate", "id": self.retired.id},
+            {"op": "deactivate", "id": self.admin.id},
+            {"op": "rename"},
+        ]
+        # session, user, two lookups, then one insert or update per table inside the transaction
+        with self.assertNumQueries(10):
+            data = self._post(operations).json()
+
+        self.assertEqual((data["applied"], data["failed"]), (7, 5))
+        errors = {result["index"]: result.get("error") for result in data["results"] if not result["ok"]}
+        self.assertEqual(
+            errors,
+            {
+                5: "Username already exists",
+                6: "Username already exists",
+                8: "User not found",
+                10: "Users cannot deactivate themselves",
+                11: "Unknown op; expected one of create, update, deactivate",
+            },
+        )
+        created = User.objects.select_related("profile").get(username="season3")
+        self.assertTrue(created.check_password("ride-the-dunes"))
+        self.assertEqual(created.profile.usertype, "guide")
+        self.guide.refresh_from_db()
+        self.assertEqual((self.guide.email, self.guide.is_staff, self.guide.profile.point), ("new@example.com", True, 9))
+        self.assertFalse(User.objects.get(pk=self.retired.pk).is_active)
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.client.post(self.url, "nope", content_type="application/json").status_code, 400)
+        self.assertEqual(self._post({"op": "create"}).status_code, 400)
+        self.client.force_login(self.guide)
+        self.assertEqual(self._post([]).status_code, 403)
+
+
+class ContactInboxTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user("desk", password="pw", is_staff=True)
+        self.client.force_login(self.staff)
+        self.url = reverse("showcontact-page")
+        contactList.objects.bulk_create(
+            contactList(topic=f"Question {index}", email=f"rider{index}@example.com", complete=index % 4 == 0)
+            for index in range(60)
+        )
+
+    def test_open_messages_page_newest_first(self):
+        resp = self.client.get(self.url)
+        ids = [contact.id for contact in resp.context["contact"]]
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertFalse(any(contact.complete for contact in resp.context["contact"]))
+        self.assertEqual((resp.context["open_count"], resp.context["total_count"]), (45, 60))
+
+        resp = self.client.get(self.url, {"status": "open", "cursor": resp.context["page"].next_cursor})
+        self.assertTrue(all(contact.id < ids[-1] for contact in resp.context["contact"]))
+
+        resp = self.client.get(self.url, {"status": "all", "q": "rider12@"})
+        self.assertEqual([contact.topic for contact in resp.context["contact"]], ["Question 12"])
+
+    def test_bulk_actions_cost_the_same_for_any_selection(self):
+        ids = list(contactList.objects.filter(complete=False).values_list("id", flat=True))
+        Action.objects.create(contactList_id=ids[0], actionsDetail="old")
+
+        with CaptureQueriesContext(connection) as few:
+            attach_action(ids[:2], "Replied by email.")
+        with CaptureQueriesContext(connection) as many:
+            attach_action(ids, "Called the rider back.")
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Action.objects.filter(actionsDetail="Called the rider back.").count(), len(ids))
+
+        resp = self.client.post(
+            self.url, {"bulk_action": "complete", "contacts": [str(pk) for pk in ids], "return_query": "status=all"}
+        )
+        self.assertRedirects(resp, f"{self.url}?status=all", fetch_redirect_response=False)
+        self.assertFalse(contactList.objects.filter(complete=False).exists())
+
+    def test_header_counts_are_cached_until_the_inbox_changes(self):
+        from . import inbox
+
+        self.assertEqual(inbox.get_counts(), {"total": 60, "open": 45})
+        with self.assertNumQueries(0):
+            inbox.get_counts()
+        contactList.objects.create(topic="New", email="new@example.com", detail="Hi")
+        self.assertEqual(inbox.get_counts(), {"total": 61, "open": 46})
+        inbox.mark_complete(contactList.objects.filter(complete=False).values_list("id", flat=True)[:6])
+        self.assertEqual(inbox.get_counts(), {"total": 61, "open": 40})
+
+    def test_action_page_saves_a_single_note(self):
+        contact = contactList.objects.first()
+        url = reverse("action-page", args=[contact.id])
+        self.client.post(url, {"save": "1", "actiondetail": "First"})
+        self.client.post(url, {"save": "1", "actiondetail": "Second"})
+        self.assertEqual(list(Action.objects.filter(contactList=contact).values_list("actionsDetail", flat=True)), ["Second"])
+
+
+class ProductSearchTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.helmet = Product.objects.create(title="Trail helmet", description="Full face, vented.")
+        self.gloves = Product.objects.create(title="Riding gloves", description="Pairs well with any helmet.")
+        self.goggles = Product.objects.create(title="Dust goggles", description="Anti-fog lenses.")
+
+    def test_title_matches_rank_first_and_prefixes_match(self):
+        self.assertEqual(search_ids("helmet"), [self.helmet.id, self.gloves.id])
+        self.assertEqual(search_ids("helm"), [self.helmet.id, self.gloves.id])
+        self.assertEqual(search_ids("gloves helmet"), [self.gloves.id])
+        self.assertEqual(search_ids('"); DROP TABLE --'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.goggles.title = "Sand goggles"
+        self.goggles.save()
+        self.assertEqual(search_ids("sand"), [self.goggles.id])
+        self.assertEqual(search_ids("dust"), [])
+        self.helmet.delete()
+        self.assertEqual(search_ids("helmet"), [self.gloves.id])
+
+    def test_list_view_pages_ranked_results(self):
+        Product.objects.bulk_create(Product(title=f"Helmet visor {index}") for index in range(12))
+        call_command("rebuild_product_search", stdout=StringIO())
+        with self.assertNumQueries(2):  # ranked ids, then one page of products
+            resp = self.client.get(reverse("product_list"), {"search": "helmet"})
+        self.assertEqual(resp.context["paginator"].count, 14)
+        self.assertEqual(len(resp.context["product_list"]), 9)
+        # The description-only match ranks below every title match.
+        resp = self.client.get(reverse("product_list"), {"search": "helmet", "page": 2})
+        self.assertEqual(list(resp.context["product_list"])[-1], self.gloves)
+
+
+class AutocompleteTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        Program.objects.all().update(active=False)
+        self.sunset = Program.objects.create(code="SUN", name="Sunset Dune Ride")
+        self.dune = Program.objects.create(code="DUN2", name="Dune Explorer")
+        self.jungle = Program.objects.create(code="JGL", name="Jungle Trail")
+        self.helmet = Product.objects.create(title="Dune helmet")
+        self.url = reverse("ajax_autocomplete")
+
+    def _ids(self, query, **params):
+        data = self.client.get(self.url, {"q": query, **params}).json()
+        return [(result["type"], result["id"]) for result in data["results"]]
+
+    def test_codes_then_names_then_inner_words(self):
+        self.assertEqual(
+            self._ids("dun"),
+            [("program", self.dune.id), ("product", self.helmet.id), ("program", self.sunset.id)],
+        )
+        self.assertEqual(self._ids("SU", types="program"), [("program", self.sunset.id)])
+        self.assertEqual(self._ids("dune", types="product"), [("product", self.helmet.id)])
+        self.assertEqual(self._ids("d", limit=1), [("program", self.dune.id)])
+        self.assertEqual(self._ids("junglé tr"), [("program", self.jungle.id)])
+        self.assertEqual(self._ids("zzz"), [])
+
+    def test_index_is_reused_until_programs_or_products_change(self):
+        first = get_autocomplete_index()
+        with self.assertNumQueries(0):
+            self.assertIs(get_autocomplete_index(), first)
+            first.lookup("dune")
+
+        Product.objects.create(title="Trail gloves")
+        second = get_autocomplete_index()
+        self.assertIsNot(second, first)
+        self.assertEqual([entry[1] for entry in second.lookup("trail", ["product"])], [Product.objects.get(title="Trail gloves").id])
+
+        self.jungle.active = False
+        self.jungle.save()
+        self.assertEqual(get_autocomplete_index().lookup("jungle"), [])
+
+
+def _jpeg(width, height):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 180, 90)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_WORKERS=0)
+class ImageDerivativeTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def _product(self, width=800, height=600):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                title="Trail helmet", picture=SimpleUploadedFile("helmet.jpg", _jpeg(width, height))
+            )
+
+    def test_widths_never_upscale_and_always_include_full_webp(self):
+        manifest, files = render_derivatives(_jpeg(500, 250))
+        self.assertEqual(manifest, {"width": 500, "height": 250, "ext": "jpg", "widths": [320]})
+        self.assertEqual(sorted(files), [(320, "jpg"), (320, "webp"), (500, "webp")])
+
+    def test_upload_writes_derivatives_next_to_the_original(self):
+        product = self._product()
+        product.refresh_from_db()
+        name = product.picture.name
+        self.assertEqual(product.picture_variants["name"], name)
+        self.assertEqual(product.picture_variants["widths"], [320, 640])
+        storage = product.picture.storage
+        for width, extension in ((320, "jpg"), (640, "jpg"), (320, "webp"), (640, "webp"), (800, "webp")):
+            self.assertTrue(storage.exists(derivative_name(name, width, extension)))
+
+        found = sources(product.picture)
+        self.assertIn(f"{storage.url(derivative_name(name, 640, 'jpg'))} 640w", found["srcset"])
+        self.assertIn(f"{product.picture.url} 800w", found["srcset"])
+        self.assertIn(f"{storage.url(derivative_name(name, 800, 'webp'))} 800w", found["webp_srcset"])
+
+        resp = self.client.get(reverse("product-detail", args=[product.pk]))
+        self.assertContains(resp, '<source type="image/webp"')
+        self.assertContains(resp, 'sizes="(min-width: 992px) 33vw, 100vw"')
+
+    def test_replaced_file_falls_back_until_rebuilt(self):
+        product = self._product()
+        product.picture = SimpleUploadedFile("gloves.jpg", _jpeg(400, 400))
+        self.assertEqual(sources(product.picture)["srcset"], "")  # manifest names the old file
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.picture_variants["name"], product.picture.name)
+        self.assertEqual(product.picture_variants["widths"], [320])
+
+    def test_backfill_skips_current_rows_unless_forced(self):
+        self._product()
+        out = StringIO()
+        call_command("build_image_derivatives", stdout=out)
+        self.assertIn("Built derivatives for 0 stored image(s) used by 0 row(s).", out.getvalue())
+        call_command("build_image_derivatives", "--force", stdout=out)
+        self.assertIn("Built derivatives for 1 stored image(s) used by 1 row(s).", out.getvalue())
+
+    def test_files_outside_the_blob_tree_get_derivatives_beside_them(self):
+        from django.core.files.storage import FileSystemStorage
+
+        legacy = FileSystemStorage(location=self.media_root)
+        name = legacy.save("product/legacy.jpg", io.BytesIO(_jpeg(700, 350)))
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title="Legacy helmet", picture=name)
+        product.refresh_from_db()
+
+        self.assertEqual(product.picture_variants["widths"], [320, 640])
+        storage = product.picture.storage
+        for width, extension in ((320, "jpg"), (640, "jpg"), (320, "webp"), (640, "webp"), (700, "webp")):
+            self.assertTrue(storage.exists(derivative_name(name, width, extension)))
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "blobs")))
+
+    @override_settings(IMAGE_WORKERS=1)
+    def test_pool_renders_the_same_as_inline(self):
+        data = [_jpeg(700, 350), _jpeg(300, 300)]
+        self.assertEqual([manifest for manifest, _ in render_all(data)], [render_derivatives(item)[0] for item in data])
+
+
+@override_settings(IMAGE_WORKERS=0)
+class ContentAddressedStorageTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def _product(self, data, filename="helmet.jpg"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(title="Trail helmet", picture=SimpleUploadedFile(filename, data))
+
+    def test_identical_uploads_share_one_blob_until_the_last_reference_goes(self):
+        data = _jpeg(400, 300)
+        first = self._product(data)
+        second = self._product(data, "copy-of-helmet.JPG")
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertTrue(first.picture.name.startswith("blobs/"))
+        self.assertEqual(MediaBlob.objects.get(name=first.picture.name).refcount, 2)
+        # The second row reuses the derivatives built for the first.
+        second.refresh_from_db()
+        self.assertEqual(second.picture_variants["name"], first.picture.name)
+
+        storage = first.picture.storage
+        webp = derivative_name(first.picture.name, 320, "webp")
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.picture.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.picture.name))
+        self.assertFalse(storage.exists(webp))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        product = self._product(_jpeg(400, 300))
+        old_name = product.picture.name
+        product.picture = SimpleUploadedFile("new.jpg", _jpeg(200, 100))
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertFalse(product.picture.storage.exists(old_name))
+
+        # Uploading the same bytes again keeps a single reference.
+        product.picture = SimpleUploadedFile("again.jpg", _jpeg(200, 100))
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+    def test_multipart_uploads_are_hashed_while_streaming(self):
+        staff = User.objects.create(username="staffer", is_staff=True)
+        self.client.force_login(staff)
+        data = _jpeg(300, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("addprogram-page"),
+                {
+                    "code": "DUP",
+                    "name": "Duplicate photos",
+                    "duration_minutes": "60",
+                    "rate_rider_adult": "1000",
+                    "images": [SimpleUploadedFile("a.jpg", data), SimpleUploadedFile("b.jpg", data)],
+                },
+            )
+        names = list(ProgramImage.objects.filter(program__code="DUP").values_list("image", flat=True))
+        self.assertEqual(len(names), 2)
+        self.assertEqual(len(set(names)), 1)
+        self.assertEqual(MediaBlob.objects.get(name=names[0]).refcount, 2)
+
+    def test_adopting_existing_files_merges_duplicates(self):
+        from django.core.files.storage import FileSystemStorage, default_storage
+
+        data = _jpeg(300, 200)
+        legacy = FileSystemStorage(location=self.media_root)
+        first = Product.objects.create(title="A", picture=legacy.save("product/a.jpg", io.BytesIO(data)))
+        second = Product.objects.create(title="B", picture=legacy.save("product/b.jpg", io.BytesIO(data)))
+        out = StringIO()
+        call_command("adopt_media_blobs", "--dry-run", stdout=out)
+        self.assertIn("Would move 2 file(s) used by 2 row(s) into 1 blob(s)", out.getvalue())
+        self.assertTrue(default_storage.exists("product/a.jpg"))
+
+        call_command("adopt_media_blobs", stdout=out)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        self.assertFalse(default_storage.exists("product/a.jpg"))
+        self.assertFalse(default_storage.exists("product/b.jpg"))
+
+
+class ContentAddressedStorageConcurrencyTests(CachedTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def test_a_save_during_the_last_delete_keeps_its_file(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage as storage
+
+        from .storage import ContentAddressedStorage
+
+        name = storage.save("notes.txt", ContentFile(b"shared bytes"))
+        removing = threading.Event()
+        remove = ContentAddressedStorage.remove_with_derivatives
+
+        def slow_remove(self, blob_name):
+            removing.set()
+            time.sleep(0.2)
+            remove(self, blob_name)
+
+        def release():
+            try:
+                storage.delete(name)
+            finally:
+                connection.close()
+
+        with mock.patch.object(ContentAddressedStorage, "remove_with_derivatives", slow_remove):
+            deleter = threading.Thread(target=release)
+            deleter.start()
+            self.assertTrue(removing.wait(5))
+            # Waits for the delete to finish, then writes the blob afresh.
+            self.assertEqual(storage.save("copy.txt", ContentFile(b"shared bytes")), name)
+            deleter.join()
+
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+
+class MediaServingTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.data = bytes(range(256)) * 4
+        for name in ("specfile/manual.pdf", "blobs/ab/cd/abcd.pdf"):
+            path = f"{self.media_root}/{name}"
+            os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as handle:
+                handle.write(self.data)
+
+    def test_full_response_has_validators_and_cache_headers(self):
+        resp = self.client.get("/media/specfile/manual.pdf")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b"".join(resp.streaming_content), self.data)
+        self.assertEqual(resp["Content-Type"], "application/pdf")
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertEqual(resp["Cache-Control"], "public, max-age=3600")
+        self.assertEqual(resp["X-Frame-Options"], "SAMEORIGIN")
+        self.assertIn("Last-Modified", resp)
+
+        resp = self.client.get("/media/specfile/manual.pdf", HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get("/media/blobs/ab/cd/abcd.pdf")
+        self.assertEqual(resp["ETag"], '"abcd.pdf"')
+        self.assertEqual(resp["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_byte_ranges(self):
+        url = "/media/specfile/manual.pdf"
+        resp = self.client.get(url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(resp["Content-Length"], "10")
+        self.assertEqual(b"".join(resp.streaming_content), self.data[10:20])
+
+        resp = self.client.get(url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(resp.streaming_content), self.data[-4:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=5000-").status_code, 416)
+        # Several ranges, or a stale If-Range, get the whole file.
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=0-1,4-5").status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"').status_code, 200)
+
+    def test_proxy_offload_headers(self):
+        with override_settings(MEDIA_ACCEL="nginx"):
+            resp = self.client.get("/media/specfile/manual.pdf", HTTP_RANGE="bytes=0-9")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Accel-Redirect"], "/protected-media/specfile/manual.pdf")
+        self.assertEqual(resp.content, b"")
+        self.assertIn("ETag", resp)
+
+        with override_settings(MEDIA_ACCEL="sendfile"):
+            resp = self.client.get("/media/blobs/ab/cd/abcd.pdf")
+        self.assertEqual(resp["X-Sendfile"], f"{self.media_root}/blobs/ab/cd/abcd.pdf")
+        self.assertIn("immutable", resp["Cache-Control"])
+
+    def test_paths_outside_media_root_are_not_served(self):
+        resp = self.client.get("/media/../mywebsite/settings.py")
+        self.assertNotIn("ETag", resp)
+        resp = self.client.post("/media/specfile/manual.pdf")
+        self.assertEqual(resp.status_code, 405)
+
+
+class PublicPageFragmentTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.guide = Staff.objects.create(name="Guide Frag", years_experience=4)
+        _priced_program("FRAG")
+
+    def test_cached_fragments_skip_queries_until_their_models_change(self):
+        for url in (reverse("home"), reverse("about-page")):
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                self.client.get(url)
+
+        self.guide.name = "Guide Renamed"
+        self.guide.years_experience = 8
+        self.guide.save()
+        resp = self.client.get(reverse("about-page"))
+        self.assertContains(resp, "Guide Renamed")
+        self.assertContains(resp, "8.0 yrs")
+        self.assertContains(self.client.get(reverse("home")), "Guide Renamed")
+
+        Program.objects.filter(code="FRAG").update(name="Renamed ride")  # no signal: still cached
+        self.assertNotContains(self.client.get(reverse("home")), "Renamed ride")
+        Program.objects.get(code="FRAG").save()
+        self.assertContains(self.client.get(reverse("home")), "Renamed ride")
+
+    def test_signed_in_visitors_get_their_own_feedback_forms(self):
+        self.client.get(reverse("home"))
+        self.client.force_login(User.objects.create(username="rider"))
+        resp = self.client.get(reverse("home"))
+        self.assertContains(resp, "Share your feedback")
+        self.assertContains(resp, "csrfmiddlewaretoken")
+
+
+class AnonymousPageCacheTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.guide = Staff.objects.create(name="Guide Page", years_experience=3)
+        _priced_program("PAGE")
+
+    def test_repeat_anonymous_visits_are_served_without_queries(self):
+        first = self.client.get(reverse("home"))
+        self.assertNotIn("X-Page-Cache", first.headers)
+
+        visitor = Client()
+        with self.assertNumQueries(0):
+            resp = visitor.get(reverse("home"))
+        self.assertEqual(resp.headers["X-Page-Cache"], "hit")
+        self.assertContains(resp, "Guide Page")
+        self.assertIn("csrftoken", resp.cookies)
+        self.assertNotEqual(resp.cookies["csrftoken"].value, first.cookies["csrftoken"].value)
+
+    def test_version_bumps_and_signed_in_users_reach_the_view(self):
+        self.client.get(reverse("about-page"))
+        self.guide.name = "Guide Moved"
+        self.guide.save()
+        resp = self.client.get(reverse("about-page"))
+        self.assertNotIn("X-Page-Cache", resp.headers)
+        self.assertContains(resp, "Guide Moved")
+
+        self.client.force_login(User.objects.create(username="rider"))
+        resp = self.client.get(reverse("home"))
+        self.assertNotIn("X-Page-Cache", resp.headers)
+        self.assertContains(resp, "csrfmiddlewaretoken")
+
+    def test_rendered_csrf_tokens_are_stored_as_placeholders(self):
+        from django.middleware.csrf import _get_new_csrf_string, _mask_cipher_secret
+
+        secret, other = _get_new_csrf_string(), _get_new_csrf_string()
+        mine, theirs = _mask_cipher_secret(secret), _mask_cipher_secret(other)
+        content = f'<input value="{mine}"><meta content="{theirs}">'.encode()
+        masked = mask_csrf_tokens(content, secret)
+        self.assertEqual(masked, b'<input value="' + CSRF_PLACEHOLDER + f'"><meta content="{theirs}">'.encode())
+
+
+class ConditionalGetTests(CachedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program = _priced_program("COND")
+        self.url = reverse("program-detail", args=["COND"])
+
+    def test_unchanged_program_pages_return_not_modified(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("no-cache", resp["Cache-Control"])
+        etag, last_modified = resp["ETag"], resp["Last-Modified"]
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        resp = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)
+
+        rate = self.program.rates.first()
+        rate.price = Decimal("1200.00")
+        rate.save()
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+        self.assertContains(resp, "1200 THB")
+
+    def test_catalog_pages_follow_programs_and_their_other_data(self):
+        self.assertNotIn("ETag", self.client.get(reverse("booking-page")))  # no CSRF cookie yet
+        resp = self.client.get(reverse("booking-page"))
+        etag = resp["ETag"]
+        self.assertNotIn("Last-Modified", resp)
+        self.assertEqual(self.client.get(reverse("booking-page"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Addon.objects.create(code="COND", name="Photo pack", price=Decimal("300.00"))
+        self.assertEqual(self.client.get(reverse("booking-page"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse("home"))["ETag"]
+        with self.assertNumQueries(0):  # answered from the page cache
+            resp = self.client.get(reverse("home"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        Program.objects.create(code="COND2", name="Second ride")
+        self.assertEqual(self.client.get(reverse("home"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_booking_form_is_not_revalidated_across_csrf_rotation(self):
+        self.client.get(reverse("booking-page"))
+        etag = self.client.get(reverse("booking-page"))["ETag"]
+        User.objects.create_user("rider", password="pw")
+        self.client.post(reverse("login"), {"username": "rider", "password": "pw"})
+        self.client.logout()
+        self.client.get(reverse("booking-page"))  # shows the pending login message
+        resp = self.client.get(reverse("booking-page"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_signed_in_pages_carry_no_validators(self):
+        self.client.force_login(User.objects.create(username="rider"))
+        resp = self.client.get(self.url)
+        self.assertNotIn("ETag", resp)
+        self.assertNotIn("Last-Modified", resp)
@@ -10,9 +10,12 @@ urlpatterns = [
     path('contact/', views.contact, name='contact-page'),
     path('booking/', views.booking, name='booking-page'),
     path('booking/walk-in/', views.admin_booking_create, name='admin-booking-create'),
+    path('booking/availability/', views.booking_availability, name='booking-availability'),
+    path('booking/quote/', views.booking_quote, name='booking-quote'),
     path('booking/success/<int:booking_id>/', views.booking_success, name='booking-success'),
     path('showcontact/', showContact, name='showcontact-page'),
     path('bookings/manage/', views.showBookings, name='booking-list-page'),
+    path('bookings/manage/export/', views.export_bookings, name='booking-export'),
     path('staff/insights/', views.staff_insights, name='staff-insights'),
     path('register/', userRegist, name="register-page"),
     path('profile/', userProfile, name="profile-page"),
@@ -26,9 +29,13 @@ urlpatterns = [
     path('staff/<int:staff_id>/feedback/', views.staff_feedback, name='staff-feedback'),
     path('fleet/bikes/', views.bike_usage_dashboard, name='bike-usage-page'),
     path('fleet/history/', views.bike_usage_history, name='bike-usage-history'),
+    path('fleet/utilization/', views.fleet_utilization, name='fleet-utilization'),
 
+    path("ajax/autocomplete/", views.autocomplete_suggestions, name="ajax_autocomplete"),
+    path("ajax/user/list/", views.UserListAjax.as_view(), name="ajax_user_list"),
     path("ajax/user/detail/", views.UserDetailAjax.as_view(), name="ajax_user_detail"),
     path("ajax/user/create/", views.CreateUserAjax.as_view(), name="ajax_user_create"),
     path("ajax/user/update/", views.UpdateUserAjax.as_view(), name="ajax_user_update"),
     path("ajax/user/delete/", views.DeleteUserAjax.as_view(), name="ajax_user_delete"),
+    path("ajax/user/batch/", views.BatchUserAjax.as_view(), name="ajax_user_batch"),
 ]
@@ -0,0 +1,159 @@
+"""Fleet utilization analytics over a bike × day occupancy matrix.
+
+Each bike's usage over the range is one Python integer used as a bitset (bit
+``i`` set when the bike was assigned on ``start + i`` days), so utilization,
+idle streaks and per-month heatmap cells are a few big-integer operations per
+bike instead of loops over ``BikeAssignment`` objects. The loader reads only
+``(bike_id, date)`` tuples.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .models import Bike, BikeAssignment
+
+HEAT_LEVELS = 5
+
+
+class OccupancyMatrix:
+    __slots__ = ("start", "days", "rows", "daily")
+
+    def __init__(self, start: date, days: int, rows: Dict[int, int], daily: List[int]) -> None:
+        self.start = start
+        self.days = days
+        self.rows = rows
+        self.daily = daily
+
+    @property
+    def full_mask(self) -> int:
+        return (1 << self.days) - 1
+
+    def range_mask(self, first: date, last: date) -> int:
+        """Bits for the days ``first``..``last``, clipped to the matrix."""
+        low = max((first - self.start).days, 0)
+        high = min((last - self.start).days, self.days - 1)
+        if high < low:
+            return 0
+        return ((1 << (high - low + 1)) - 1) << low
+
+
+def load_matrix(start: date, end: date, bike_ids: Iterable[int]) -> OccupancyMatrix:
+    days = (end - start).days + 1
+    rows = dict.fromkeys(bike_ids, 0)
+    daily = [0] * days
+    assignments = (
+        BikeAssignment.objects.filter(date__range=(start, end))
+        .order_by()
+        .values_list("bike_id", "date")
+        .iterator(chunk_size=5000)
+    )
+    for bike_id, day in assignments:
+        offset = (day - start).days
+        rows[bike_id] = rows.get(bike_id, 0) | (1 << offset)
+        daily[offset] += 1
+    return OccupancyMatrix(start, days, rows, daily)
+
+
+def longest_run(bits: int) -> int:
+    """Length of the longest run of set bits, in O(log n) big-integer steps."""
+    if not bits:
+        return 0
+    # starts[k] marks positions where a run of at least k set bits begins;
+    # starts[a + b] == starts[a] & (starts[b] >> a).
+    starts = {1: bits}
+    length, current = 1, bits
+    while True:
+        doubled = current & (current >> length)
+        if not doubled:
+            break
+        length *= 2
+        current = doubled
+        starts[length] = current
+    step = length // 2
+    while step:
+        extended = current & (starts[step] >> length)
+        if extended:
+            current = extended
+            length += step
+        step //= 2
+    return length
+
+
+def _level(ratio: float) -> int:
+    if ratio <= 0:
+        return 0
+    return min(HEAT_LEVELS - 1, 1 + int(ratio * (HEAT_LEVELS - 1)))
+
+
+def _months(start: date, end: date) -> List[Tuple[date, date]]:
+    months = []
+    first = start.replace(day=1)
+    while first <= end:
+        following = (first + timedelta(days=32)).replace(day=1)
+        months.append((max(first, start), min(following - timedelta(days=1), end)))
+        first = following
+    return months
+
+
+def fleet_utilization(start: date, end: date, bikes: Optional[List[Bike]] = None) -> Dict[str, Any]:
+    """Per-bike utilization, idle streaks, daily fleet usage and heatmaps."""
+    if bikes is None:
+        bikes = list(Bike.objects.order_by("number"))
+    matrix = load_matrix(start, end, [bike.id for bike in bikes])
+    full = matrix.full_mask
+    months = _months(start, end)
+    month_masks = [(first, matrix.range_mask(first, last), (last - first).days + 1) for first, last in months]
+
+    bike_rows = []
+    for bike in bikes:
+        used = matrix.rows.get(bike.id, 0)
+        used_days = used.bit_count()
+        bike_rows.append(
+            {
+                "bike": bike,
+                "used_days": used_days,
+                "utilization": round(100 * used_days / matrix.days, 1),
+                "longest_idle": longest_run(full & ~used),
+                "current_idle": matrix.days - used.bit_length(),
+                "months": [
+                    {
+                        "month": first,
+                        "days": (used & mask).bit_count(),
+                        "level": _level((used & mask).bit_count() / length),
+                    }
+                    for first, mask, length in month_masks
+                ],
+            }
+        )
+
+    fleet_size = len(bikes) or 1
+    daily = [
+        {
+            "date": start + timedelta(days=offset),
+            "bikes": count,
+            "percent": round(100 * count / fleet_size, 1),
+            "level": _level(count / fleet_size),
+        }
+        for offset, count in enumerate(matrix.daily)
+    ]
+    # Calendar heatmap: Monday-first weeks, padded with None outside the range.
+    padded: List[Optional[Dict[str, Any]]] = [None] * start.weekday() + daily
+    padded += [None] * (-len(padded) % 7)
+    weeks = [padded[index:index + 7] for index in range(0, len(padded), 7)]
+
+    total_assignments = sum(matrix.daily)
+    busiest = max(daily, key=lambda day: day["bikes"]) if daily else None
+    return {
+        "start": start,
+        "end": end,
+        "days": matrix.days,
+        "bike_rows": bike_rows,
+        "months": [first for first, _ in months],
+        "daily": daily,
+        "weeks": weeks,
+        "fleet_utilization": round(100 * total_assignments / (fleet_size * matrix.days), 1),
+        "average_daily_bikes": round(total_assignments / matrix.days, 1),
+        "busiest_day": busiest,
+    }
@@ -0,0 +1,56 @@
+"""Shared version stamps for invalidating per-process caches.
+
+Each stamp lives in the default cache so every worker sees a bump. Stamps are
+random tokens rather than counters, so a cleared or culled cache can never
+bring back a version that a worker has already memoised.
+"""
+
+from __future__ import annotations
+
+import uuid
+from typing import Dict
+
+from django.core.cache import cache
+from django.db import transaction
+
+_KEY_PREFIX = "myapp:version:"
+
+PRICING = "pricing"
+FLEET = "fleet"
+CATALOG = "catalog"
+PRODUCTS = "products"
+STAFF = "staff"
+INBOX = "inbox"
+
+
+def _key(name: str) -> str:
+    return f"{_KEY_PREFIX}{name}"
+
+
+def get_versions(*names: str) -> Dict[str, str]:
+    keys = {_key(name): name for name in names}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    for key in missing:
+        cache.add(key, uuid.uuid4().hex, None)
+    if missing:
+        found.update(cache.get_many(missing))
+    return {keys[key]: value for key, value in found.items()}
+
+
+def get_version(name: str) -> str:
+    return get_versions(name)[name]
+
+
+def bump_version(*names: str) -> None:
+    """Give ``names`` fresh stamps now and again once the transaction commits.
+
+    The second bump stops another worker from memoising data it read before
+    the commit under the first new stamp.
+    """
+
+    def _bump() -> None:
+        cache.set_many({_key(name): uuid.uuid4().hex for name in names}, None)
+
+    _bump()
+    transaction.on_commit(_bump)
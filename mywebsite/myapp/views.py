@@ -2,8 +2,9 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Any, Dict, Iterable, List, Tuple
 
@@ -11,23 +12,40 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.files.storage import FileSystemStorage
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, Avg, Max
+from django.db.models import Q, Sum, Count, Avg, Exists, OuterRef
+from django.db.models.functions import Coalesce
 from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.http import HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.templatetags.static import static
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views.generic import ListView, View
 from django.urls import reverse
+from django.views.decorators.clickjacking import xframe_options_sameorigin
 from django.views.decorators.csrf import ensure_csrf_cookie
-
+from django.views.decorators.http import require_safe
+
+from . import autocomplete, exports, inbox, media, search, stats, utilization, versions
+from .accounts import BatchError, apply_user_batch
+from .bookings import create_booking
+from .capacity import month_availability
+from .catalog import get_catalog
+from .conditional import booking_etag, conditional_page, home_etag, program_etag, program_last_modified
+from .feedback import submit_feedback
+from .fleet import save_assignments
+from .pagecache import anonymous_page_cache
+from .pagination import paginate_keyset
+from .planner import plan_day
+from .pricing import QuoteError, build_quote, get_pricing
 from .models import (
     Action,
     Addon,
     Booking,
-    BookingAddon,
     BookingItem,
     Bike,
     BikeAssignment,
@@ -41,6 +59,35 @@ from .models import (
     contactList,
 )
 
+BOOKING_PAGE_SIZE = 10
+ASSIGNMENT_PAGE_SIZE = 50
+UTILIZATION_DEFAULT_DAYS = 90
+CONTACT_PAGE_SIZE = 25
+CONTACT_STATUSES = {"open": "Open", "done": "Done", "all": "All"}
+USER_PAGE_SIZE = 25
+USER_PAGE_MAX = 100
+USER_LIST_FIELDS = (
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "date_joined",
+    "profile__usertype",
+    "profile__point",
+)
+# sort key -> (label, keyset ordering); every ordering ends on the primary key.
+USER_SORTS = {
+    "username": ("Username A-Z", ("username", "id")),
+    "-username": ("Username Z-A", ("-username", "-id")),
+    "email": ("Email A-Z", ("email", "id")),
+    "-date_joined": ("Newest first", ("-date_joined", "-id")),
+    "date_joined": ("Oldest first", ("date_joined", "id")),
+}
+UTILIZATION_MAX_DAYS = 366 * 5
+
 
 # ---------------------------------------------------------------------------
 # Utility helpers
@@ -52,6 +99,13 @@ def _extract_data(request: HttpRequest) -> Dict[str, Any]:
     return request.GET
 
 
+def _filter_query(request: HttpRequest) -> str:
+    preserved_params = request.GET.copy()
+    for key in ("cursor", "page"):
+        preserved_params.pop(key, None)
+    return preserved_params.urlencode()
+
+
 def _parse_int(value: Any, default: int = 0) -> int:
     if value in (None, ""):
         return default
@@ -96,16 +150,13 @@ def _serialize_user(user: User) -> Dict[str, Any]:
 # Basic pages
 # ---------------------------------------------------------------------------
 
-@ensure_csrf_cookie
-def home(request: HttpRequest) -> HttpResponse:
-    programs = Program.objects.filter(active=True).prefetch_related("rates", "images")
+def _program_cards() -> List[Dict[str, Any]]:
+    pricing = get_pricing()
     program_cards: List[Dict[str, Any]] = []
 
-    for program in programs:
-        rate_map = {
-            (rate.participant_type, rate.age_group): rate.price
-            for rate in program.rates.all()
-        }
+    for entry in get_catalog().programs:
+        program = entry.program
+        rate_map = pricing.rates_for(program.id)
         starting_price = None
         if rate_map:
             starting_price = min(rate_map.values())
@@ -118,30 +169,43 @@ def home(request: HttpRequest) -> HttpResponse:
                 "rider_child": rate_map.get((ProgramRate.Participant.RIDER, ProgramRate.AgeGroup.CHILD)),
                 "passenger_adult": rate_map.get((ProgramRate.Participant.PASSENGER, ProgramRate.AgeGroup.ADULT)),
                 "passenger_child": rate_map.get((ProgramRate.Participant.PASSENGER, ProgramRate.AgeGroup.CHILD)),
-                "primary_image": program.primary_image(),
+                "primary_image": entry.primary_image,
             }
         )
+    return program_cards
 
-    staff_members = Staff.objects.filter(active=True)
 
+def _fragment_versions() -> Dict[str, str]:
+    """Version stamps that key the ``{% cache %}`` fragments of public pages.
+
+    Context values below are lazy, so a fragment served from the cache
+    never runs the queries behind it.
+    """
+    return versions.get_versions(versions.CATALOG, versions.PRICING, versions.STAFF)
+
+
+@anonymous_page_cache(versions.CATALOG, versions.PRICING, versions.STAFF)
+@conditional_page(etag_func=home_etag)
+@ensure_csrf_cookie
+def home(request: HttpRequest) -> HttpResponse:
     context = {
-        "program_cards": program_cards,
-        "program_count": len(program_cards),
-        "staff_members": staff_members,
+        "program_cards": SimpleLazyObject(_program_cards),
+        "staff_members": Staff.objects.filter(active=True),
+        "fragment_versions": _fragment_versions(),
     }
     return render(request, "myapp/home.html", context)
 
 
+@anonymous_page_cache(versions.STAFF)
 @ensure_csrf_cookie
 def aboutUs(request: HttpRequest) -> HttpResponse:
     staff_members = Staff.objects.filter(active=True)
-    staff_count = staff_members.count()
-    avg_experience = staff_members.aggregate(avg=Avg("years_experience"))["avg"] or 0
-
     context = {
         "staff_members": staff_members,
-        "staff_count": staff_count,
-        "avg_experience": avg_experience,
+        "staff_stats": SimpleLazyObject(
+            lambda: staff_members.aggregate(count=Count("id"), avg_experience=Avg("years_experience"))
+        ),
+        "fragment_versions": _fragment_versions(),
     }
     return render(request, "myapp/aboutus.html", context)
 
@@ -192,11 +256,7 @@ def staff_feedback(request: HttpRequest, staff_id: int) -> HttpResponse:
         messages.info(request, "No changes were submitted.")
         return redirect(next_url)
 
-    StaffFeedback.objects.update_or_create(
-        staff=staff,
-        user=request.user,
-        defaults=updates,
-    )
+    submit_feedback(staff, request.user, updates)
 
     sentiment_value = updates.get("sentiment")
     if sentiment_value == StaffFeedback.Sentiment.DISLIKE:
@@ -211,14 +271,14 @@ def staff_feedback(request: HttpRequest, staff_id: int) -> HttpResponse:
     return redirect(next_url)
 
 
+@conditional_page(etag_func=program_etag, last_modified_func=program_last_modified)
 def program_detail(request: HttpRequest, code: str) -> HttpResponse:
-    program = get_object_or_404(
-        Program.objects.prefetch_related("rates", "images"), code=code, active=True
-    )
+    entry = get_catalog().by_code.get(code)
+    if entry is None:
+        raise Http404("No Program matches the given query.")
+    program = entry.program
 
-    rate_map: Dict[Tuple[str, str], ProgramRate] = {
-        (rate.participant_type, rate.age_group): rate for rate in program.rates.all()
-    }
+    rate_map = get_pricing().rates_for(program.id)
 
     def _split_lines(value: str) -> List[str]:
         return [line.strip() for line in value.splitlines() if line.strip()]
@@ -230,32 +290,24 @@ def program_detail(request: HttpRequest, code: str) -> HttpResponse:
             "entries": [],
         }
         for age in ProgramRate.AgeGroup.values:
-            rate = rate_map.get((participant, age))
             row["entries"].append(
                 {
                     "label": ProgramRate.AgeGroup(age).label,
-                    "price": rate.price if rate else None,
+                    "price": rate_map.get((participant, age)),
                 }
             )
         pricing_table.append(row)
 
-    primary = program.primary_image()
-    gallery_qs = program.images.all()
-    if primary is not None:
-        gallery_qs = gallery_qs.exclude(pk=primary.pk)
-    gallery_list = list(gallery_qs)
+    primary = entry.primary_image
+    gallery_list = list(entry.gallery)
 
-    program_gallery: List[Dict[str, str]] = []
-    if primary is not None:
-        program_gallery.append(
-            {
-                "url": primary.image.url,
-                "alt": primary.alt_text or program.name,
-            }
-        )
-    for image in gallery_list:
+    # ``source`` feeds ``{% responsive_image %}``; ``url`` is the full-size
+    # photo the lightbox opens.
+    program_gallery: List[Dict[str, Any]] = []
+    for image in entry.images:
         program_gallery.append(
             {
+                "source": image.image,
                 "url": image.image.url,
                 "alt": image.alt_text or program.name,
             }
@@ -263,15 +315,15 @@ def program_detail(request: HttpRequest, code: str) -> HttpResponse:
 
     if not program_gallery:
         fallback_images = [
-            static("image/S__19079223_0.jpg"),
-            static("image/S__19079224_0.jpg"),
-            static("image/S__19079226_0.jpg"),
-            static("image/S__19079227_0.jpg"),
-            static("image/S__19079235_0.jpg"),
-            static("image/S__19079236_0.jpg"),
+            "image/S__19079223_0.jpg",
+            "image/S__19079224_0.jpg",
+            "image/S__19079226_0.jpg",
+            "image/S__19079227_0.jpg",
+            "image/S__19079235_0.jpg",
+            "image/S__19079236_0.jpg",
         ]
         program_gallery.extend(
-            {"url": path, "alt": f"{program.name} trail photo"}
+            {"source": path, "url": static(path), "alt": f"{program.name} trail photo"}
             for path in fallback_images
         )
 
@@ -293,15 +345,15 @@ def program_detail(request: HttpRequest, code: str) -> HttpResponse:
 
 
 def _build_program_entries() -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
-    programs_qs = Program.objects.filter(active=True).prefetch_related("rates", "images")
+    pricing = get_pricing()
     program_entries: List[Dict[str, Any]] = []
     program_lookup: Dict[int, Dict[str, Any]] = {}
 
-    for program in programs_qs:
-        rates_map = {
-            (rate.participant_type, rate.age_group): rate.price
-            for rate in program.rates.all()
-        }
+    # Entries are rebuilt per request because the booking views fill in
+    # quantities; only the programs and images come from the shared catalog.
+    for catalog_entry in get_catalog().programs:
+        program = catalog_entry.program
+        rates_map = pricing.rates_for(program.id)
         rows: List[Dict[str, Any]] = []
         for participant in ProgramRate.Participant.values:
             participant_label = ProgramRate.Participant(participant).label
@@ -327,7 +379,7 @@ def _build_program_entries() -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str,
             "rider_rows": rider_rows,
             "passenger_rows": passenger_rows,
             "is_active": True,
-            "primary_image": program.primary_image(),
+            "primary_image": catalog_entry.primary_image,
         }
         program_entries.append(entry)
         program_lookup[program.id] = entry
@@ -395,7 +447,8 @@ def _process_booking_submission(
         except ValueError:
             errors.append("Ride date must be in YYYY-MM-DD format.")
 
-    if ride_time and ride_time not in dict(Booking.RideSlot.choices):
+    # Every rider takes a seat in a slot, so "any time" is not offered.
+    if ride_time not in dict(Booking.RideSlot.choices):
         errors.append("Please select a valid ride time slot.")
 
     items_payload: List[Dict[str, Any]] = []
@@ -481,46 +534,34 @@ def _process_booking_submission(
             addon_payload.append({"addon": addon, "quantity": quantity})
 
     if not errors and ride_date is not None:
-        booking = Booking.objects.create(
-            full_name=full_name,
-            email=email,
-            phone=phone,
-            ride_date=ride_date,
-            ride_time=ride_time,
-            pickup_place=pickup_place,
-            notes=notes,
-        )
-        for item in items_payload:
-            BookingItem.objects.create(
-                booking=booking,
-                program=item["program"],
-                participant_type=item["participant"],
-                age_group=item["age_group"],
-                quantity=item["quantity"],
-                unit_price=Decimal("0"),
-                line_total=Decimal("0"),
+        try:
+            booking = create_booking(
+                items=items_payload,
+                addons=addon_payload,
+                full_name=full_name,
+                email=email,
+                phone=phone,
+                ride_date=ride_date,
+                ride_time=ride_time,
+                pickup_place=pickup_place,
+                notes=notes,
             )
-        for addon in addon_payload:
-            BookingAddon.objects.create(
-                booking=booking,
-                addon=addon["addon"],
-                quantity=addon["quantity"],
-                unit_price=Decimal("0"),
-                line_total=Decimal("0"),
+        except ValidationError as exc:
+            errors.extend(exc.messages)
+        else:
+            return (
+                booking,
+                form_values,
+                errors,
+                quantity_values,
+                active_program_ids,
+                addon_quantities,
             )
-        booking.refresh_from_db()
-        return (
-            booking,
-            form_values,
-            errors,
-            quantity_values,
-            active_program_ids,
-            addon_quantities,
-        )
 
     return None, form_values, errors, quantity_values, active_program_ids, addon_quantities
 
 
+@conditional_page(etag_func=booking_etag)
 def booking(request: HttpRequest) -> HttpResponse:
     program_entries, program_lookup = _build_program_entries()
     addon_entries = _build_addon_entries()
@@ -656,6 +697,64 @@ def admin_booking_create(request: HttpRequest) -> HttpResponse:
     return render(request, "myapp/booking.html", context)
 
 
+def autocomplete_suggestions(request: HttpRequest) -> JsonResponse:
+    query = request.GET.get("q", "").strip()
+    kinds = [kind for kind in request.GET.get("types", "").split(",") if kind in autocomplete.KINDS]
+    try:
+        limit = _parse_int(request.GET.get("limit"), default=autocomplete.DEFAULT_LIMIT)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+
+    entries = autocomplete.get_index().lookup(query, kinds or autocomplete.KINDS, limit) if query else []
+    return JsonResponse({"query": query, "results": [autocomplete.serialize(entry) for entry in entries]})
+
+
+def booking_availability(request: HttpRequest) -> HttpResponse:
+    month_value = request.GET.get("month", "").strip()
+    if month_value:
+        try:
+            month_start = datetime.strptime(month_value, "%Y-%m").date()
+        except ValueError:
+            return JsonResponse({"error": "Month must be in YYYY-MM format."}, status=400)
+    else:
+        month_start = timezone.localdate().replace(day=1)
+
+    payload = {
+        "month": month_start.strftime("%Y-%m"),
+        "slots": [{"value": value, "label": label} for value, label in Booking.RideSlot.choices],
+        "days": month_availability(month_start.year, month_start.month),
+    }
+    body = json.dumps(payload, separators=(",", ":"))
+    etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def booking_quote(request: HttpRequest) -> JsonResponse:
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    active_program_ids: List[int] | None = None
+    raw_program_ids = request.GET.getlist("active_program")
+    if raw_program_ids:
+        try:
+            active_program_ids = [int(raw_id) for raw_id in raw_program_ids]
+        except ValueError:
+            return JsonResponse({"error": "Invalid program id"}, status=400)
+
+    try:
+        quote = build_quote(request.GET, active_program_ids)
+    except QuoteError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(quote)
+
+
 @login_required(login_url="/login")
 def staff_insights(request: HttpRequest) -> HttpResponse:
     profile = _get_profile(request.user)
@@ -666,27 +765,11 @@ def staff_insights(request: HttpRequest) -> HttpResponse:
     ):
         return HttpResponse("Forbidden", status=403)
 
-    comment_filter = ~Q(feedback__comment__isnull=True) & ~Q(feedback__comment__exact="")
-
-    staff_stats = (
-        Staff.objects.all()
-        .annotate(
-            likes_count=Count(
-                "feedback", filter=Q(feedback__sentiment=StaffFeedback.Sentiment.LIKE)
-            ),
-            dislikes_count=Count(
-                "feedback", filter=Q(feedback__sentiment=StaffFeedback.Sentiment.DISLIKE)
-            ),
-            comment_count=Count("feedback", filter=comment_filter),
-            latest_feedback=Max("feedback__created_at"),
-        )
-        .order_by("display_order", "name")
-    )
-
-    totals = StaffFeedback.objects.aggregate(
-        total_likes=Count("id", filter=Q(sentiment=StaffFeedback.Sentiment.LIKE)),
-        total_dislikes=Count("id", filter=Q(sentiment=StaffFeedback.Sentiment.DISLIKE)),
-        total_comments=Count("id", filter=~Q(comment__isnull=True) & ~Q(comment__exact="")),
+    staff_stats = Staff.objects.order_by("display_order", "name")
+    totals = Staff.objects.aggregate(
+        total_likes=Coalesce(Sum("likes_count"), 0),
+        total_dislikes=Coalesce(Sum("dislikes_count"), 0),
+        total_comments=Coalesce(Sum("comment_count"), 0),
     )
 
     feedback_qs = (
@@ -727,24 +810,11 @@ def bike_usage_dashboard(request: HttpRequest) -> HttpResponse:
 
     if request.method == "POST" and request.POST.get("form") == "assign":
         manage_date = parse_date(request.POST.get("assign_date"))
-        selected_ids = {int(bike_id) for bike_id in request.POST.getlist("bikes")}
-
-        BikeAssignment.objects.filter(date=manage_date).exclude(bike_id__in=selected_ids).delete()
-
-        existing_ids = set(
-            BikeAssignment.objects.filter(date=manage_date).values_list("bike_id", flat=True)
-        )
-        for bike_id in selected_ids:
-            if bike_id in existing_ids:
-                BikeAssignment.objects.filter(date=manage_date, bike_id=bike_id).update(
-                    assigned_by=request.user
-                )
-            else:
-                BikeAssignment.objects.create(
-                    bike_id=bike_id,
-                    date=manage_date,
-                    assigned_by=request.user,
-                )
+        known_ids = {bike.id for bike in bikes}
+        selected_ids = {
+            int(bike_id) for bike_id in request.POST.getlist("bikes") if bike_id.isdigit()
+        } & known_ids
+        save_assignments(manage_date, selected_ids, request.user)
 
         messages.success(
             request,
@@ -759,17 +829,45 @@ def bike_usage_dashboard(request: HttpRequest) -> HttpResponse:
         .order_by("bike__number")
     )
     selected_ids = {assignment.bike_id for assignment in assignments_for_date}
+    plan = plan_day(manage_date, bikes)
+    # An unsaved day starts from the proposal so staff only adjust it.
+    proposed = not selected_ids and bool(plan.bikes)
+    if proposed:
+        selected_ids = set(plan.bike_ids)
 
     context = {
         "bikes": bikes,
         "manage_date": manage_date,
         "selected_ids": selected_ids,
         "assignments_for_date": assignments_for_date,
+        "plan": plan,
+        "proposed": proposed,
     }
 
     return render(request, "myapp/bike_usage.html", context)
 
 
+@login_required
+def fleet_utilization(request: HttpRequest) -> HttpResponse:
+    if not (request.user.is_staff or request.user.is_superuser):
+        return HttpResponseForbidden("Staff access only")
+
+    def parse_date(value: str | None, default):
+        try:
+            return datetime.strptime(value or "", "%Y-%m-%d").date()
+        except ValueError:
+            return default
+
+    end = parse_date(request.GET.get("end"), timezone.localdate())
+    start = parse_date(request.GET.get("start"), end - timedelta(days=UTILIZATION_DEFAULT_DAYS - 1))
+    if start > end:
+        start, end = end, start
+    start = max(start, end - timedelta(days=UTILIZATION_MAX_DAYS - 1))
+
+    context = utilization.fleet_utilization(start, end)
+    return render(request, "myapp/fleet_utilization.html", context)
+
+
 @login_required
 def bike_usage_history(request: HttpRequest) -> HttpResponse:
     if not (request.user.is_staff or request.user.is_superuser):
@@ -779,10 +877,7 @@ def bike_usage_history(request: HttpRequest) -> HttpResponse:
     filter_date_value = request.GET.get("filter_date")
     filter_bike_value = request.GET.get("filter_bike")
 
-    assignment_log = (
-        BikeAssignment.objects.select_related("bike", "assigned_by")
-        .order_by("-date", "bike__number")
-    )
+    assignment_log = BikeAssignment.objects.select_related("bike", "assigned_by")
     if filter_date_value:
         try:
             date_filter = datetime.strptime(filter_date_value, "%Y-%m-%d").date()
@@ -795,13 +890,17 @@ def bike_usage_history(request: HttpRequest) -> HttpResponse:
         except ValueError:
             filter_bike_value = None
 
-    assignment_log = assignment_log[:200]
+    page = paginate_keyset(
+        assignment_log, ("-date", "bike_id", "id"), request.GET.get("cursor"), ASSIGNMENT_PAGE_SIZE
+    )
 
     context = {
         "bikes": bikes,
         "filter_date_value": filter_date_value,
         "filter_bike_value": filter_bike_value or "",
-        "assignment_log": assignment_log,
+        "assignment_log": page.object_list,
+        "page": page,
+        "filter_query": _filter_query(request),
     }
 
     return render(request, "myapp/bike_usage_history.html", context)
@@ -828,76 +927,142 @@ def showContact(request: HttpRequest) -> HttpResponse:
     if not (request.user.is_staff or request.user.is_superuser):
         return HttpResponse("Forbidden", status=403)
 
-    contacts = contactList.objects.all()
-    return render(request, "myapp/showcontact.html", {"contact": contacts})
-
+    if request.method == "POST":
+        contact_ids = [int(pk) for pk in request.POST.getlist("contacts") if pk.isdigit()]
+        bulk_action = request.POST.get("bulk_action")
+        if not contact_ids:
+            messages.error(request, "Select at least one message first.")
+        elif bulk_action == "complete":
+            updated = inbox.mark_complete(contact_ids)
+            messages.success(request, f"Marked {updated} message(s) complete.")
+        elif bulk_action == "note":
+            detail = (request.POST.get("note") or request.POST.get("canned_note") or "").strip()
+            if detail:
+                updated = inbox.attach_action(contact_ids, detail)
+                messages.success(request, f"Saved the action note on {updated} message(s).")
+            else:
+                messages.error(request, "Choose a canned note or write one.")
+        query = request.POST.get("return_query", "")
+        return redirect(f"{reverse('showcontact-page')}?{query}" if query else reverse("showcontact-page"))
 
-@login_required(login_url="/login")
-def showBookings(request: HttpRequest) -> HttpResponse:
-    if not (request.user.is_staff or request.user.is_superuser):
-        return HttpResponse("Forbidden", status=403)
+    status = request.GET.get("status", "open")
+    if status not in CONTACT_STATUSES:
+        status = "open"
+    search_term = request.GET.get("q", "").strip()
 
-    bookings_qs = (
-        Booking.objects.prefetch_related("items__program", "addons__addon")
-        .order_by("-created_at")
+    contacts = contactList.objects.annotate(
+        has_action=Exists(Action.objects.filter(contactList=OuterRef("pk")))
     )
+    if status != "all":
+        contacts = contacts.filter(complete=status == "done")
+    if search_term:
+        contacts = contacts.filter(Q(topic__icontains=search_term) | Q(email__icontains=search_term))
+    page = paginate_keyset(contacts, ("-id",), request.GET.get("cursor"), CONTACT_PAGE_SIZE)
 
+    counts = inbox.get_counts()
+    context = {
+        "contact": page.object_list,
+        "page": page,
+        "status": status,
+        "statuses": CONTACT_STATUSES,
+        "search": search_term,
+        "filter_query": _filter_query(request),
+        "total_count": counts["total"],
+        "open_count": counts["open"],
+        "canned_actions": inbox.CANNED_ACTIONS,
+    }
+    return render(request, "myapp/showcontact.html", context)
+
+
+def _booking_filters(request: HttpRequest) -> Dict[str, Any]:
     program_value = request.GET.get("program", "").strip()
     date_value = request.GET.get("ride_date", "").strip()
+    program_id = None
+    ride_date = None
 
     if program_value:
         try:
             program_id = int(program_value)
         except (TypeError, ValueError):
             program_value = ""
-        else:
-            bookings_qs = bookings_qs.filter(items__program_id=program_id).distinct()
 
     if date_value:
         try:
             ride_date = datetime.strptime(date_value, "%Y-%m-%d").date()
         except ValueError:
             date_value = ""
-        else:
-            bookings_qs = bookings_qs.filter(ride_date=ride_date)
 
-    total_results = bookings_qs.count()
-    aggregates = bookings_qs.aggregate(
-        total_revenue=Sum("total_amount"),
-        booking_count=Count("id"),
+    return {
+        "program_value": program_value,
+        "date_value": date_value,
+        "program_id": program_id,
+        "ride_date": ride_date,
+    }
+
+
+def _filter_bookings(bookings_qs, program_id, ride_date):
+    if program_id is not None:
+        bookings_qs = bookings_qs.filter(
+            Exists(BookingItem.objects.filter(booking=OuterRef("pk"), program_id=program_id))
+        )
+    if ride_date is not None:
+        bookings_qs = bookings_qs.filter(ride_date=ride_date)
+    return bookings_qs
+
+
+@login_required(login_url="/login")
+def showBookings(request: HttpRequest) -> HttpResponse:
+    if not (request.user.is_staff or request.user.is_superuser):
+        return HttpResponse("Forbidden", status=403)
+
+    filters = _booking_filters(request)
+    program_id = filters["program_id"]
+    ride_date = filters["ride_date"]
+    bookings_qs = _filter_bookings(
+        Booking.objects.prefetch_related("items__program", "addons__addon"), program_id, ride_date
     )
-    total_revenue = aggregates["total_revenue"] or Decimal("0")
-    booking_count = aggregates["booking_count"] or 0
-    average_revenue = total_revenue / booking_count if booking_count else Decimal("0")
-    upcoming_count = bookings_qs.filter(ride_date__gte=timezone.localdate()).count()
 
-    paginator = Paginator(bookings_qs, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Totals come from the daily rollup instead of scanning the bookings.
+    summary = stats.summarize(program_id, ride_date, today=timezone.localdate())
+    total_results = summary["booking_count"]
+    total_revenue = summary["total_revenue"]
+    average_revenue = summary["average_revenue"]
+    upcoming_count = summary["upcoming_count"]
 
-    preserved_params = request.GET.copy()
-    if "page" in preserved_params:
-        preserved_params.pop("page")
-    filter_query = preserved_params.urlencode()
+    page = paginate_keyset(
+        bookings_qs, ("-created_at", "-id"), request.GET.get("cursor"), BOOKING_PAGE_SIZE
+    )
 
     context = {
-        "bookings": page_obj.object_list,
-        "page_obj": page_obj,
-        "paginator": paginator,
+        "bookings": page.object_list,
+        "page": page,
         "total_results": total_results,
         "total_revenue": total_revenue,
         "average_revenue": average_revenue,
         "upcoming_count": upcoming_count,
         "programs": Program.objects.filter(active=True).order_by("name"),
-        "selected_program": program_value,
-        "selected_date": date_value,
-        "filter_query": filter_query,
-        "page_range": paginator.get_elided_page_range(page_obj.number, on_each_side=1, on_ends=1),
+        "selected_program": filters["program_value"],
+        "selected_date": filters["date_value"],
+        "filter_query": _filter_query(request),
     }
 
     return render(request, "myapp/booking_list.html", context)
 
 
+@login_required(login_url="/login")
+def export_bookings(request: HttpRequest) -> HttpResponse:
+    if not (request.user.is_staff or request.user.is_superuser):
+        return HttpResponse("Forbidden", status=403)
+
+    export_format = request.GET.get("format", "csv")
+    if export_format not in exports.FORMATS:
+        return HttpResponse("Unsupported export format", status=400)
+
+    filters = _booking_filters(request)
+    bookings_qs = _filter_bookings(Booking.objects.all(), filters["program_id"], filters["ride_date"])
+    return exports.stream_bookings(bookings_qs, export_format)
+
+
 def booking_success(request: HttpRequest, booking_id: int) -> HttpResponse:
     booking = get_object_or_404(
         Booking.objects.prefetch_related("items__program", "addons__addon"), pk=booking_id
@@ -1006,18 +1171,15 @@ def actionPage(request: HttpRequest, cid: int) -> HttpResponse:
         action_detail = data.get("actiondetail", "").strip()
 
         if "save" in data:
-            action_obj, _ = Action.objects.get_or_create(contactList=contact)
-            action_obj.actionsDetail = action_detail
-            action_obj.save()
+            inbox.attach_action([contact.id], action_detail)
+            action_obj = Action(contactList=contact, actionsDetail=action_detail)
+            action_obj.actionDetail = action_detail  # type: ignore[attr-defined]
             context["action"] = action_obj
-            if not hasattr(action_obj, "actionDetail"):
-                action_obj.actionDetail = action_obj.actionsDetail  # type: ignore[attr-defined]
         elif "delete" in data:
             contact.delete()
             return redirect("showcontact-page")
         elif "complete" in data:
-            contact.complete = True
-            contact.save()
+            inbox.mark_complete([contact.id])
             return redirect("showcontact-page")
 
     return render(request, "myapp/action.html", context)
@@ -1206,35 +1368,21 @@ def handler404(request: HttpRequest, exception: Exception) -> HttpResponse:
     return render(request, "myapp/404errorPage.html")
 
 
+@require_safe
+@xframe_options_sameorigin  # the product page embeds spec PDFs in an iframe
+def serve_media(request: HttpRequest, path: str) -> HttpResponse:
+    return media.serve(request, path)
+
+
 @login_required(login_url="/login")
 def user_management(request: HttpRequest) -> HttpResponse:
     if not (request.user.is_staff or request.user.is_superuser):
         return HttpResponse("Forbidden", status=403)
 
-    users = User.objects.select_related("profile").order_by("username")
-    initial_users = []
-    for user in users:
-        profile = getattr(user, "profile", None)
-        initial_users.append(
-            {
-                "id": user.id,
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "email": user.email,
-                "is_active": user.is_active,
-                "is_staff": user.is_staff,
-                "is_superuser": user.is_superuser,
-                "usertype": profile.usertype if profile else "",
-                "point": profile.point if profile else 0,
-            }
-        )
-
-    initial_users_json = json.dumps(initial_users).replace("</", "<\\/")
-
     context = {
-        "initial_users_json": initial_users_json,
         "current_user_id": request.user.id,
+        "user_sorts": USER_SORTS,
+        "user_page_size": USER_PAGE_SIZE,
     }
     return render(request, "myapp/user_management.html", context)
 
@@ -1255,11 +1403,86 @@ class ProductListView(ListView):
     paginate_by = 9
 
     def get_queryset(self):  # type: ignore[override]
-        queryset = super().get_queryset().order_by("title")
-        term = self.request.GET.get("search")
+        term = self.request.GET.get("search", "").strip()
         if term:
-            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
-        return queryset
+            return search.RankedProducts(search.search_ids(term))
+        return super().get_queryset().order_by("title")
+
+    def get_context_data(self, **kwargs):  # type: ignore[override]
+        context = super().get_context_data(**kwargs)
+        context["search"] = self.request.GET.get("search", "").strip()
+        return context
+
+
+class UserListAjax(View):
+    """One page of the user directory, filtered and sorted on the server."""
+
+    http_method_names = ["get"]
+
+    def get(self, request: HttpRequest) -> JsonResponse:  # type: ignore[override]
+        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+            return JsonResponse({"error": "Forbidden"}, status=403)
+
+        sort = request.GET.get("sort") or "username"
+        if sort not in USER_SORTS:
+            return JsonResponse({"error": "Unknown sort"}, status=400)
+        try:
+            per_page = _parse_int(request.GET.get("per_page"), default=USER_PAGE_SIZE)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        per_page = max(1, min(per_page, USER_PAGE_MAX))
+
+        users = User.objects.select_related("profile").only(*USER_LIST_FIELDS)
+        for term in (request.GET.get("q") or "").split():
+            users = users.filter(
+                Q(username__icontains=term)
+                | Q(email__icontains=term)
+                | Q(first_name__icontains=term)
+                | Q(last_name__icontains=term)
+            )
+        is_staff = _parse_bool(request.GET.get("is_staff"))
+        if is_staff is not None:
+            users = users.filter(is_staff=is_staff)
+        usertype = (request.GET.get("usertype") or "").strip()
+        if usertype:
+            users = users.filter(profile__usertype__iexact=usertype)
+
+        page = paginate_keyset(users, USER_SORTS[sort][1], request.GET.get("cursor"), per_page)
+        return JsonResponse(
+            {
+                "users": [_serialize_user(user) for user in page],
+                "next_cursor": page.next_cursor,
+                "previous_cursor": page.previous_cursor,
+            }
+        )
+
+
+class BatchUserAjax(View):
+    """Create, update or deactivate many users from one JSON request."""
+
+    http_method_names = ["post"]
+
+    def post(self, request: HttpRequest) -> JsonResponse:  # type: ignore[override]
+        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+            return JsonResponse({"error": "Forbidden"}, status=403)
+
+        try:
+            payload = json.loads(request.body or b"null")
+        except (UnicodeDecodeError, ValueError):
+            return JsonResponse({"error": "Body must be JSON"}, status=400)
+        operations = payload.get("operations") if isinstance(payload, dict) else payload
+
+        try:
+            results = apply_user_batch(operations, request.user)
+        except BatchError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        return JsonResponse(
+            {
+                "results": results,
+                "applied": sum(result["ok"] for result in results),
+                "failed": sum(not result["ok"] for result in results),
+            }
+        )
 
 
 class UserDetailAjax(View):
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -67,6 +69,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, so it sees the signed-in user and pending messages.
+    'myapp.pagecache.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'mywebsite.urls'
@@ -100,6 +104,46 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Threaded tests (slot capacity, feedback votes) need a file-backed test
+    # database: in-memory SQLite fails concurrent writers instead of waiting.
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / 'test_db.sqlite3')}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Version stamps in this cache invalidate per-worker data such as the pricing
+# table and key the page fragments, so it has to be shared by every gunicorn
+# worker. DJANGO_CACHE_BACKEND picks 'file' (default), 'db' (run
+# `manage.py createcachetable` first), 'redis' or 'memcached'; the last two
+# need DJANGO_CACHE_LOCATION.
+
+CACHE_BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', 'file')
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"DJANGO_CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, not {CACHE_BACKEND!r}."
+    )
+CACHE_LOCATIONS = {
+    'file': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / '.django_cache')),
+    'db': 'myapp_cache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', CACHE_LOCATIONS.get(CACHE_BACKEND, '')),
+    }
+}
+if CACHE_BACKEND in ('file', 'db'):
+    # These backends cull by count; the others manage memory themselves.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', '5000'))}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -141,10 +185,38 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = '/media/'
+
+# Uploads are stored once per distinct content and reference counted; the
+# upload handlers hash files while the request streams in (myapp/storage.py).
+STORAGES = {
+    'default': {
+        'BACKEND': 'myapp.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+FILE_UPLOAD_HANDLERS = [
+    'myapp.storage.HashingMemoryFileUploadHandler',
+    'myapp.storage.HashingTemporaryFileUploadHandler',
+]
+
+# Media is served by myapp.media. Set DJANGO_MEDIA_ACCEL to 'nginx' (with an
+# internal location at MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or
+# 'sendfile' to let the front proxy send the file instead of the worker.
+MEDIA_ACCEL = os.environ.get('DJANGO_MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('DJANGO_MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Browser cache lifetime for media outside the content-addressed blob tree.
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
+# Processes that resize uploaded images (see myapp/images.py); 0 resizes
+# inline in the request instead.
+IMAGE_WORKERS = int(os.environ.get('DJANGO_IMAGE_WORKERS', '2'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
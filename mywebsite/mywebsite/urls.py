@@ -14,15 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
 from myapp import views as app_views             
 from django.contrib.auth import views as auth_views  
 
 from myapp.views import userLogin
 
-from django.contrib.staticfiles.urls import static, staticfiles_urlpatterns
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from . import settings
 
 from django.conf.urls import handler404
@@ -41,9 +43,11 @@ urlpatterns = [
     path("", include("myapp.urls")),
 ]
 
-# Always serve static and media in dev
+# Always serve static in dev; media goes through myapp.media in every mode.
 urlpatterns += staticfiles_urlpatterns()
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns += [
+    re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", app_views.serve_media, name="media"),
+]
 
 
 handler404 = 'myapp.views.handler404'